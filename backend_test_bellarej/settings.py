@@ -41,6 +41,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'lunchapp.middleware.MetricsMiddleware',
+    'lunchapp.middleware.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -52,6 +54,29 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'backend_test_bellarej.urls'
 
+# Budget of one request by url name (see backend_test_bellarej/urls.py): (max number of SQL queries, max time in
+# the database in ms), the requests over it are logged by lunchapp.middleware.QueryBudgetMiddleware. The counts
+# include the session and the authentication and don't grow with the number of employees
+QUERY_BUDGETS = {
+    'home': (1, 100),
+    'login': (10, 200),
+    'logout': (5, 100),
+    'send_reminder': (10, 300),
+    'dashboard-admin': (4, 200),
+    'dashboard-responsible': (8, 300),
+    'dashboard-employee': (8, 200),
+    'add-menu': (5, 200),
+    'add-user': (6, 200),
+    'import-users': (8, 500),
+    'add-meal': (5, 200),
+    'menu_of_the_day': (5, 200),
+    'api-menus': (4, 200),
+    'api-menu-today': (6, 200),
+    'api-menu': (4, 200),
+    'slack-interactions': (8, 200),
+    'metrics': (0, 100),
+}
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -93,9 +118,32 @@ DATABASES = {
 
 AUTH_USER_MODEL = 'lunchapp.Profile'
 
+# The cached backend authenticates, the model backend only loads the sessions opened before it
 AUTHENTICATION_BACKENDS = (
+   'lunchapp.auth.CachedModelBackend',
    'django.contrib.auth.backends.ModelBackend',
 )
+# Profiles and roles of the connected users kept in the cache when it's shared (in seconds, see lunchapp/auth.py
+# and CACHE_SHARED)
+AUTH_CACHE_TTL = int(os.environ.get('AUTH_CACHE_TTL', 3600))
+
+# Sessions: 'db', 'cached_db' (read from the cache, written to the database which stays the fallback) or
+# 'cache' (no database, the sessions are lost with the cache), the cache of SESSION_CACHE_ALIAS must be shared
+# by the processes (e.g. memcached). The expired sessions of the database are deleted by the command
+# 'session_cleanup'
+SESSION_MODE = os.environ.get('SESSION_MODE', 'db')
+SESSION_ENGINE = 'django.contrib.sessions.backends.%s' % SESSION_MODE
+SESSION_CACHE_ALIAS = os.environ.get('SESSION_CACHE_ALIAS', 'default')
+
+# Cost of the password hashes, tune it with the command 'benchmark_login' (the passwords are hashed again
+# with the new cost at the next login)
+PASSWORD_HASH_ITERATIONS = int(os.environ.get('PASSWORD_HASH_ITERATIONS', 150000))
+PASSWORD_HASHERS = [
+    'lunchapp.hashers.ConfigurablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -125,6 +173,9 @@ LANGUAGES = [
 
 ]
 
+# The translations of locale/ (compiled into .mo files by 'compilemessages' at each deploy)
+LOCALE_PATHS = [os.path.join(BASE_DIR, 'locale')]
+
 TIME_ZONE = 'UTC'
 
 USE_I18N = True
@@ -142,6 +193,120 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static'),
 ]
 
+# Cache, the 'slack' cache holds the rate limit state shared by all the workers (database by default,
+# run 'python3 manage.py createcachetable'), point both to memcached/redis in production
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    },
+    'slack': {
+        'BACKEND': os.environ.get('SLACK_CACHE_BACKEND', 'django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': os.environ.get('SLACK_CACHE_LOCATION', 'lunchapp_slack_cache'),
+    },
+}
+# The users, their roles and the menus are cached only when the default cache is shared by every process
+# (memcached, redis, database, see lunchapp/caching.py): with a per-process cache the invalidations of a process
+# don't reach the others and they keep a deactivated user or an old menu. Guessed from the backend, set
+# CACHE_SHARED=true to use a LocMemCache anyway when a single process serves the app
+CACHE_SHARED = os.environ.get('CACHE_SHARED', '') == 'true' or CACHES['default']['BACKEND'] not in (
+    'django.core.cache.backends.locmem.LocMemCache', 'django.core.cache.backends.dummy.DummyCache')
+
 # Slack identifier
 SLACK_BOT_TOKEN = os.environ.get('SLACK_APP_TOKEN')
 CHANNEL_ID = os.environ.get('SLACK_APP_CHANNEL')
+# Signing secret of the slack app, checks the requests of the interactivity endpoint (meal buttons)
+SLACK_SIGNING_SECRET = os.environ.get('SLACK_SIGNING_SECRET')
+SLACK_SIGNATURE_MAX_AGE = int(os.environ.get('SLACK_SIGNATURE_MAX_AGE', 300))  # seconds
+# Block kit layout of the meals of a menu in the reminders, cached until the meals change (in seconds)
+MENU_BLOCKS_TTL = int(os.environ.get('MENU_BLOCKS_TTL', 24 * 3600))
+# Public page of a menu for the anonymous users, cached until the menu changes (in seconds)
+MENU_PAGE_TTL = int(os.environ.get('MENU_PAGE_TTL', 24 * 3600))
+# How long the browsers and the proxies can keep the page of a menu before checking its ETag (in seconds)
+MENU_PAGE_MAX_AGE = int(os.environ.get('MENU_PAGE_MAX_AGE', 60))
+# Max number of days of the menus listed by the json api (see lunchapp/api.py)
+API_MAX_DAYS = int(os.environ.get('API_MAX_DAYS', 62))
+# Seconds the concurrent requests wait for the one process loading today's menu (see lunchapp/menus.py)
+TODAY_MENU_LOCK_SECONDS = int(os.environ.get('TODAY_MENU_LOCK_SECONDS', 2))
+# Number of employees by page of the dashboard of the responsible
+DASHBOARD_PAGE_SIZE = int(os.environ.get('DASHBOARD_PAGE_SIZE', 50))
+# Number of profiles by page of the dashboard of the admin
+ADMIN_PAGE_SIZE = int(os.environ.get('ADMIN_PAGE_SIZE', 50))
+# Partition the meal orders by month on postgres, read by the migration creating the table (see command
+# 'order_partitions')
+MEAL_ORDER_PARTITIONED = os.environ.get('MEAL_ORDER_PARTITIONED', '') == 'true'
+# Point it to the local stand-in (command 'slack_standin') to load test without calling slack
+SLACK_API_URL = os.environ.get('SLACK_API_URL', 'https://www.slack.com/api/')
+# Shared slack client (see lunchapp/slack_client.py), timeouts in seconds
+SLACK_CONNECT_TIMEOUT = float(os.environ.get('SLACK_CONNECT_TIMEOUT', 3))
+SLACK_READ_TIMEOUT = float(os.environ.get('SLACK_READ_TIMEOUT', 10))
+SLACK_POOL_SIZE = int(os.environ.get('SLACK_POOL_SIZE', 10))
+# Cache of the slack team id and channels (see lunchapp/slack_directory.py), in seconds
+SLACK_DIRECTORY_TTL = int(os.environ.get('SLACK_DIRECTORY_TTL', 3600))
+SLACK_DIRECTORY_MISS_REFRESH = int(os.environ.get('SLACK_DIRECTORY_MISS_REFRESH', 60))
+# Slack dispatcher (see lunchapp/slack_dispatcher.py): requests per minute by method overriding the
+# slack tiers, number of calls allowed in a burst, retries of the 429/5xx/network errors
+SLACK_RATE_LIMITS = {}
+SLACK_RATE_BURST = int(os.environ.get('SLACK_RATE_BURST', 1))
+SLACK_MAX_RETRIES = int(os.environ.get('SLACK_MAX_RETRIES', 5))
+SLACK_RETRY_BACKOFF = float(os.environ.get('SLACK_RETRY_BACKOFF', 1))
+# Max seconds a web request waits for the rate limit of slack (and its retries) before giving up
+SLACK_REQUEST_MAX_WAIT = float(os.environ.get('SLACK_REQUEST_MAX_WAIT', 5))
+
+# Reminder worker (see command 'reminder_worker'), REMINDER_MODE is 'channel' (one post in CHANNEL_ID) or
+# 'dm' (one direct message per employee in his language, SLACK_DM_CONCURRENCY messages sent in parallel)
+SITE_URL = os.environ.get('SITE_URL', 'http://nora.cornershop.com')
+REMINDER_MODE = os.environ.get('REMINDER_MODE', 'channel')
+SLACK_DM_CONCURRENCY = int(os.environ.get('SLACK_DM_CONCURRENCY', 50))
+REMINDER_BATCH_SIZE = int(os.environ.get('REMINDER_BATCH_SIZE', 500))
+REMINDER_MAX_ATTEMPTS = int(os.environ.get('REMINDER_MAX_ATTEMPTS', 3))
+REMINDER_RETRY_DELAY = int(os.environ.get('REMINDER_RETRY_DELAY', 30))  # seconds, multiplied by the attempts
+REMINDER_LEASE_SECONDS = int(os.environ.get('REMINDER_LEASE_SECONDS', 120))
+REMINDER_POLL_INTERVAL = int(os.environ.get('REMINDER_POLL_INTERVAL', 2))
+
+# Reminder scheduler (see command 'reminder_scheduler'), the reminder of each country is sent at
+# REMINDER_LOCAL_TIME in its time zone, the runs missed less than REMINDER_MISSED_GRACE seconds ago are caught up
+REMINDER_LOCAL_TIME = os.environ.get('REMINDER_LOCAL_TIME', '09:30')
+REMINDER_MISSED_GRACE = int(os.environ.get('REMINDER_MISSED_GRACE', 3 * 3600))
+# Orders of the meal of the day, open from ORDERING_OPEN_TIME to ORDERING_CLOSE_TIME in the time zone of the
+# country of the employee (see lunchapp/ordering.py), ORDERING_WINDOWS overrides them by country,
+# e.g. {'US': ('00:00', '12:00')}
+ORDERING_OPEN_TIME = os.environ.get('ORDERING_OPEN_TIME', '00:00')
+ORDERING_CLOSE_TIME = os.environ.get('ORDERING_CLOSE_TIME', '11:00')
+ORDERING_WINDOWS = {}
+SCHEDULER_LEASE_SECONDS = int(os.environ.get('SCHEDULER_LEASE_SECONDS', 60))
+
+# Metrics of the requests, the SQL queries, the slack calls and the caches served by /metrics (see
+# lunchapp/metrics.py). With several processes METRICS_DIR is a directory shared by all of them (e.g. on a tmpfs,
+# emptied before they start) where each one writes its values every METRICS_FLUSH_INTERVAL seconds. When
+# METRICS_TOKEN is set /metrics requires the header Authorization: Bearer <token>, otherwise it only answers the
+# addresses of METRICS_ALLOWED_IPS (comma separated, the address seen by django: the proxy's one behind a proxy)
+# unless METRICS_PUBLIC=true opens it to everyone
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 1))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = [ip.strip() for ip in os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+                       if ip.strip()]
+METRICS_PUBLIC = os.environ.get('METRICS_PUBLIC', '') == 'true'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {
+            'format': '%(asctime)s %(levelname)s %(name)s %(process)d %(message)s',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'simple',
+        },
+    },
+    'loggers': {
+        'lunchapp': {
+            'handlers': ['console'],
+            'level': os.environ.get('LOG_LEVEL', 'INFO'),
+        },
+    },
+}
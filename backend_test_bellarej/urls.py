@@ -15,8 +15,10 @@ Including another URLconf
 """
 
 from django.conf.urls import url
+from lunchapp.api import MenuDetailApi, MenuListApi, TodayMenuApi
 from lunchapp.views import AddMeal, AddingMenuView, AddingUserView, DashboardAdminView,  DashboardEmployeeView, \
-    DashboardResponsibleView, HomeView, LoginView, LogoutView, MenuDayView, SubmitReminder
+    DashboardResponsibleView, HomeView, ImportUsersView, LoginView, LogoutView, MenuDayView, MetricsView, \
+    SlackInteractionsView, SubmitReminder
 
 urlpatterns = [
     url(r'^$', HomeView.as_view(), name='home'),
@@ -33,8 +35,15 @@ urlpatterns = [
         name='add-menu'),
     url(r'^add_user/(?P<user_id>[0-9]+)/$', AddingUserView.as_view(),
         name='add-user'),
+    url(r'^import_users/(?P<user_id>[0-9]+)/$', ImportUsersView.as_view(),
+        name='import-users'),
     url(r'^add_meal/(?P<user_id>[0-9]+)/$', AddMeal.as_view(),
         name='add-meal'),
     url(r'^menu/(?P<uuid_menu>[0-9A-Za-z_\-]+)/$', MenuDayView.as_view(),
         name='menu_of_the_day'),
+    url(r'^api/v1/menus/$', MenuListApi.as_view(), name='api-menus'),
+    url(r'^api/v1/menus/today/$', TodayMenuApi.as_view(), name='api-menu-today'),
+    url(r'^api/v1/menus/(?P<uuid_menu>[0-9A-Za-z_\-]+)/$', MenuDetailApi.as_view(), name='api-menu'),
+    url(r'^slack/interactions/$', SlackInteractionsView.as_view(), name='slack-interactions'),
+    url(r'^metrics$', MetricsView.as_view(), name='metrics'),
 ]
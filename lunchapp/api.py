@@ -0,0 +1,157 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, Prefetch, Sum
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_date
+from django.utils.http import http_date
+from django.views.generic import View
+
+from .menus import menu_version, today_menu
+from .metrics import cache_lookup
+from .models import Meal, PlannedMenu
+
+import calendar
+import datetime
+import hashlib
+
+
+def serialize_menu(menu):
+    """
+    :param menu: a menu with its meals prefetched
+    :return: dict ready to be dumped in json
+    """
+    return {
+        'uuid': menu.uuid_menu,
+        'date': menu.planned_date.isoformat(),
+        'revision': menu.revision,
+        'updated_at': menu.updated_at.isoformat(),
+        'meals': [{'id': meal.pk,
+                   'principal_meal': meal.principal_meal,
+                   'salad': meal.salad,
+                   'dessert': meal.dessert} for meal in menu.meals.all()],
+    }
+
+
+def menus_with_meals():
+    """
+    :return: queryset of the menus fetching their meals in one more query
+    """
+    return PlannedMenu.objects.only('uuid_menu', 'planned_date', 'revision', 'updated_at').order_by(
+        'planned_date', 'pk').prefetch_related(
+        Prefetch('meals', queryset=Meal.objects.only('principal_meal', 'salad', 'dessert').order_by('pk')))
+
+
+class ApiError(Exception):
+    pass
+
+
+class MenuApiView(View):
+    """
+    Read-only json view of menus: the version of the answer (ETag and Last-Modified) is computed first without
+    loading any meal, a 304 is answered when the client already has it, else the serialized answer is cached
+    by version so it's never stale
+    """
+    version_name = 'menu'
+
+    def get_version(self):
+        """
+        :return: tuple (version string, last modified datetime), Http404 if there's nothing to answer
+        """
+        raise NotImplementedError
+
+    def get_data(self):
+        """
+        :return: the data of the answer
+        """
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        try:
+            version, updated_at = self.get_version()
+        except ApiError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        etag = '"%s-%s"' % (self.version_name, version)
+        last_modified = calendar.timegm(updated_at.utctimetuple()) if updated_at else None
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            # the etag holds the validated parameters (menu or range of days) and the version, the query string
+            # itself isn't part of the key so junk parameters don't add entries
+            key = 'api:%s' % hashlib.md5(etag.encode('utf-8')).hexdigest()
+            content = cache_lookup('api_page', cache.get(key))
+            if content is None:
+                content = JsonResponse(self.get_data()).content
+                cache.set(key, content, settings.MENU_PAGE_TTL)
+            response = HttpResponse(content, content_type='application/json')
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, public=True, max_age=settings.MENU_PAGE_MAX_AGE)
+        return response
+
+
+class MenuDetailApi(MenuApiView):
+    """
+    GET /api/v1/menus/<uuid_menu>/
+    """
+
+    def get_uuid_menu(self):
+        return self.kwargs.get('uuid_menu')
+
+    def get_version(self):
+        self.uuid_menu = self.get_uuid_menu()
+        version = menu_version(self.uuid_menu) if self.uuid_menu else None
+        if version is None:
+            raise Http404
+        revision, updated_at = version
+        return '%s-%s-%s' % (self.uuid_menu, revision, int(updated_at.timestamp() * 1000000)), updated_at
+
+    def get_data(self):
+        menu = menus_with_meals().filter(uuid_menu=self.uuid_menu).first()
+        if menu is None:
+            raise Http404
+        return serialize_menu(menu)
+
+
+class TodayMenuApi(MenuDetailApi):
+    """
+    GET /api/v1/menus/today/
+    """
+
+    def get_uuid_menu(self):
+        planned_menu, meal_ids = today_menu(exact=True)
+        if planned_menu is None:
+            return None
+        return planned_menu.uuid_menu
+
+
+class MenuListApi(MenuApiView):
+    """
+    GET /api/v1/menus/?start=YYYY-MM-DD&end=YYYY-MM-DD (default the next 7 days)
+    """
+    version_name = 'menus'
+
+    def get_version(self):
+        start = self.request.GET.get('start')
+        end = self.request.GET.get('end')
+        try:
+            self.start = parse_date(start) if start else datetime.date.today()
+            self.end = parse_date(end) if end else self.start and self.start + datetime.timedelta(days=6)
+        except ValueError:
+            self.start = self.end = None
+        if not self.start or not self.end:
+            raise ApiError('start and end must be dates (YYYY-MM-DD)')
+        if self.end < self.start or (self.end - self.start).days >= settings.API_MAX_DAYS:
+            raise ApiError('the range must be of 1 to %s days' % settings.API_MAX_DAYS)
+        stats = PlannedMenu.objects.filter(planned_date__range=(self.start, self.end)).aggregate(
+            count=Count('pk'), last_pk=Max('pk'), revisions=Sum('revision'), updated_at=Max('updated_at'))
+        updated_at = stats['updated_at']
+        version = '%s-%s-%s-%s-%s-%s' % (self.start.isoformat(), self.end.isoformat(), stats['count'],
+                                         stats['last_pk'], stats['revisions'],
+                                         int(updated_at.timestamp() * 1000000) if updated_at else 0)
+        return version, updated_at
+
+    def get_data(self):
+        menus = menus_with_meals().filter(planned_date__range=(self.start, self.end))
+        return {'start': self.start.isoformat(), 'end': self.end.isoformat(),
+                'menus': [serialize_menu(menu) for menu in menus]}
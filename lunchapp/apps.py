@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class LaunchappConfig(AppConfig):
     name = 'lunchapp'
+
+    def ready(self):
+        # Connect the cache invalidations
+        from . import signals  # noqa
@@ -0,0 +1,76 @@
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+
+from .caching import shared_cache
+from .metrics import cache_lookup
+from .models import Employee, Profile, Responsible
+
+ROLE_MODELS = {
+    'responsible': Responsible,
+    'employee': Employee,
+}
+# cached for the users without the role
+NO_ROLE = 0
+
+
+def user_key(user_id):
+    return 'auth:user:%s' % user_id
+
+
+def role_key(user_id, role):
+    return 'auth:role:%s:%s' % (user_id, role)
+
+
+def invalidate_users(user_ids):
+    """
+    drop the cached profiles and roles of users (their Profile, Responsible or Employee row changed,
+    see lunchapp/signals.py)
+    :param user_ids: ids of the profiles
+    """
+    shared_cache().delete_many([key for user_id in user_ids
+                                for key in [user_key(user_id)] + [role_key(user_id, role) for role in ROLE_MODELS]])
+
+
+def remember_user(user):
+    """
+    cache the profile of a user who just logged in, his first request then needs no query
+    """
+    shared_cache().set(user_key(user.pk), user, settings.AUTH_CACHE_TTL)
+
+
+def role_snapshot(user_id, role):
+    """
+    :param user_id: id of the profile
+    :param role: 'responsible' or 'employee'
+    :return: the Responsible or Employee row of the user (None if he hasn't one), cached for AUTH_CACHE_TTL
+    when the cache is shared (CACHE_SHARED)
+    """
+    if not settings.CACHE_SHARED:
+        return ROLE_MODELS[role].objects.filter(user_id=user_id).first()
+    key = role_key(user_id, role)
+    row = cache_lookup('auth_role', shared_cache().get(key))
+    if row is None:
+        row = ROLE_MODELS[role].objects.filter(user_id=user_id).first()
+        shared_cache().set(key, NO_ROLE if row is None else row, settings.AUTH_CACHE_TTL)
+    return row or None
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    Model backend keeping the profile of the session users in the cache, the authentication middleware then
+    loads the user of a request without query. Without a shared cache (CACHE_SHARED) it's a plain ModelBackend:
+    a worker would keep a deactivated user or a changed role until AUTH_CACHE_TTL
+    """
+
+    def get_user(self, user_id):
+        if not settings.CACHE_SHARED:
+            return super(CachedModelBackend, self).get_user(user_id)
+        key = user_key(user_id)
+        user = cache_lookup('auth_user', shared_cache().get(key))
+        if user is None:
+            try:
+                user = Profile.objects.get(pk=user_id)
+            except Profile.DoesNotExist:
+                return None
+            shared_cache().set(key, user, settings.AUTH_CACHE_TTL)
+        return user if self.user_can_authenticate(user) else None
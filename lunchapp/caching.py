@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.dummy import DummyCache
+
+# Stands for the default cache when it isn't shared by the processes: nothing is kept, so a process never
+# serves what another one changed
+_no_cache = DummyCache('no_cache', {})
+
+
+def shared_cache():
+    """
+    the cache of the data invalidated when it changes (users, roles, menus): what a process drops must be dropped
+    for every process, so it's only the default cache when this one is shared (setting CACHE_SHARED)
+    :return: the default cache, or a cache keeping nothing
+    """
+    return cache if settings.CACHE_SHARED else _no_cache
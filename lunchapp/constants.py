@@ -16,3 +16,64 @@ COUNTRY = (
     ('Mexico', _('Mexico')),
     ('US', _('United states'))
 )
+
+# Time zone of the offices of each country
+COUNTRY_TIMEZONES = {
+    'Chile': 'America/Santiago',
+    'Brazil': 'America/Sao_Paulo',
+    'Canada': 'America/Toronto',
+    'Peru': 'America/Lima',
+    'Mexico': 'America/Mexico_City',
+    'US': 'America/New_York',
+}
+
+# Reminder campaign status (see model 'ReminderCampaign')
+CAMPAIGN_STATUS = (
+    ('pending', _('Pending')),
+    ('running', _('Running')),
+    ('done', _('Done')),
+)
+
+# Reminder delivery status, one per target (see model 'ReminderDelivery')
+DELIVERY_STATUS = (
+    ('pending', _('Pending')),
+    ('sending', _('Sending')),
+    ('sent', _('Sent')),
+    ('failed', _('Failed')),
+)
+
+# Reminder mode: one post in the slack channel or one direct message per employee
+REMINDER_MODE = (
+    ('channel', _('Slack channel')),
+    ('dm', _('Direct messages')),
+)
+
+# Status of a meal chosen from the slack buttons (see model 'SlackMealChoice')
+MEAL_CHOICE_STATUS = (
+    ('pending', _('Pending')),
+    ('applied', _('Applied')),
+    ('rejected', _('Rejected')),
+    ('failed', _('Failed')),
+)
+
+# Slack invitation status (see model 'SlackInvitation')
+INVITATION_STATUS = (
+    ('pending', _('Pending')),
+    ('sending', _('Sending')),
+    ('sent', _('Sent')),
+    ('failed', _('Failed')),
+)
+
+# Planning of a new menu: one day, or the weekdays until the end of the week or of the month
+PLANNING_MODE = (
+    ('day', _('This day only')),
+    ('week', _('Every weekday until the end of the week')),
+    ('month', _('Every weekday until the end of the month')),
+)
+
+# Roles of a profile, filter of the dashboard of the admin (see model 'Profile')
+ROLE = (
+    ('admin', _('Admin')),
+    ('responsible', _('Responsible')),
+    ('employee', _('Employee')),
+)
@@ -2,7 +2,8 @@ from django import forms
 from django.contrib.auth.forms import AuthenticationForm
 from django.utils.translation import ugettext_lazy as _
 
-from .constants import COUNTRY
+from .constants import COUNTRY, PLANNING_MODE
+from .menus import meal_choices
 from .models import Employee, Meal, Profile, PlannedMenu
 
 import datetime
@@ -115,8 +116,36 @@ class AddUser(forms.ModelForm):
         fields = ('email', 'first_name', 'last_name', 'phone', 'country', 'is_active', 'is_responsible', 'is_employee')
 
 
+class ImportUsers(forms.Form):
+    csv_file = forms.FileField(
+        label=_("CSV file"),
+        help_text=_("Columns: email, first_name, last_name, phone, country, is_active, is_responsible, is_employee"),
+        widget=forms.ClearableFileInput(attrs={
+            'class': 'form-control form-white',
+            'accept': '.csv'
+        })
+    )
+
+
+class ImportUserRow(forms.Form):
+    """
+    Validation of one row of the CSV of the bulk import (same fields as AddUser)
+    """
+    email = forms.EmailField(max_length=255)
+    first_name = forms.CharField(max_length=50)
+    last_name = forms.CharField(max_length=50)
+    phone = forms.CharField(max_length=50)
+    country = forms.ChoiceField(choices=COUNTRY)
+    is_active = forms.BooleanField(required=False)
+    is_responsible = forms.BooleanField(required=False)
+    is_employee = forms.BooleanField(required=False)
+
+
+def preferred_meal_choices(meal_ids=None):
+    return [(None, 'No meal preferred')] + meal_choices(meal_ids)
+
+
 class AddMenu(forms.ModelForm):
-    choices = [(meal.pk, (meal.principal_meal + ', ' + meal.salad + ', ' + meal.dessert)) for meal in Meal.objects.all()]
     planned_date = forms.DateInput(attrs={
         'required': 'required',
         'class': 'datepicker'
@@ -126,7 +155,16 @@ class AddMenu(forms.ModelForm):
             'required': 'required',
             'class': 'selectpicker'
         }),
-        choices=choices
+        choices=meal_choices
+    )
+    planning = forms.ChoiceField(
+        label=_('Planning'),
+        required=False,
+        initial=PLANNING_MODE[0][0],
+        choices=PLANNING_MODE,
+        widget=forms.Select(attrs={
+            'class': 'form-control form-white'
+        })
     )
 
     def __init__(self, *args, **kwargs):
@@ -143,8 +181,6 @@ class AddMenu(forms.ModelForm):
 
 
 class CustomizationEmployee(forms.ModelForm):
-    choices = [(meal.pk, (meal.principal_meal + ', ' + meal.salad + ', ' + meal.dessert)) for meal in Meal.objects.all()]
-    choices.insert(0, (None, 'No meal preferred'))
     customizations = forms.CharField(
         required=False,
         widget=forms.TextInput(
@@ -156,7 +192,7 @@ class CustomizationEmployee(forms.ModelForm):
     preferred_meal = forms.ChoiceField(
         label=_('preferred meal'),
         required=False,
-        choices=choices,
+        choices=preferred_meal_choices,
         widget=forms.Select(attrs={
             'class': 'form-control form-white'
         })
@@ -166,17 +202,21 @@ class CustomizationEmployee(forms.ModelForm):
         # Get initial data passed from the view
         """
         :param args:
-        :param kwargs:
+        :param kwargs: meal_ids limits the meals to choose (e.g. the meals of today's menu)
         """
+        meal_ids = kwargs.pop('meal_ids', None)
         if 'preferred_meal' in kwargs.get('initial') and kwargs.get('initial', {}).get('preferred_meal'):
             self.preferred_meal = kwargs.get('initial').get('preferred_meal')
         if 'customizations' in kwargs.get('initial') and kwargs.get('initial', {}).get('customizations'):
             self.customizations = kwargs.get('initial').get('customizations')
         super(CustomizationEmployee, self).__init__(*args, **kwargs)
+        if meal_ids is not None:
+            self.fields['preferred_meal'].choices = preferred_meal_choices(meal_ids)
 
     class Meta:
         model = Employee
-        fields = ('customizations', 'preferred_meal')
+        # the preferred meal is saved as an order of the day (see lunchapp/orders.py)
+        fields = ('customizations',)
 
 
 class AddNewMeal(forms.ModelForm):
@@ -0,0 +1,13 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class ConfigurablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2 with PASSWORD_HASH_ITERATIONS iterations (tune it with the command 'benchmark_login'), the passwords
+    hashed with another number of iterations are hashed again at the next login of their user
+    """
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS
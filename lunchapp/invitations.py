@@ -0,0 +1,98 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .constants import INVITATION_STATUS
+from .models import SlackInvitation
+from .slack_dispatcher import dispatcher
+from .utils import logger, send_invitation
+
+import datetime
+
+
+def queue_invitations(emails):
+    """
+    persist one pending slack invitation per email, nothing is sent here (see send_invitations)
+    :param emails: the emails of the chilean employees
+    :return: number of invitations queued
+    """
+    SlackInvitation.objects.bulk_create([SlackInvitation(email=email) for email in emails], batch_size=500)
+    return len(emails)
+
+
+def count_invitations():
+    """
+    :return: dict with the number of invitations by status (pending, sending, sent, failed) and the total
+    """
+    counts = dict((status, 0) for status, label in INVITATION_STATUS)
+    for row in SlackInvitation.objects.values('status').annotate(total=Count('pk')).order_by():
+        counts[row['status']] = row['total']
+    counts['total'] = sum(counts.values())
+    return counts
+
+
+def invitation_batch_size():
+    """
+    :return: number of invitations sent in half the lease at the rate of admin.users.invite
+    """
+    per_minute = dispatcher.get_bucket('admin.users.invite', {})[1]
+    return max(1, int(settings.REMINDER_LEASE_SECONDS * per_minute / 60.0 / 2))
+
+
+def release_stale_invitations():
+    """
+    invitations still 'sending' after the lease belong to a worker that crashed, put them back in the queue
+    :return: number of invitations released
+    """
+    expired = timezone.now() - datetime.timedelta(seconds=settings.REMINDER_LEASE_SECONDS)
+    return SlackInvitation.objects.filter(status='sending', locked_at__lt=expired).update(status='pending',
+                                                                                          locked_at=None)
+
+
+def claim_invitations(batch_size):
+    """
+    lock a batch of pending invitations for this worker, concurrent workers skip the locked rows
+    :param batch_size: max number of invitations to claim
+    :return: list of claimed invitations
+    """
+    with transaction.atomic():
+        pks = list(SlackInvitation.objects.select_for_update(skip_locked=True)
+                   .filter(status='pending', available_at__lte=timezone.now())
+                   .order_by('pk')
+                   .values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return []
+        SlackInvitation.objects.filter(pk__in=pks).update(status='sending', locked_at=timezone.now(),
+                                                          attempts=F('attempts') + 1)
+    return list(SlackInvitation.objects.filter(pk__in=pks).order_by('pk'))
+
+
+def send_invitations():
+    """
+    send one batch of the queued invitations (it fits in the lease at the rate of admin.users.invite so the
+    reminder worker keeps sending the reminders between the batches), the failed ones are retried up to
+    REMINDER_MAX_ATTEMPTS times
+    :return: number of invitations processed
+    """
+    release_stale_invitations()
+    invitations = claim_invitations(invitation_batch_size())
+    for invitation in invitations:
+        try:
+            send_invitation(invitation.email)
+            invitation.status = 'sent'
+            invitation.error = ''
+            invitation.sent_at = timezone.now()
+        except Exception as e:
+            logger.error("Error in sending slack invitation %s to %s %s" % (invitation.pk, invitation.email, e))
+            invitation.status = 'failed' if invitation.attempts >= settings.REMINDER_MAX_ATTEMPTS else 'pending'
+            invitation.error = str(e)
+            invitation.available_at = timezone.now() + datetime.timedelta(
+                seconds=settings.REMINDER_RETRY_DELAY * invitation.attempts)
+        # an invitation released by the lease meanwhile belongs to the worker which claimed it again
+        SlackInvitation.objects.filter(pk=invitation.pk, status='sending', locked_at=invitation.locked_at).update(
+            status=invitation.status, error=invitation.error, sent_at=invitation.sent_at,
+            available_at=invitation.available_at, locked_at=None)
+    if invitations:
+        logger.info("%s slack invitations processed" % len(invitations))
+    return len(invitations)
@@ -0,0 +1,59 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+
+from lunchapp.hashers import ConfigurablePBKDF2PasswordHasher
+from lunchapp.utils import percentile
+
+from importlib import import_module
+import time
+
+
+class Command(BaseCommand):
+    help = "Benchmark the login path (password check and new session in the SESSION_MODE store) for several " \
+           "numbers of PBKDF2 iterations, to tune PASSWORD_HASH_ITERATIONS against the latency of the morning rush"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=300, help="Number of logins of each run")
+        parser.add_argument('--concurrency', type=int, default=8, help="Number of parallel logins")
+        parser.add_argument('--iterations', type=int, action='append',
+                            help="Number of PBKDF2 iterations of a run, repeat it to compare "
+                                 "(default PASSWORD_HASH_ITERATIONS)")
+
+    def run(self, iterations, logins, concurrency):
+        session_store = import_module(settings.SESSION_ENGINE).SessionStore
+        password = 'benchmark password'
+        with override_settings(PASSWORD_HASH_ITERATIONS=iterations):
+            hasher = ConfigurablePBKDF2PasswordHasher()
+            encoded = hasher.encode(password, hasher.salt())
+
+            def login(index):
+                started = time.monotonic()
+                try:
+                    valid = hasher.verify(password, encoded)
+                    session = session_store()
+                    session['benchmark'] = index
+                    session.create()
+                    return time.monotonic() - started, valid, session.session_key
+                finally:
+                    connection.close()
+
+            started = time.monotonic()
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                results = list(executor.map(login, range(logins)))
+            elapsed = time.monotonic() - started
+        for latency, valid, session_key in results:
+            session_store(session_key=session_key).delete()
+        latencies = [latency * 1000 for latency, valid, session_key in results]
+        errors = len([valid for latency, valid, session_key in results if not valid])
+        self.stdout.write("pbkdf2 %s iterations: %s logins in %.2fs, %.1f logins/s, %s errors, latency p50 %.1fms "
+                          "p95 %.1fms p99 %.1fms" % (iterations, len(results), elapsed, len(results) / elapsed, errors,
+                                                     percentile(latencies, 50), percentile(latencies, 95),
+                                                     percentile(latencies, 99)))
+
+    def handle(self, *args, **options):
+        self.stdout.write("sessions: %s" % settings.SESSION_ENGINE)
+        for iterations in options['iterations'] or [settings.PASSWORD_HASH_ITERATIONS]:
+            self.run(iterations, options['logins'], options['concurrency'])
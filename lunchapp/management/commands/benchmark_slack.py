@@ -0,0 +1,76 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from lunchapp.models import Responsible
+from lunchapp.slack_client import get_slack_client, reset_slack_client
+from lunchapp.slack_directory import CHANNELS_CACHE_KEY, TEAM_CACHE_KEY
+from lunchapp.slack_standin import SlackStandIn
+from lunchapp.utils import invite_to_channel, percentile
+
+import time
+
+
+class Command(BaseCommand):
+    help = "Benchmark the slack notification paths (Responsible.send_msg_with_the_menu and invite_to_channel) " \
+           "against the local slack stand-in"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Number of calls of each path")
+        parser.add_argument('--concurrency', type=int, default=8, help="Number of parallel callers")
+        parser.add_argument('--url', help="Url of a running stand-in (command 'slack_standin'), "
+                                          "else one is started in this process")
+        parser.add_argument('--latency', type=float, default=0.05)
+        parser.add_argument('--jitter', type=float, default=0.0)
+        parser.add_argument('--error-rate', type=float, default=0.0)
+        parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+        parser.add_argument('--keep-rate-limits', action='store_true',
+                            help="Keep the slack tier limits of the dispatcher (the benchmark then measures them)")
+
+    def run(self, label, function, arguments, concurrency):
+        def timed(argument):
+            started = time.monotonic()
+            sent = function(argument)
+            return time.monotonic() - started, sent
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(timed, arguments))
+        elapsed = time.monotonic() - started
+        latencies = [latency * 1000 for latency, sent in results]
+        errors = len([sent for latency, sent in results if not sent])
+        self.stdout.write("%s: %s calls in %.2fs, %.1f calls/s, %s errors, latency p50 %.1fms p95 %.1fms "
+                          "p99 %.1fms" % (label, len(results), elapsed, len(results) / elapsed, errors,
+                                          percentile(latencies, 50), percentile(latencies, 95),
+                                          percentile(latencies, 99)))
+
+    def handle(self, *args, **options):
+        standin = None
+        url = options['url']
+        if not url:
+            standin = SlackStandIn(latency=options['latency'], jitter=options['jitter'],
+                                   error_rate=options['error_rate'], rate_limit_rate=options['rate_limit_rate'])
+            url = standin.start().url
+        overrides = {'SLACK_API_URL': url, 'CHANNEL_ID': '#lunch'}
+        if not options['keep_rate_limits']:
+            overrides['SLACK_RATE_LIMITS'] = dict((method, 10 ** 9) for method in (
+                'chat.postMessage', 'admin.users.invite', 'conversations.list', 'team.info'))
+        try:
+            with override_settings(**overrides):
+                reset_slack_client()
+                cache.delete_many([TEAM_CACHE_KEY, CHANNELS_CACHE_KEY])
+                responsible = Responsible()
+                self.run('send_msg_with_the_menu', responsible.send_msg_with_the_menu,
+                         ['Benchmark reminder %s' % index for index in range(options['requests'])],
+                         options['concurrency'])
+                self.run('invite_to_channel', invite_to_channel,
+                         ['benchmark%s@example.com' % index for index in range(options['requests'])],
+                         options['concurrency'])
+                stats = get_slack_client().connection_stats()
+                self.stdout.write("http requests %(requests)s, connections opened %(connections)s, "
+                                  "reused %(reused)s" % stats)
+        finally:
+            reset_slack_client()
+            if standin:
+                standin.stop()
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from lunchapp.onboarding import import_profiles
+
+
+class Command(BaseCommand):
+    help = "Create the users of a CSV file (columns: email, first_name, last_name, phone, country, " \
+           "is_active, is_responsible, is_employee) and queue the slack invitations of the chilean ones (sent by " \
+           "the command 'reminder_worker')"
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_path', help="Path of the CSV file")
+        parser.add_argument('--no-invite', action='store_true', help="Don't send the slack invitations")
+
+    def handle(self, *args, **options):
+        with open(options['csv_path'], 'rb') as csv_file:
+            result = import_profiles(csv_file, invite=not options['no_invite'])
+        if not result.is_valid:
+            for line, message in result.errors:
+                self.stderr.write("line %s: %s" % (line, message))
+            raise CommandError("No user created, %s errors in the file" % len(result.errors))
+        self.stdout.write("%s users created, %s slack invitations queued" % (result.created, result.queued))
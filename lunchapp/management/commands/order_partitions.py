@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from lunchapp.orders import create_order_partitions
+
+
+class Command(BaseCommand):
+    help = "Create the monthly partitions of the meal orders ahead (postgres with MEAL_ORDER_PARTITIONED)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=3, help="Number of months from the current one")
+
+    def handle(self, *args, **options):
+        names = create_order_partitions(months=options['months'])
+        if not names:
+            self.stdout.write("The meal orders aren't partitioned")
+        for name in names:
+            self.stdout.write(name)
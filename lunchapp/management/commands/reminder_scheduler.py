@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from lunchapp.scheduler import ReminderScheduler
+
+
+class Command(BaseCommand):
+    help = "Queue the reminder of the day at REMINDER_LOCAL_TIME in the time zone of each country"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Fire the due reminders once and exit")
+
+    def handle(self, *args, **options):
+        scheduler = ReminderScheduler()
+        if options['once']:
+            scheduler.tick()
+            return
+        scheduler.run_forever()
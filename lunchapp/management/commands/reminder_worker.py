@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from lunchapp.invitations import send_invitations
+from lunchapp.reminders import drain
+from lunchapp.slack_ordering import apply_meal_choices
+from lunchapp.utils import logger
+
+import time
+
+
+class Command(BaseCommand):
+    help = "Send the queued slack reminders and invitations and apply the meals chosen on slack (run it as a " \
+           "long running process next to the web workers)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Drain the queue once and exit")
+        parser.add_argument('--batch-size', type=int, default=settings.REMINDER_BATCH_SIZE,
+                            help="Number of deliveries claimed at once")
+        parser.add_argument('--poll-interval', type=int, default=settings.REMINDER_POLL_INTERVAL,
+                            help="Seconds to wait when the queue is empty")
+
+    def handle(self, *args, **options):
+        while True:
+            # an error is logged and the loop goes on, the claimed rows are retried once their lease expires
+            try:
+                processed = drain(batch_size=options['batch_size'])
+                if processed:
+                    self.stdout.write("%s reminder deliveries processed" % processed)
+            except Exception as e:
+                logger.exception("Error in sending the reminders %s" % e)
+            try:
+                applied = apply_meal_choices(batch_size=options['batch_size'])
+                if applied:
+                    self.stdout.write("%s meal choices processed" % applied)
+            except Exception as e:
+                logger.exception("Error in applying the meal choices %s" % e)
+            try:
+                invited = send_invitations()
+                if invited:
+                    self.stdout.write("%s slack invitations processed" % invited)
+            except Exception as e:
+                logger.exception("Error in sending the slack invitations %s" % e)
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+import time
+
+
+def delete_expired_sessions(batch_size):
+    """
+    delete the expired sessions of the database by small batches, so the table is never locked for long
+    :param batch_size: number of sessions deleted by query
+    :return: number of sessions deleted
+    """
+    deleted = 0
+    while True:
+        keys = list(Session.objects.filter(expire_date__lt=timezone.now())
+                    .values_list('session_key', flat=True)[:batch_size])
+        if not keys:
+            return deleted
+        deleted += Session.objects.filter(session_key__in=keys).delete()[0]
+
+
+class Command(BaseCommand):
+    help = "Delete the expired sessions of the database, once or every --interval seconds"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Number of sessions deleted by query")
+        parser.add_argument('--interval', type=int, default=0,
+                            help="Seconds between two cleanups, the command runs once when 0")
+
+    def handle(self, *args, **options):
+        if settings.SESSION_MODE == 'cache':
+            self.stdout.write("The sessions are only kept in the cache, nothing to clean")
+            return
+        while True:
+            deleted = delete_expired_sessions(options['batch_size'])
+            self.stdout.write("%s expired sessions deleted" % deleted)
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from lunchapp.slack_standin import SlackStandIn
+
+
+class Command(BaseCommand):
+    help = "Run a local stand-in of the slack web api, start the app with SLACK_API_URL=http://host:port/api/"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8099)
+        parser.add_argument('--latency', type=float, default=0.05, help="Seconds added to every answer")
+        parser.add_argument('--jitter', type=float, default=0.0, help="Random seconds added to the latency")
+        parser.add_argument('--error-rate', type=float, default=0.0, help="Part of the calls answered with a 500")
+        parser.add_argument('--rate-limit-rate', type=float, default=0.0,
+                            help="Part of the calls answered with a 429")
+        parser.add_argument('--retry-after', type=int, default=1, help="Retry-After of the 429 in seconds")
+
+    def handle(self, *args, **options):
+        standin = SlackStandIn(host=options['host'], port=options['port'], latency=options['latency'],
+                               jitter=options['jitter'], error_rate=options['error_rate'],
+                               rate_limit_rate=options['rate_limit_rate'], retry_after=options['retry_after'])
+        self.stdout.write("Slack stand-in listening on %s" % standin.url)
+        try:
+            standin.serve_forever()
+        except KeyboardInterrupt:
+            standin.stop()
@@ -0,0 +1,229 @@
+from django.conf import settings
+from django.db import transaction
+
+from .caching import shared_cache
+from .metrics import cache_lookup
+from .models import Meal, PlannedMenu
+from .ordering import local_date, local_instant
+
+import calendar
+import datetime
+import pytz
+import threading
+import time
+import uuid
+
+TODAY_MENU_GENERATION_KEY = 'menu_today:generation'
+MEAL_CHOICES_VERSION_KEY = 'meal_choices:version'
+
+_today_lock = threading.Lock()
+# (version, choices) of the meals cached by the process
+_meal_choices = (None, [])
+
+
+def menu_page_key(uuid_menu, language):
+    return 'menu_page:%s:%s' % (uuid_menu, language)
+
+
+def menu_version_key(uuid_menu):
+    return 'menu_version:%s' % uuid_menu
+
+
+def menu_version(uuid_menu):
+    """
+    :param uuid_menu: the uuid of the menu
+    :return: tuple (revision, updated_at) of the menu or None if it doesn't exist, cached until the menu
+    or its meals change
+    """
+    key = menu_version_key(uuid_menu)
+    version = shared_cache().get(key)
+    if version is None:
+        version = PlannedMenu.objects.filter(uuid_menu=uuid_menu).values_list('revision', 'updated_at').first()
+        if version is None:
+            return None
+        shared_cache().set(key, version, settings.MENU_PAGE_TTL)
+    return version
+
+
+def invalidate_menu_pages(uuid_menus):
+    """
+    drop the cached public pages and versions of menus (see MenuDayView)
+    :param uuid_menus: the uuid of the menus
+    """
+    languages = set([code for code, name in settings.LANGUAGES] + [settings.LANGUAGE_CODE])
+    shared_cache().delete_many([menu_page_key(uuid_menu, language)
+                                for uuid_menu in uuid_menus for language in languages]
+                               + [menu_version_key(uuid_menu) for uuid_menu in uuid_menus])
+
+
+def load_today_menu(today):
+    """
+    the menu planned today, else the last one planned before today, else the next one (the lookups use the
+    index of planned_date and always give the same menu)
+    :return: dict with the fields of the menu and the ids of its meals ({'pk': None} if there's no menu)
+    """
+    fields = ('pk', 'uuid_menu', 'planned_date', 'revision', 'updated_at')
+    menu = PlannedMenu.objects.filter(planned_date__lte=today).order_by('-planned_date', 'pk').values(*fields) \
+        .first() or PlannedMenu.objects.filter(planned_date__gt=today).order_by('planned_date', 'pk') \
+        .values(*fields).first()
+    if menu is None:
+        return {'pk': None}
+    menu['meal_ids'] = set(PlannedMenu.meals.through.objects.filter(plannedmenu_id=menu['pk'])
+                           .values_list('meal_id', flat=True))
+    return menu
+
+
+def seconds_until_midnight(country=None):
+    """
+    :param country: the country, None for the time zone of the server
+    :return: seconds until the end of the day in the country
+    """
+    if country is None:
+        now = datetime.datetime.now()
+        midnight = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time())
+    else:
+        now = datetime.datetime.now(pytz.utc)
+        midnight = local_instant(country, local_date(country, now) + datetime.timedelta(days=1), '00:00')
+    return max(int((midnight - now).total_seconds()), 1)
+
+
+def menu_day(country=None):
+    """
+    :param country: the country, None for the time zone of the server
+    :return: today's date in the country
+    """
+    return local_date(country) if country else datetime.date.today()
+
+
+def today_menu_entry(country=None):
+    """
+    :param country: the day of this country (None for the day of the server)
+    :return: the cached entry of today's menu (see load_today_menu), kept until the midnight of the country or
+    until a menu changes, the concurrent misses wait for the one process loading it instead of all querying the
+    database
+    """
+    cache = shared_cache()
+    today = menu_day(country)
+    key = 'menu_today:%s:%s' % (today.isoformat(), cache.get(TODAY_MENU_GENERATION_KEY) or 0)
+    entry = cache_lookup('menu_today', cache.get(key))
+    if entry is not None:
+        return entry
+    with _today_lock:
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+        lock_key = '%s:lock' % key
+        # the lock is only released by its owner, a process giving up waiting loads the menu without it
+        token = uuid.uuid4().hex
+        locked = cache.add(lock_key, token, settings.TODAY_MENU_LOCK_SECONDS)
+        if not locked:
+            deadline = time.monotonic() + settings.TODAY_MENU_LOCK_SECONDS
+            while time.monotonic() < deadline:
+                time.sleep(0.02)
+                entry = cache.get(key)
+                if entry is not None:
+                    return entry
+        try:
+            entry = load_today_menu(today)
+            cache.set(key, entry, seconds_until_midnight(country))
+        finally:
+            if locked and cache.get(lock_key) == token:
+                cache.delete(lock_key)
+    return entry
+
+
+def today_menu(country=None, exact=False):
+    """
+    :param country: the day of this country (None for the day of the server)
+    :param exact: without the fallback menu, to send the reminders and order the meals (they're only for today)
+    :return: tuple (today's menu or the fallback one, set of the ids of its meals), (None, set()) if there's
+    no menu at all or, with exact, no menu today
+    """
+    entry = today_menu_entry(country)
+    if entry['pk'] is None or exact and entry['planned_date'] != menu_day(country):
+        return None, set()
+    planned_menu = PlannedMenu(id=entry['pk'], uuid_menu=entry['uuid_menu'], planned_date=entry['planned_date'],
+                               revision=entry['revision'], updated_at=entry['updated_at'])
+    planned_menu._state.adding = False
+    return planned_menu, entry['meal_ids']
+
+
+def invalidate_today_menu():
+    """
+    start a new generation of the cached today's menu, again once the transaction is committed so a process
+    reading the menu in the meantime can't cache the old one
+    """
+    shared_cache().set(TODAY_MENU_GENERATION_KEY, time.time(), None)
+    transaction.on_commit(lambda: shared_cache().set(TODAY_MENU_GENERATION_KEY, time.time(), None))
+
+
+def meal_choices(meal_ids=None):
+    """
+    the choices of the meal fields, loaded once by process and reloaded when the version shared in the cache
+    changes (a meal was saved or deleted, see lunchapp/signals.py), at each call without a shared cache
+    :param meal_ids: only keep these meals (e.g. the meals of today's menu)
+    :return: list of (meal id, label)
+    """
+    global _meal_choices
+    version = shared_cache().get(MEAL_CHOICES_VERSION_KEY)
+    if version is None:
+        # first load, or no shared cache: the choices are read again
+        version = time.time()
+        shared_cache().add(MEAL_CHOICES_VERSION_KEY, version, None)
+    cached_version, choices = _meal_choices
+    if cached_version != version:
+        choices = [(pk, '%s, %s, %s' % (principal_meal, salad, dessert)) for pk, principal_meal, salad, dessert
+                   in Meal.objects.order_by('pk').values_list('pk', 'principal_meal', 'salad', 'dessert')]
+        _meal_choices = (version, choices)
+    if meal_ids is not None:
+        return [(pk, label) for pk, label in choices if pk in meal_ids]
+    return list(choices)
+
+
+def invalidate_meal_choices():
+    shared_cache().set(MEAL_CHOICES_VERSION_KEY, time.time(), None)
+    transaction.on_commit(lambda: shared_cache().set(MEAL_CHOICES_VERSION_KEY, time.time(), None))
+
+
+def planning_dates(start, mode='day'):
+    """
+    :param start: the first day
+    :param mode: 'day', 'week' or 'month' (see PLANNING_MODE)
+    :return: the days to plan, the weekdays from `start` to the end of its week (of the next week when `start`
+    is a saturday or a sunday) or of its month
+    """
+    if mode == 'week':
+        if start.weekday() >= 5:
+            start += datetime.timedelta(days=7 - start.weekday())
+        end = start + datetime.timedelta(days=6 - start.weekday())
+    elif mode == 'month':
+        end = start.replace(day=calendar.monthrange(start.year, start.month)[1])
+    else:
+        return [start]
+    days = [start + datetime.timedelta(days=days) for days in range((end - start).days + 1)]
+    return [day for day in days if day.weekday() < 5]
+
+
+def plan_menus(menus):
+    """
+    create menus with their meals in one transaction and a constant number of queries
+    :param menus: dict date -> meal ids of the menu of this day
+    :return: list of the created menus, by date
+    """
+    meals = Meal.objects.in_bulk(set(int(meal_id) for meal_ids in menus.values() for meal_id in meal_ids))
+    planned_menus = [PlannedMenu(planned_date=planned_date) for planned_date in sorted(menus)]
+    with transaction.atomic():
+        PlannedMenu.objects.bulk_create(planned_menus)
+        pks = dict(PlannedMenu.objects.filter(uuid_menu__in=[planned_menu.uuid_menu for planned_menu in planned_menus])
+                   .values_list('uuid_menu', 'pk'))
+        through = []
+        for planned_menu in planned_menus:
+            planned_menu.pk = pks[planned_menu.uuid_menu]
+            planned_menu._state.adding = False
+            through += [PlannedMenu.meals.through(plannedmenu_id=planned_menu.pk, meal_id=meal_id)
+                        for meal_id in sorted(set(int(meal_id) for meal_id in menus[planned_menu.planned_date]))
+                        if meal_id in meals]
+        PlannedMenu.meals.through.objects.bulk_create(through)
+    # bulk_create doesn't send the signals
+    invalidate_today_menu()
+    return planned_menus
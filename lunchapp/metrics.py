@@ -0,0 +1,244 @@
+from django.conf import settings
+
+import atexit
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, escape(value)) for name, value in pairs)
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric(object):
+    type = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def label_values(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        self.registry.update(self, self.label_values(labels), lambda value: (value or 0) + amount)
+
+    def merge(self, current, value):
+        return (current or 0) + value
+
+    def samples(self, values):
+        for label_values, value in sorted(values.items()):
+            yield self.name, format_labels(self.labelnames, label_values), value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super(Histogram, self).__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, amount, **labels):
+        def add(value):
+            value = value or {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(self.buckets):
+                if amount <= bound:
+                    value['buckets'][index] += 1
+            value['sum'] += amount
+            value['count'] += 1
+            return value
+        self.registry.update(self, self.label_values(labels), add)
+
+    def merge(self, current, value):
+        if current is None:
+            return {'buckets': list(value['buckets']), 'sum': value['sum'], 'count': value['count']}
+        current['buckets'] = [total + count for total, count in zip(current['buckets'], value['buckets'])]
+        current['sum'] += value['sum']
+        current['count'] += value['count']
+        return current
+
+    def samples(self, values):
+        for label_values, value in sorted(values.items()):
+            for bound, count in zip(self.buckets + (float('inf'),), value['buckets'] + [value['count']]):
+                yield '%s_bucket' % self.name, format_labels(self.labelnames, label_values,
+                                                             ('le', format_value(bound))), count
+            yield '%s_sum' % self.name, format_labels(self.labelnames, label_values), value['sum']
+            yield '%s_count' % self.name, format_labels(self.labelnames, label_values), value['count']
+
+
+class Registry(object):
+    """
+    Metrics of the process. With several processes (gunicorn workers, reminder worker) set METRICS_DIR to a
+    directory shared by them and emptied before they start: each process writes its values into its own file
+    (metrics-<pid>.json, at most every METRICS_FLUSH_INTERVAL seconds and when it exits) and collect() adds
+    up the files of every process, so /metrics shows the totals whichever worker answers
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.values = {}
+        self.pid = os.getpid()
+        self.flushed_at = 0.0
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(self, name, documentation, labelnames, buckets))
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def check_fork(self):
+        if os.getpid() != self.pid:
+            # forked worker: the values of the master stay in the file of the master
+            self.values, self.pid, self.flushed_at = {}, os.getpid(), 0.0
+
+    def update(self, metric, label_values, change):
+        with self.lock:
+            self.check_fork()
+            values = self.values.setdefault(metric.name, {})
+            values[label_values] = change(values.get(label_values))
+        if settings.METRICS_DIR and time.monotonic() - self.flushed_at >= settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def reset(self):
+        with self.lock:
+            self.values = {}
+
+    def path(self, pid):
+        return os.path.join(settings.METRICS_DIR, 'metrics-%s.json' % pid)
+
+    def snapshot(self):
+        """
+        :return: the values of the process as saved in its file: dict metric name -> [[label values, value]]
+        """
+        with self.lock:
+            self.check_fork()
+            return json.loads(json.dumps(dict((name, [[list(label_values), value]
+                                                      for label_values, value in values.items()])
+                                              for name, values in self.values.items())))
+
+    def flush(self):
+        """
+        write the values of the process into its file of METRICS_DIR (replaced atomically)
+        """
+        if not settings.METRICS_DIR:
+            return
+        self.flushed_at = time.monotonic()
+        content = json.dumps(self.snapshot())
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=settings.METRICS_DIR, prefix='.metrics-')
+            with os.fdopen(fd, 'w') as tmp_file:
+                tmp_file.write(content)
+            os.replace(tmp_path, self.path(self.pid))
+        except OSError as e:
+            logger.error("Metrics not written into %s %s" % (settings.METRICS_DIR, e))
+
+    def collect(self):
+        """
+        :return: dict metric name -> {label values: value} of every process (only this one without METRICS_DIR)
+        """
+        if not settings.METRICS_DIR:
+            return self.merge([self.snapshot()])
+        self.flush()
+        files = []
+        for path in glob.glob(os.path.join(settings.METRICS_DIR, 'metrics-*.json')):
+            try:
+                with open(path) as metrics_file:
+                    files.append(json.load(metrics_file))
+            except (OSError, ValueError) as e:
+                logger.error("Metrics file %s skipped %s" % (path, e))
+        return self.merge(files)
+
+    def merge(self, files):
+        totals = {}
+        for data in files:
+            for name, rows in data.items():
+                metric = self.metrics.get(name)
+                if metric is None:
+                    continue
+                values = totals.setdefault(name, {})
+                for label_values, value in rows:
+                    label_values = tuple(label_values)
+                    values[label_values] = metric.merge(values.get(label_values), value)
+        return totals
+
+    def render(self):
+        """
+        :return: the metrics in the Prometheus text format
+        """
+        totals = self.collect()
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            lines.append('# HELP %s %s' % (name, metric.documentation))
+            lines.append('# TYPE %s %s' % (name, metric.type))
+            for sample, labels, value in metric.samples(totals.get(name, {})):
+                lines.append('%s%s %s' % (sample, labels, format_value(value)))
+        cache_requests = totals.get(cache_requests_total.name, {})
+        lines.append('# HELP lunch_cache_hit_ratio Share of the lookups of a cache finding their value')
+        lines.append('# TYPE lunch_cache_hit_ratio gauge')
+        for name in sorted(set(cache for cache, result in cache_requests)):
+            hits = cache_requests.get((name, 'hit'), 0)
+            total = hits + cache_requests.get((name, 'miss'), 0)
+            lines.append('lunch_cache_hit_ratio%s %s' % (format_labels(('cache',), (name,)),
+                                                         format_value(float(hits) / total if total else 0.0)))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+atexit.register(registry.flush)
+
+request_duration = registry.histogram('lunch_request_duration_seconds', 'Time to answer a request',
+                                      ('view', 'method'))
+responses_total = registry.counter('lunch_responses_total', 'Responses by view and status code',
+                                   ('view', 'status'))
+db_queries = registry.histogram('lunch_db_queries', 'SQL queries of a request', ('view',), QUERY_BUCKETS)
+db_duration_total = registry.counter('lunch_db_duration_seconds_total', 'Time of the SQL queries of the requests',
+                                     ('view',))
+slack_call_duration = registry.histogram('lunch_slack_call_duration_seconds',
+                                         'Time of a slack api call by method and outcome', ('method', 'outcome'))
+cache_requests_total = registry.counter('lunch_cache_requests_total', 'Lookups of a cache by result (hit or miss)',
+                                        ('cache', 'result'))
+
+
+def cache_lookup(name, value):
+    """
+    count a lookup of a cache
+    :param name: the cache (e.g. 'menu_page')
+    :param value: the value read from the cache, None is a miss
+    :return: the value
+    """
+    cache_requests_total.inc(cache=name, result='miss' if value is None else 'hit')
+    return value
@@ -0,0 +1,95 @@
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class QueryStats(object):
+    """
+    Execute wrapper of the database connections counting the queries of a request and their time
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.monotonic()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.monotonic() - started
+
+    @property
+    def db_ms(self):
+        return self.db_time * 1000
+
+    def over_budget(self, budget):
+        """
+        :param budget: tuple (max number of queries, max time in the database in ms)
+        :return: list of the exceeded limits, empty if the request is within its budget
+        """
+        max_queries, max_db_ms = budget
+        exceeded = []
+        if max_queries is not None and self.queries > max_queries:
+            exceeded.append('%s queries > %s' % (self.queries, max_queries))
+        if max_db_ms is not None and self.db_ms > max_db_ms:
+            exceeded.append('%.1fms in the database > %sms' % (self.db_ms, max_db_ms))
+        return exceeded
+
+
+class QueryBudgetMiddleware(object):
+    """
+    Count the SQL queries of each request and their time (request.query_stats), a request over the budget of
+    its url name (setting QUERY_BUDGETS) is logged. It's the first middleware so the queries of the session
+    and of the authentication are counted too.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = QueryStats()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            response = self.get_response(request)
+        request.query_stats = stats
+        url_name = request.resolver_match.url_name if getattr(request, 'resolver_match', None) else None
+        budget = settings.QUERY_BUDGETS.get(url_name)
+        exceeded = stats.over_budget(budget) if budget else []
+        if exceeded:
+            logger.warning('Query budget of %s exceeded by %s %s: %s' % (url_name, request.method,
+                                                                         request.path, ', '.join(exceeded)))
+        return response
+
+
+class MetricsMiddleware(object):
+    """
+    Record the latency, the status and the SQL queries of each request by url name (see lunchapp/metrics.py),
+    it's before QueryBudgetMiddleware so request.query_stats is set when the response comes back
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.monotonic()
+        response = self.get_response(request)
+        duration = time.monotonic() - started
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name if match and match.url_name else 'unmatched'
+        metrics.request_duration.observe(duration, view=view, method=request.method)
+        metrics.responses_total.inc(view=view, status=response.status_code)
+        stats = getattr(request, 'query_stats', None)
+        if stats is not None:
+            metrics.db_queries.observe(stats.queries, view=view)
+            metrics.db_duration_total.inc(stats.db_time, view=view)
+        return response
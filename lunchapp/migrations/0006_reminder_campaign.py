@@ -0,0 +1,61 @@
+# Generated by Django 2.2 on 2026-10-18 10:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lunchapp', '0005_auto_20201226_2019'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReminderCampaign',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('message', models.TextField(verbose_name='Message')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done')], db_index=True, default='pending', max_length=20, verbose_name='Status')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ('-created_at',),
+            },
+        ),
+        migrations.CreateModel(
+            name='ReminderDelivery',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target', models.CharField(help_text='Slack channel or user the reminder is sent to', max_length=255, verbose_name='Slack target')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=20, verbose_name='Status')),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('latency_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, default='')),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('campaign', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='lunchapp.ReminderCampaign')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='remindercampaign',
+            name='planned_menu',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reminder_campaigns', to='lunchapp.PlannedMenu'),
+        ),
+        migrations.AddField(
+            model_name='remindercampaign',
+            name='responsible',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='lunchapp.Responsible'),
+        ),
+        migrations.AddIndex(
+            model_name='reminderdelivery',
+            index=models.Index(fields=['status', 'available_at'], name='lunchapp_re_status_a11a6b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reminderdelivery',
+            index=models.Index(fields=['status', 'locked_at'], name='lunchapp_re_status_b90068_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 2.2 on 2026-10-18 10:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lunchapp', '0006_reminder_campaign'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='remindercampaign',
+            name='mode',
+            field=models.CharField(choices=[('channel', 'Slack channel'), ('dm', 'Direct messages')], default='channel', max_length=20, verbose_name='Mode'),
+        ),
+        migrations.AddField(
+            model_name='reminderdelivery',
+            name='employee',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='lunchapp.Employee'),
+        ),
+        migrations.AddField(
+            model_name='reminderdelivery',
+            name='language',
+            field=models.CharField(blank=True, choices=[('fr', 'French'), ('en', 'English')], max_length=50, verbose_name='Language'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 2.2 on 2026-10-18 10:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lunchapp', '0007_reminder_direct_messages'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchedulerLease',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('holder', models.CharField(max_length=255)),
+                ('expires_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='remindercampaign',
+            name='country',
+            field=models.CharField(blank=True, choices=[('Chile', 'Chile'), ('Brazil', 'Brazil'), ('Canada', 'Canada'), ('Peru', 'Peru'), ('Mexico', 'Mexico'), ('US', 'United states')], help_text='Only the employees of this country get the reminder (all of them when empty)', max_length=255, verbose_name='Country'),
+        ),
+        migrations.CreateModel(
+            name='ScheduledReminder',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('country', models.CharField(choices=[('Chile', 'Chile'), ('Brazil', 'Brazil'), ('Canada', 'Canada'), ('Peru', 'Peru'), ('Mexico', 'Mexico'), ('US', 'United states')], max_length=255, verbose_name='Country')),
+                ('date', models.DateField()),
+                ('fired_at', models.DateTimeField(auto_now_add=True)),
+                ('campaign', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='lunchapp.ReminderCampaign')),
+            ],
+            options={
+                'unique_together': {('country', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 2.2 on 2026-10-18 10:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lunchapp', '0008_reminder_scheduler'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlackMealChoice',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slack_user_id', models.CharField(max_length=50)),
+                ('channel_id', models.CharField(blank=True, max_length=50)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('applied', 'Applied'), ('rejected', 'Rejected'), ('failed', 'Failed')], db_index=True, default='pending', max_length=20, verbose_name='Status')),
+                ('chosen_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('error', models.TextField(blank=True, default='')),
+                ('employee', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='lunchapp.Employee')),
+                ('meal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='lunchapp.Meal')),
+                ('planned_menu', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='lunchapp.PlannedMenu')),
+            ],
+        ),
+    ]
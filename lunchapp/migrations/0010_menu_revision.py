@@ -0,0 +1,33 @@
+# Generated by Django 2.2 on 2026-10-18 10:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lunchapp', '0009_slack_meal_choice'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meal',
+            name='revision',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='meal',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='plannedmenu',
+            name='revision',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='plannedmenu',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
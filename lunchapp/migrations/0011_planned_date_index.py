@@ -0,0 +1,19 @@
+# Generated by Django 2.2 on 2026-10-18 10:57
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lunchapp', '0010_menu_revision'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='plannedmenu',
+            name='planned_date',
+            field=models.DateField(db_index=True, default=django.utils.timezone.now, verbose_name='date joined'),
+        ),
+    ]
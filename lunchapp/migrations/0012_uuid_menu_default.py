@@ -0,0 +1,19 @@
+# Generated by Django 2.2 on 2026-10-18 11:01
+
+from django.db import migrations, models
+import lunchapp.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lunchapp', '0011_planned_date_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='plannedmenu',
+            name='uuid_menu',
+            field=models.CharField(default=lunchapp.models.new_uuid, editable=False, max_length=50, unique=True, verbose_name='UUID Menu'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 2.2 on 2026-10-18 11:05
+
+from django.db import migrations, models
+
+# The prefix search of the admin directory (istartswith) is compiled by postgres to
+# UPPER("column"::text) LIKE UPPER('prefix%'), only an index on this expression with the pattern
+# operator class can serve it whatever the collation of the database
+PREFIX_COLUMNS = ('email', 'first_name', 'last_name')
+
+
+def create_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for column in PREFIX_COLUMNS:
+        schema_editor.execute('CREATE INDEX IF NOT EXISTS profile_%s_prefix_idx ON lunchapp_profile '
+                              '(UPPER(%s::text) text_pattern_ops)' % (column, column))
+
+
+def drop_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for column in PREFIX_COLUMNS:
+        schema_editor.execute('DROP INDEX IF EXISTS profile_%s_prefix_idx' % column)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lunchapp', '0012_uuid_menu_default'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['country', 'id'], name='profile_country_id_idx'),
+        ),
+        migrations.RunPython(create_prefix_indexes, drop_prefix_indexes),
+    ]
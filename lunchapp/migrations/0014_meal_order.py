@@ -0,0 +1,71 @@
+# Generated by Django 2.2 on 2026-10-18 11:08
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# With MEAL_ORDER_PARTITIONED on postgres the orders are partitioned by month on their date, the primary and
+# unique keys of a partitioned table must hold the date. Rows without a monthly partition go to the default
+# one, the monthly partitions are created ahead by the command 'order_partitions'
+PARTITIONED_TABLE_SQL = [
+    'CREATE TABLE lunchapp_mealorder ('
+    ' id serial NOT NULL,'
+    ' date date NOT NULL,'
+    ' customizations varchar(255) NOT NULL,'
+    ' created_at timestamp with time zone NOT NULL,'
+    ' updated_at timestamp with time zone NOT NULL,'
+    ' employee_id integer NOT NULL REFERENCES lunchapp_employee (id) DEFERRABLE INITIALLY DEFERRED,'
+    ' meal_id integer NOT NULL REFERENCES lunchapp_meal (id) DEFERRABLE INITIALLY DEFERRED,'
+    ' PRIMARY KEY (id, date),'
+    ' CONSTRAINT lunchapp_mealorder_date_employee_id_uniq UNIQUE (date, employee_id)'
+    ') PARTITION BY RANGE (date)',
+    'CREATE INDEX mealorder_date_meal_idx ON lunchapp_mealorder (date, meal_id)',
+    'CREATE INDEX lunchapp_mealorder_employee_id_idx ON lunchapp_mealorder (employee_id)',
+    'CREATE TABLE lunchapp_mealorder_default PARTITION OF lunchapp_mealorder DEFAULT',
+]
+
+
+def create_meal_order_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql' and getattr(settings, 'MEAL_ORDER_PARTITIONED', False):
+        for sql in PARTITIONED_TABLE_SQL:
+            schema_editor.execute(sql)
+    else:
+        schema_editor.create_model(apps.get_model('lunchapp', 'MealOrder'))
+
+
+def drop_meal_order_table(apps, schema_editor):
+    schema_editor.delete_model(apps.get_model('lunchapp', 'MealOrder'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lunchapp', '0013_profile_directory_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='employee',
+            name='preferred_meal',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, to='lunchapp.Meal'),
+        ),
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.CreateModel(
+                name='MealOrder',
+                fields=[
+                    ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                    ('date', models.DateField()),
+                    ('customizations', models.CharField(blank=True, default='', max_length=255, verbose_name='Employee customizations')),
+                    ('created_at', models.DateTimeField(auto_now_add=True)),
+                    ('updated_at', models.DateTimeField(auto_now=True)),
+                    ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='orders', to='lunchapp.Employee')),
+                    ('meal', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='orders', to='lunchapp.Meal')),
+                ],
+                options={
+                    'unique_together': {('date', 'employee')},
+                    'indexes': [models.Index(fields=['date', 'meal'], name='mealorder_date_meal_idx')],
+                },
+            ),
+        ]),
+        migrations.RunPython(create_meal_order_table, drop_meal_order_table),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.2 on 2026-10-18 11:43
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lunchapp', '0014_meal_order'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='meal',
+            name='revision',
+        ),
+    ]
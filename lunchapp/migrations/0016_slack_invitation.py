@@ -0,0 +1,36 @@
+# Generated by Django 2.2 on 2026-10-18 12:02
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lunchapp', '0015_remove_meal_revision'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlackInvitation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(max_length=255)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=20, verbose_name='Status')),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('error', models.TextField(blank=True, default='')),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='slackinvitation',
+            index=models.Index(fields=['status', 'available_at'], name='lunchapp_sl_status_0aa1fb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='slackinvitation',
+            index=models.Index(fields=['status', 'locked_at'], name='lunchapp_sl_status_56a08c_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+from django.contrib.auth.views import redirect_to_login
+from django.http import Http404, HttpResponseForbidden
+from django.shortcuts import get_object_or_404
+
+from .auth import role_snapshot
+from .models import Profile
+from .utils import logger
+
+
+def get_role(request, role):
+    """
+    :param request: the request of a connected user
+    :param role: 'responsible' or 'employee'
+    :return: the Responsible or Employee row of the connected user (None if he hasn't one), read from the cache
+    once by request
+    """
+    roles = request.__dict__.setdefault('_roles', {})
+    if role not in roles:
+        roles[role] = role_snapshot(request.user.pk, role)
+        if roles[role] is not None:
+            roles[role].user = request.user
+    return roles[role]
+
+
+class RoleRequiredMixin(object):
+    """
+    Authorize the request once before the view is dispatched: anonymous users and users without the role are
+    redirected to the login page, the views of the admin answer 403 when the profile of the url isn't an
+    admin, the views of the responsible and of the employees 404 when the user has no Responsible or Employee
+    row (kept on the request, see get_role)
+    """
+    role = None  # 'admin', 'responsible' or 'employee'
+    login_url = '/login/'
+
+    def dispatch(self, request, *args, **kwargs):
+        user = request.user
+        if not (user.is_authenticated and user.is_active and getattr(user, 'is_%s' % self.role, False)):
+            return redirect_to_login(request.get_full_path(), self.login_url)
+        if self.role == 'admin':
+            user_id = kwargs.get('user_id')
+            profile = user if str(user.pk) == user_id else get_object_or_404(Profile, pk=user_id)
+            if not profile.is_admin:
+                logger.error('User not allowed user.email %s' % user.email)
+                return HttpResponseForbidden('<h1>Forbidden</h1>')
+        elif get_role(request, self.role) is None:
+            raise Http404
+        return super(RoleRequiredMixin, self).dispatch(request, *args, **kwargs)
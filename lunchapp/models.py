@@ -4,10 +4,9 @@ from django.db import models
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 
-from slack import WebClient
-
-from .constants import COUNTRY, LANG_TYPE
-from .utils import logger
+from .constants import CAMPAIGN_STATUS, COUNTRY, DELIVERY_STATUS, INVITATION_STATUS, LANG_TYPE, MEAL_CHOICE_STATUS, \
+    REMINDER_MODE
+from .utils import logger, post_message
 import uuid
 
 
@@ -66,6 +65,11 @@ class Profile(AbstractBaseUser):
     USERNAME_FIELD = 'email'
     objects = UserManager()
 
+    class Meta:
+        # the directory of the admin is filtered by country and paginated on the primary key, the prefix
+        # search on the email and the names has its own indexes (migration 0013)
+        indexes = [models.Index(fields=['country', 'id'], name='profile_country_id_idx')]
+
 
 class Meal(models.Model):
     principal_meal = models.CharField(
@@ -81,10 +85,15 @@ class Meal(models.Model):
         verbose_name=_('dessert'),
         max_length=255,
         help_text=_('Enter the name of the dessert'),)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+def new_uuid():
+    return str(uuid.uuid4())
 
 
 class PlannedMenu(models.Model):
-    planned_date = models.DateField(_('date joined'), default=timezone.now)
+    planned_date = models.DateField(_('date joined'), default=timezone.now, db_index=True)
     uuid_menu = models.CharField(
         verbose_name=_('UUID Menu'),
         blank=False,
@@ -92,9 +101,12 @@ class PlannedMenu(models.Model):
         editable=False,
         unique=True,
         max_length=50,
-        default=str(uuid.uuid4())
+        default=new_uuid
     )
     meals = models.ManyToManyField(Meal)
+    # Version stamp of the menu and its meals, used by the conditional requests (see lunchapp/signals.py)
+    revision = models.PositiveIntegerField(default=1, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
 
 class Responsible(models.Model):
@@ -107,8 +119,7 @@ class Responsible(models.Model):
         :return: True if there's no error in the sending process else False
         """
         try:
-            slack_client = WebClient(settings.SLACK_BOT_TOKEN)
-            slack_client.chat_postMessage(channel=settings.CHANNEL_ID, text=message)
+            post_message(settings.CHANNEL_ID, message)
             logger.info("Slack reminder sent")
             return True
         except Exception as e:
@@ -123,4 +134,187 @@ class Employee(models.Model):
         null=True,
         blank=True)
     user = models.OneToOneField(Profile, on_delete=models.CASCADE)
-    preferred_meal = models.OneToOneField(Meal, null=True, on_delete=models.PROTECT)
+    # The last meal chosen by the employee, the order of each day is kept in 'MealOrder'
+    preferred_meal = models.ForeignKey(Meal, null=True, on_delete=models.PROTECT)
+
+
+class MealOrder(models.Model):
+    """
+    The meal ordered by an employee for a day, one order by employee and day (see lunchapp/orders.py), on
+    postgres the table can be partitioned by month (setting MEAL_ORDER_PARTITIONED)
+    """
+    date = models.DateField()
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='orders')
+    meal = models.ForeignKey(Meal, on_delete=models.PROTECT, related_name='orders')
+    customizations = models.CharField(
+        verbose_name=_('Employee customizations'),
+        max_length=255,
+        blank=True,
+        default=''
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('date', 'employee')
+        indexes = [models.Index(fields=['date', 'meal'], name='mealorder_date_meal_idx')]
+
+
+class ReminderCampaign(models.Model):
+    """
+    One reminder sent by the responsible, it's split into one delivery per target and sent by the
+    reminder worker (see command 'reminder_worker')
+    """
+    planned_menu = models.ForeignKey(PlannedMenu, on_delete=models.CASCADE, related_name='reminder_campaigns')
+    responsible = models.ForeignKey(Responsible, null=True, on_delete=models.SET_NULL)
+    message = models.TextField(verbose_name=_('Message'))
+    country = models.CharField(
+        verbose_name=_("Country"),
+        max_length=255,
+        choices=COUNTRY,
+        blank=True,
+        help_text=_("Only the employees of this country get the reminder (all of them when empty)")
+    )
+    mode = models.CharField(
+        verbose_name=_('Mode'),
+        max_length=20,
+        choices=REMINDER_MODE,
+        default=REMINDER_MODE[0][0]
+    )
+    status = models.CharField(
+        verbose_name=_('Status'),
+        max_length=20,
+        choices=CAMPAIGN_STATUS,
+        default=CAMPAIGN_STATUS[0][0],
+        db_index=True
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ('-created_at',)
+
+    def progress(self):
+        """
+        :return: dict with the number of deliveries by status (pending, sending, sent, failed) and the total
+        """
+        return ReminderCampaign.count_deliveries([self])[self.pk]
+
+    @staticmethod
+    def count_deliveries(campaigns):
+        """
+        progress of several campaigns in one query (the dashboard of the responsible lists the last campaigns)
+        :param campaigns: list of ReminderCampaign
+        :return: dict {campaign pk: dict like progress()}
+        """
+        counts = dict((campaign.pk, dict((status, 0) for status, label in DELIVERY_STATUS)) for campaign in campaigns)
+        rows = ReminderDelivery.objects.filter(campaign__in=list(counts)).values('campaign', 'status')
+        for row in rows.annotate(total=models.Count('pk')).order_by():
+            counts[row['campaign']][row['status']] = row['total']
+        for campaign_counts in counts.values():
+            campaign_counts['total'] = sum(campaign_counts.values())
+        return counts
+
+
+class ReminderDelivery(models.Model):
+    campaign = models.ForeignKey(ReminderCampaign, on_delete=models.CASCADE, related_name='deliveries')
+    target = models.CharField(
+        verbose_name=_('Slack target'),
+        max_length=255,
+        help_text=_('Slack channel or user the reminder is sent to')
+    )
+    employee = models.ForeignKey('Employee', null=True, blank=True, on_delete=models.SET_NULL)
+    language = models.CharField(
+        verbose_name=_('Language'),
+        max_length=50,
+        choices=LANG_TYPE,
+        blank=True
+    )
+    status = models.CharField(
+        verbose_name=_('Status'),
+        max_length=20,
+        choices=DELIVERY_STATUS,
+        default=DELIVERY_STATUS[0][0]
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    latency_ms = models.PositiveIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    locked_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'available_at']),
+            models.Index(fields=['status', 'locked_at']),
+        ]
+
+
+class ScheduledReminder(models.Model):
+    """
+    One reminder fired by the scheduler for a country and a day (see command 'reminder_scheduler'),
+    the unique constraint makes sure it's fired once even after a restart
+    """
+    country = models.CharField(verbose_name=_("Country"), max_length=255, choices=COUNTRY)
+    date = models.DateField()
+    fired_at = models.DateTimeField(auto_now_add=True)
+    campaign = models.ForeignKey(ReminderCampaign, null=True, blank=True, on_delete=models.SET_NULL)
+
+    class Meta:
+        unique_together = ('country', 'date')
+
+
+class SchedulerLease(models.Model):
+    """
+    Lease of a singleton process (the reminder scheduler), only the holder of a non expired lease runs
+    """
+    name = models.CharField(max_length=50, unique=True)
+    holder = models.CharField(max_length=255)
+    expires_at = models.DateTimeField()
+
+
+class SlackMealChoice(models.Model):
+    """
+    A meal chosen with the buttons of the slack reminder, the interactivity endpoint only stores it and the
+    reminder worker applies it to the employee (see 'apply_meal_choices')
+    """
+    slack_user_id = models.CharField(max_length=50)
+    channel_id = models.CharField(max_length=50, blank=True)
+    planned_menu = models.ForeignKey(PlannedMenu, on_delete=models.CASCADE)
+    meal = models.ForeignKey(Meal, on_delete=models.CASCADE)
+    employee = models.ForeignKey(Employee, null=True, blank=True, on_delete=models.SET_NULL)
+    status = models.CharField(
+        verbose_name=_('Status'),
+        max_length=20,
+        choices=MEAL_CHOICE_STATUS,
+        default=MEAL_CHOICE_STATUS[0][0],
+        db_index=True
+    )
+    chosen_at = models.DateTimeField(default=timezone.now)
+    error = models.TextField(blank=True, default='')
+
+
+class SlackInvitation(models.Model):
+    """
+    The slack invitation of a chilean employee, queued by the imports (and the user form when slack is busy)
+    and sent by the reminder worker at the rate of admin.users.invite (see lunchapp/invitations.py)
+    """
+    email = models.EmailField(max_length=255)
+    status = models.CharField(
+        verbose_name=_('Status'),
+        max_length=20,
+        choices=INVITATION_STATUS,
+        default=INVITATION_STATUS[0][0]
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    error = models.TextField(blank=True, default='')
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'available_at']),
+            models.Index(fields=['status', 'locked_at']),
+        ]
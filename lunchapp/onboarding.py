@@ -0,0 +1,131 @@
+from django.db import IntegrityError, transaction
+
+from .auth import invalidate_users
+from .forms import ImportUserRow
+from .invitations import queue_invitations
+from .models import Employee, Profile, Responsible
+from .utils import logger
+
+import csv
+import io
+
+BOOLEAN_COLUMNS = ('is_active', 'is_responsible', 'is_employee')
+TRUE_VALUES = ('1', 'true', 'yes', 'y', 'x')
+
+
+class ImportResult(object):
+    """
+    Result of a bulk import: the created profiles or the errors of the rows (nothing is created
+    when one row is invalid)
+    """
+
+    def __init__(self):
+        self.errors = []
+        self.created = 0
+        self.queued = 0
+
+    def add_error(self, line, message):
+        self.errors.append((line, message))
+
+    @property
+    def is_valid(self):
+        return not self.errors
+
+
+def read_rows(csv_file):
+    """
+    :param csv_file: uploaded file or file opened in binary/text mode
+    :return: list of (line number, row dict)
+    """
+    content = csv_file.read()
+    if isinstance(content, bytes):
+        content = content.decode('utf-8-sig')
+    reader = csv.DictReader(io.StringIO(content))
+    rows = []
+    for row in reader:
+        row = dict((key.strip(), (value or '').strip()) for key, value in row.items() if key)
+        for column in BOOLEAN_COLUMNS:
+            row[column] = row.get(column, '').lower() in TRUE_VALUES
+        rows.append((reader.line_num, row))
+    return rows
+
+
+def validate_rows(rows, result):
+    """
+    validate every row, the uniqueness of the emails and phones is checked in the file and against the
+    database with one query each
+    :param rows: list of (line number, row dict)
+    :param result: the ImportResult where the errors are added
+    :return: list of (line number, cleaned data)
+    """
+    cleaned_rows = []
+    for line, row in rows:
+        form = ImportUserRow(data=row)
+        if not form.is_valid():
+            for field, errors in form.errors.items():
+                result.add_error(line, '%s: %s' % (field, ' '.join(errors)))
+            continue
+        cleaned_rows.append((line, form.cleaned_data))
+
+    emails = [data['email'] for line, data in cleaned_rows]
+    phones = [data['phone'] for line, data in cleaned_rows]
+    existing_emails = set(Profile.objects.filter(email__in=emails).values_list('email', flat=True))
+    existing_phones = set(Profile.objects.filter(phone__in=phones).values_list('phone', flat=True))
+    seen_emails, seen_phones = set(), set()
+    responsibles = Responsible.objects.count()
+    for line, data in cleaned_rows:
+        if data['email'] in existing_emails or data['email'] in seen_emails:
+            result.add_error(line, 'email: User already exist with that email')
+        if data['phone'] in existing_phones or data['phone'] in seen_phones:
+            result.add_error(line, 'phone: User already exist with that phone')
+        if data['is_responsible']:
+            responsibles += 1
+            if responsibles > 1:
+                result.add_error(line, 'is_responsible: One responsible is allowed')
+        seen_emails.add(data['email'])
+        seen_phones.add(data['phone'])
+    result.errors.sort(key=lambda row_error: row_error[0])
+    return cleaned_rows
+
+
+def import_profiles(csv_file, invite=True):
+    """
+    create the profiles of a CSV file and their employee/responsible rows with bulk inserts in one
+    transaction, the slack invitations of the chilean profiles are queued in the same transaction and sent
+    by the command 'reminder_worker'
+    :param csv_file: the CSV file
+    :param invite: queue the slack invitations
+    :return: ImportResult
+    """
+    result = ImportResult()
+    rows = read_rows(csv_file)
+    cleaned_rows = validate_rows(rows, result)
+    if not result.is_valid:
+        return result
+
+    try:
+        with transaction.atomic():
+            Profile.objects.bulk_create([Profile(**data) for line, data in cleaned_rows], batch_size=500)
+            # bulk_create doesn't return the ids on every database, read them back in one query
+            profile_ids = dict(Profile.objects.filter(email__in=[data['email'] for line, data in cleaned_rows])
+                               .values_list('email', 'pk'))
+            Employee.objects.bulk_create([Employee(user_id=profile_ids[data['email']])
+                                          for line, data in cleaned_rows if data['is_employee']], batch_size=500)
+            Responsible.objects.bulk_create([Responsible(user_id=profile_ids[data['email']])
+                                             for line, data in cleaned_rows if data['is_responsible']])
+            # Only employee from Chile are invited to slack channel of the menu notifier
+            if invite:
+                result.queued = queue_invitations([data['email'] for line, data in cleaned_rows
+                                                   if data['country'] == 'Chile'])
+    except IntegrityError as e:
+        # a user created meanwhile (another import, the user form) took an email or a phone of the file
+        logger.error("Import of %s users failed %s" % (len(cleaned_rows), e))
+        result.queued = 0
+        validate_rows(rows, result)
+        if result.is_valid:
+            result.add_error(0, 'User already exist %s' % e)
+        return result
+    # bulk_create sends no signal
+    invalidate_users(profile_ids.values())
+    result.created = len(cleaned_rows)
+    return result
@@ -0,0 +1,80 @@
+from django.conf import settings
+
+from .constants import COUNTRY_TIMEZONES
+
+import datetime
+import functools
+import pytz
+
+DEFAULT_COUNTRY = 'Chile'
+
+
+def country_timezone(country):
+    return pytz.timezone(COUNTRY_TIMEZONES.get(country) or COUNTRY_TIMEZONES[DEFAULT_COUNTRY])
+
+
+def local_instant(country, local_date, local_time):
+    """
+    :param country: the country
+    :param local_date: a day of the country
+    :param local_time: 'HH:MM' in the time zone of the country, a time skipped by a DST change is moved after it
+    :return: the UTC instant
+    """
+    tz = country_timezone(country)
+    hour, minute = [int(part) for part in local_time.split(':')]
+    instant = tz.normalize(tz.localize(datetime.datetime.combine(local_date, datetime.time(hour, minute))))
+    return instant.astimezone(pytz.utc)
+
+
+def local_date(country, at=None):
+    """
+    :return: the day of the country at an instant (default now)
+    """
+    return (at or datetime.datetime.now(pytz.utc)).astimezone(country_timezone(country)).date()
+
+
+def window_times(country):
+    """
+    :return: tuple ('HH:MM', 'HH:MM') opening and closing the orders of a country (ORDERING_WINDOWS overrides
+    ORDERING_OPEN_TIME and ORDERING_CLOSE_TIME by country)
+    """
+    return settings.ORDERING_WINDOWS.get(country) or (settings.ORDERING_OPEN_TIME, settings.ORDERING_CLOSE_TIME)
+
+
+@functools.lru_cache(maxsize=256)
+def compute_window(country, day, open_time, close_time):
+    return local_instant(country, day, open_time), local_instant(country, day, close_time)
+
+
+def ordering_window(country, day):
+    """
+    the window is computed once by country, day and setting, then the checks only compare UTC instants
+    :param country: the country
+    :param day: a day of the country
+    :return: tuple (open, close) UTC instants of the orders of the day, the close instant is excluded
+    """
+    open_time, close_time = window_times(country)
+    return compute_window(country, day, open_time, close_time)
+
+
+def ordering_open(country, at=None):
+    """
+    :param country: the country of the employee
+    :param at: aware datetime of the choice (default now)
+    :return: True if the employees of the country can choose their meal at this instant
+    """
+    at = at or datetime.datetime.now(pytz.utc)
+    # the day of the country is the UTC day, the one before or the one after
+    utc_day = at.astimezone(pytz.utc).date()
+    for days in (-1, 0, 1):
+        open_at, close_at = ordering_window(country, utc_day + datetime.timedelta(days=days))
+        if open_at <= at < close_at:
+            return True
+    return False
+
+
+def ordering_closed(country, at=None):
+    """
+    :return: True if a choice of an employee of the country is too late (or too early) at this instant
+    """
+    return not ordering_open(country, at)
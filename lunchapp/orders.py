@@ -0,0 +1,105 @@
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, DateField, Exists, OuterRef, Value, When
+
+from .constants import COUNTRY
+from .models import MealOrder
+from .ordering import DEFAULT_COUNTRY, local_date
+
+import datetime
+
+
+def place_order(employee, meal_id, date, customizations=None):
+    """
+    create or update the order of an employee for a day (one order by employee and day), the meal is kept
+    as his last choice too
+    :param employee: the employee
+    :param meal_id: id of the ordered meal
+    :param date: the day of the order
+    :param customizations: the customizations of the order (unchanged when None)
+    :return: the order
+    """
+    defaults = {'meal_id': meal_id}
+    if customizations is not None:
+        defaults['customizations'] = customizations
+    with transaction.atomic():
+        order, created = MealOrder.objects.update_or_create(date=date, employee=employee, defaults=defaults)
+        if employee.preferred_meal_id != meal_id:
+            employee.preferred_meal_id = meal_id
+            employee.save(update_fields=['preferred_meal'])
+    return order
+
+
+def order_dates(at=None):
+    """
+    :param at: aware datetime (default now)
+    :return: dict country -> the day of the orders in the country at this instant
+    """
+    return dict((country, local_date(country, at)) for country, label in COUNTRY)
+
+
+def with_today_order(employees, at=None):
+    """
+    :param employees: queryset of Employee
+    :param at: aware datetime (default now)
+    :return: the employees annotated with order_date (the day of the orders in their country) and has_order
+    (True if they ordered a meal that day)
+    """
+    dates = order_dates(at)
+    order_date = Case(*[When(user__country=country, then=Value(date)) for country, date in dates.items()],
+                      default=Value(local_date(DEFAULT_COUNTRY, at)), output_field=DateField())
+    orders = MealOrder.objects.filter(employee=OuterRef('pk'), date=OuterRef('order_date'))
+    return employees.annotate(order_date=order_date).annotate(has_order=Exists(orders))
+
+
+def attach_today_orders(employees, at=None):
+    """
+    fetch the orders of the day of several employees (with their meal) in one query
+    :param employees: list of Employee with their user
+    :param at: aware datetime (default now)
+    :return: the employees, employee.today_order is his MealOrder of the day in his country or None
+    """
+    dates = order_dates(at)
+    days = dict((employee.pk, dates.get(employee.user.country) or local_date(employee.user.country, at))
+                for employee in employees)
+    orders = MealOrder.objects.filter(employee__in=list(days), date__in=set(days.values())).select_related('meal')
+    by_employee = dict(((order.employee_id, order.date), order) for order in orders)
+    for employee in employees:
+        employee.today_order = by_employee.get((employee.pk, days[employee.pk]))
+    return employees
+
+
+def today_order(employee, country):
+    """
+    :return: the MealOrder of the employee for the day of his country (None if he hasn't ordered yet)
+    """
+    return MealOrder.objects.filter(employee=employee, date=local_date(country)).select_related('meal').first()
+
+
+def partition_name(month):
+    return '%s_y%sm%02d' % (MealOrder._meta.db_table, month.year, month.month)
+
+
+def next_month(month):
+    return (month.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+
+
+def create_order_partitions(start=None, months=3):
+    """
+    create the missing monthly partitions of the orders (only on postgres with MEAL_ORDER_PARTITIONED), they
+    must exist before the first order of their month else the orders go to the default partition
+    :param start: a day of the first month (default today)
+    :param months: number of months
+    :return: names of the partitions
+    """
+    if connection.vendor != 'postgresql' or not settings.MEAL_ORDER_PARTITIONED:
+        return []
+    month = (start or datetime.date.today()).replace(day=1)
+    names = []
+    with connection.cursor() as cursor:
+        for i in range(months):
+            names.append(partition_name(month))
+            cursor.execute("CREATE TABLE IF NOT EXISTS %s PARTITION OF %s FOR VALUES FROM ('%s') TO ('%s')" % (
+                names[-1], MealOrder._meta.db_table, month.isoformat(), next_month(month).isoformat()))
+            month = next_month(month)
+    return names
@@ -0,0 +1,291 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.shortcuts import reverse
+from django.template.loader import render_to_string
+from django.utils import timezone, translation
+
+from .models import Employee, ReminderCampaign, ReminderDelivery
+from .slack_client import open_async_slack_client
+from .slack_directory import get_user_ids
+from .slack_dispatcher import DIRECT_MESSAGE_PREFIXES, dispatcher
+from .slack_ordering import reminder_blocks
+from .utils import logger, post_message
+
+import asyncio
+import datetime
+import time
+
+
+def reminder_message(planned_menu, language='en'):
+    """
+    :param planned_menu: the menu the reminder is about
+    :param language: the language of the message
+    :return: the text of the reminder
+    """
+    menu_url = settings.SITE_URL + reverse('menu_of_the_day', kwargs={'uuid_menu': planned_menu.uuid_menu})
+    with translation.override(language):
+        return render_to_string('slack/reminder.txt', {'menu_url': menu_url}).strip()
+
+
+def enqueue_reminder(planned_menu, message, responsible=None, mode=None, country=''):
+    """
+    persist a reminder campaign with one pending delivery per target, nothing is sent here
+    :param planned_menu: the menu the reminder is about
+    :param message: the message to send
+    :param responsible: the responsible who asked for the reminder
+    :param mode: 'channel' or 'dm' (default REMINDER_MODE)
+    :param country: only remind the employees of this country (direct messages)
+    :return: the created campaign
+    """
+    mode = mode or settings.REMINDER_MODE
+    with transaction.atomic():
+        campaign = ReminderCampaign.objects.create(planned_menu=planned_menu,
+                                                   responsible=responsible,
+                                                   message=message,
+                                                   mode=mode,
+                                                   country=country)
+        ReminderDelivery.objects.bulk_create(reminder_deliveries(campaign), batch_size=500)
+    logger.info("Reminder campaign %s queued" % campaign.pk)
+    return campaign
+
+
+def reminder_deliveries(campaign):
+    """
+    :return: the deliveries of a campaign, the channel of the chilean employees or one direct message
+    per active employee in his language
+    """
+    if campaign.mode == 'dm':
+        employees = Employee.objects.filter(user__is_active=True)
+        if campaign.country:
+            employees = employees.filter(user__country=campaign.country)
+        employees = employees.values_list('pk', 'user__email', 'user__language')
+        return [ReminderDelivery(campaign=campaign, target=email, employee_id=employee_id, language=language)
+                for employee_id, email, language in employees]
+    if not settings.CHANNEL_ID:
+        logger.error("No slack channel configured, the reminder has no target")
+        return []
+    return [ReminderDelivery(campaign=campaign, target=settings.CHANNEL_ID)]
+
+
+def release_stale_deliveries():
+    """
+    deliveries still 'sending' after the lease belong to a worker that crashed, put them back in the queue
+    :return: number of deliveries released
+    """
+    expired = timezone.now() - datetime.timedelta(seconds=settings.REMINDER_LEASE_SECONDS)
+    return ReminderDelivery.objects.filter(status='sending', locked_at__lt=expired).update(status='pending',
+                                                                                           locked_at=None)
+
+
+def claim_deliveries(batch_size):
+    """
+    lock a batch of pending deliveries for this worker, concurrent workers skip the locked rows
+    :param batch_size: max number of deliveries to claim
+    :return: list of claimed deliveries
+    """
+    with transaction.atomic():
+        pks = list(ReminderDelivery.objects.select_for_update(skip_locked=True)
+                   .filter(status='pending', available_at__lte=timezone.now())
+                   .order_by('pk')
+                   .values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return []
+        ReminderDelivery.objects.filter(pk__in=pks).update(status='sending', locked_at=timezone.now(),
+                                                           attempts=F('attempts') + 1)
+    ReminderCampaign.objects.filter(deliveries__pk__in=pks, status='pending').update(status='running')
+    return list(ReminderDelivery.objects.select_related('campaign__planned_menu').filter(pk__in=pks).order_by('pk'))
+
+
+def record_failure(delivery, error):
+    delivery.status = 'failed' if delivery.attempts >= settings.REMINDER_MAX_ATTEMPTS else 'pending'
+    delivery.error = str(error)
+    delivery.available_at = timezone.now() + datetime.timedelta(
+        seconds=settings.REMINDER_RETRY_DELAY * delivery.attempts)
+
+
+def deliver(delivery):
+    """
+    send one delivery and record its status, latency and error
+    :param delivery: a claimed delivery
+    :return: True if the message was sent else False
+    """
+    started = time.monotonic()
+    try:
+        post_message(delivery.target, delivery.campaign.message,
+                     blocks=reminder_blocks(delivery.campaign.message, delivery.campaign.planned_menu))
+        delivery.status = 'sent'
+        delivery.error = ''
+        delivery.sent_at = timezone.now()
+    except Exception as e:
+        logger.error("Error in sending reminder delivery %s %s" % (delivery.pk, e))
+        record_failure(delivery, e)
+    delivery.latency_ms = int((time.monotonic() - started) * 1000)
+    delivery.locked_at = None
+    delivery.save(update_fields=['status', 'error', 'sent_at', 'available_at', 'latency_ms', 'locked_at'])
+    return delivery.status == 'sent'
+
+
+async def send_direct_messages(deliveries, texts, user_ids, concurrency):
+    """
+    send the direct messages concurrently, at most `concurrency` calls in flight
+    :param deliveries: the claimed deliveries
+    :param texts: dict (language, menu id) -> tuple (rendered message, block kit layout)
+    :param user_ids: dict email -> slack user id
+    :param concurrency: max number of parallel calls
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    slack_client = open_async_slack_client(concurrency)
+
+    async def send(delivery):
+        async with semaphore:
+            started = time.monotonic()
+            try:
+                text, blocks = texts[(delivery.language, delivery.campaign.planned_menu_id)]
+                await dispatcher.acall(slack_client, 'chat.postMessage', channel=user_ids[delivery.target],
+                                       text=text, blocks=blocks)
+                delivery.status = 'sent'
+                delivery.error = ''
+                delivery.sent_at = timezone.now()
+            except Exception as e:
+                logger.error("Error in sending reminder delivery %s %s" % (delivery.pk, e))
+                record_failure(delivery, e)
+            delivery.latency_ms = int((time.monotonic() - started) * 1000)
+
+    try:
+        await asyncio.gather(*[send(delivery) for delivery in deliveries])
+    finally:
+        await slack_client.session.close()
+        # the connections opened by the rate limiter in the executor thread
+        await asyncio.get_event_loop().run_in_executor(None, connections.close_all)
+
+
+def direct_message_chunk_size():
+    """
+    :return: number of direct messages sent in half the lease at the rate of slack, a batch is sent by chunks
+    of this size and the lease of its deliveries renewed before each chunk
+    """
+    per_minute = dispatcher.get_bucket('chat.postMessage', {'channel': DIRECT_MESSAGE_PREFIXES[0]})[1]
+    return max(1, int(settings.REMINDER_LEASE_SECONDS * per_minute / 60.0 / 2))
+
+
+def owned_deliveries(deliveries):
+    """
+    lock the deliveries still claimed by this worker, the ones released meanwhile (see
+    release_stale_deliveries) belong to the worker which claimed them again. Runs in a transaction
+    :return: the deliveries still claimed by this worker
+    """
+    locks = dict(ReminderDelivery.objects.select_for_update()
+                 .filter(pk__in=[delivery.pk for delivery in deliveries], status='sending')
+                 .values_list('pk', 'locked_at'))
+    owned = [delivery for delivery in deliveries if locks.get(delivery.pk) == delivery.locked_at]
+    if len(owned) < len(deliveries):
+        logger.warning("%s reminder deliveries released by the lease, left to another worker" % (
+            len(deliveries) - len(owned)))
+    return owned
+
+
+def renew_lease(deliveries):
+    """
+    :param deliveries: the deliveries still to send
+    :return: the deliveries still claimed by this worker, their lease starts again now
+    """
+    locked_at = timezone.now()
+    with transaction.atomic():
+        owned = owned_deliveries(deliveries)
+        ReminderDelivery.objects.filter(pk__in=[delivery.pk for delivery in owned]).update(locked_at=locked_at)
+    for delivery in owned:
+        delivery.locked_at = locked_at
+    return owned
+
+
+def save_deliveries(deliveries):
+    """
+    record the outcome of the deliveries still claimed by this worker with one bulk update
+    """
+    with transaction.atomic():
+        owned = owned_deliveries(deliveries)
+        for delivery in owned:
+            delivery.locked_at = None
+        ReminderDelivery.objects.bulk_update(owned, ['status', 'error', 'sent_at', 'available_at', 'latency_ms',
+                                                     'locked_at'], batch_size=500)
+
+
+def deliver_direct_messages(deliveries):
+    """
+    send the direct messages of a batch of deliveries by chunks fitting in half the lease, the lease of the
+    deliveries left is renewed before each chunk so no other worker sends them again. The message and its
+    meal buttons are rendered once per language and menu, an error of the batch (e.g. slack users.list or
+    the cache) is recorded as a failed attempt of its unsent deliveries
+    :param deliveries: the claimed deliveries of 'dm' campaigns
+    """
+    try:
+        texts = {}
+        for delivery in deliveries:
+            key = (delivery.language, delivery.campaign.planned_menu_id)
+            if key not in texts:
+                text = reminder_message(delivery.campaign.planned_menu, delivery.language or 'en')
+                texts[key] = (text, reminder_blocks(text, delivery.campaign.planned_menu, delivery.language or 'en'))
+        user_ids = get_user_ids([delivery.target for delivery in deliveries])
+        to_send = []
+        for delivery in deliveries:
+            if delivery.target in user_ids:
+                to_send.append(delivery)
+            else:
+                delivery.status = 'failed'
+                delivery.error = 'No slack account with the email %s' % delivery.target
+        chunk_size = direct_message_chunk_size()
+        while to_send:
+            to_send = renew_lease(to_send)
+            chunk, to_send = to_send[:chunk_size], to_send[chunk_size:]
+            if not chunk:
+                break
+            loop = asyncio.new_event_loop()
+            # one thread runs the rate limiter of the calls (see SlackDispatcher.acall)
+            loop.set_default_executor(ThreadPoolExecutor(max_workers=1))
+            try:
+                loop.run_until_complete(send_direct_messages(chunk, texts, user_ids, settings.SLACK_DM_CONCURRENCY))
+            finally:
+                loop.close()
+            save_deliveries(chunk)
+    except Exception as e:
+        logger.exception("Error in sending a batch of %s direct messages %s" % (len(deliveries), e))
+        for delivery in deliveries:
+            if delivery.status == 'sending':
+                record_failure(delivery, e)
+    save_deliveries([delivery for delivery in deliveries if delivery.locked_at is not None])
+
+
+def finish_campaigns():
+    """
+    mark as done the campaigns with no delivery left to send
+    :return: number of campaigns finished
+    """
+    return ReminderCampaign.objects.filter(status__in=['pending', 'running']) \
+        .exclude(deliveries__status__in=['pending', 'sending']) \
+        .update(status='done', finished_at=timezone.now())
+
+
+def drain(batch_size=None):
+    """
+    send all the pending deliveries
+    :param batch_size: number of deliveries claimed at once
+    :return: number of deliveries processed
+    """
+    batch_size = batch_size or settings.REMINDER_BATCH_SIZE
+    release_stale_deliveries()
+    processed = 0
+    while True:
+        deliveries = claim_deliveries(batch_size)
+        if not deliveries:
+            break
+        direct_messages = [delivery for delivery in deliveries if delivery.campaign.mode == 'dm']
+        if direct_messages:
+            deliver_direct_messages(direct_messages)
+        for delivery in deliveries:
+            if delivery.campaign.mode != 'dm':
+                deliver(delivery)
+        processed += len(deliveries)
+    finish_campaigns()
+    return processed
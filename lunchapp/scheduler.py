@@ -0,0 +1,161 @@
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .constants import COUNTRY_TIMEZONES
+from .models import PlannedMenu, ScheduledReminder, SchedulerLease
+from .ordering import local_instant, ordering_window
+from .reminders import enqueue_reminder, reminder_message
+from .utils import logger
+
+import datetime
+import os
+import pytz
+import socket
+import time
+
+LEASE_NAME = 'reminder-scheduler'
+
+
+def acquire_lease(name, holder, seconds):
+    """
+    take or renew the lease of a singleton process, the conditional update makes sure only one
+    replica holds it at a time
+    :param name: the name of the lease
+    :param holder: unique name of the process asking for it
+    :param seconds: duration of the lease
+    :return: True if the process holds the lease
+    """
+    now = timezone.now()
+    expires_at = now + datetime.timedelta(seconds=seconds)
+    if SchedulerLease.objects.filter(Q(holder=holder) | Q(expires_at__lt=now), name=name) \
+            .update(holder=holder, expires_at=expires_at):
+        return True
+    try:
+        with transaction.atomic():
+            SchedulerLease.objects.create(name=name, holder=holder, expires_at=expires_at)
+        return True
+    except IntegrityError:
+        return False
+
+
+def release_lease(name, holder):
+    SchedulerLease.objects.filter(name=name, holder=holder).update(expires_at=timezone.now())
+
+
+def local_fire_time(country, local_date):
+    """
+    :return: the UTC instant of the reminder of a country for one of its local days
+    """
+    return local_instant(country, local_date, settings.REMINDER_LOCAL_TIME)
+
+
+def scheduled_countries():
+    """
+    :return: the countries reminded by the scheduler, in channel mode only Chile has a slack channel
+    """
+    if settings.REMINDER_MODE == 'channel':
+        return ['Chile']
+    return list(COUNTRY_TIMEZONES.keys())
+
+
+def day_plan(now):
+    """
+    compute the fire times of the day (yesterday to tomorrow in local time, to cover every time zone)
+    :param now: aware datetime
+    :return: sorted list of (fire time UTC, country, local date)
+    """
+    plan = []
+    for country in scheduled_countries():
+        local_today = now.astimezone(pytz.timezone(COUNTRY_TIMEZONES[country])).date()
+        for days in (-1, 0, 1):
+            local_date = local_today + datetime.timedelta(days=days)
+            plan.append((local_fire_time(country, local_date), country, local_date))
+    return sorted(plan)
+
+
+def fire_reminder(country, local_date):
+    """
+    queue the reminder of a country for a day, once
+    :return: the ScheduledReminder or None if it was already fired
+    """
+    planned_menu = PlannedMenu.objects.filter(planned_date=local_date).order_by('pk').first()
+    try:
+        with transaction.atomic():
+            scheduled = ScheduledReminder.objects.create(country=country, date=local_date)
+            if planned_menu is None:
+                logger.error("No menu planned the %s, no reminder for %s" % (local_date, country))
+                return scheduled
+            scheduled.campaign = enqueue_reminder(planned_menu, reminder_message(planned_menu),
+                                                  country=country if settings.REMINDER_MODE == 'dm' else '')
+            scheduled.save(update_fields=['campaign'])
+            logger.info("Reminder of %s for %s queued" % (local_date, country))
+            return scheduled
+    except IntegrityError:
+        return None
+
+
+class ReminderScheduler(object):
+    """
+    Fire the reminder of each country at REMINDER_LOCAL_TIME in its time zone. The fire times of the day
+    are computed once, the process sleeps until the next one and only renews its lease in between. The
+    runs missed during a restart (less than REMINDER_MISSED_GRACE seconds late) are fired at start.
+    """
+
+    def __init__(self, holder=None):
+        self.holder = holder or '%s:%s' % (socket.gethostname(), os.getpid())
+        self.plan = []
+        self.plan_day = None
+
+    def due(self, now):
+        """
+        :return: the (fire time, country, local date) of the plan to fire now
+        """
+        if self.plan_day != now.date():
+            self.plan = day_plan(now)
+            self.plan_day = now.date()
+        grace = datetime.timedelta(seconds=settings.REMINDER_MISSED_GRACE)
+        # a reminder caught up after the orders of its day closed is useless
+        due = [run for run in self.plan
+               if now - grace <= run[0] <= now and now < ordering_window(run[1], run[2])[1]]
+        if not due:
+            return []
+        fired = set(ScheduledReminder.objects.filter(
+            date__in=[local_date for fire_time, country, local_date in due]).values_list('country', 'date'))
+        return [run for run in due if (run[1], run[2]) not in fired]
+
+    def next_fire_time(self, now):
+        future = [fire_time for fire_time, country, local_date in self.plan if fire_time > now]
+        return min(future) if future else None
+
+    def tick(self):
+        """
+        fire the due reminders if the process is the leader
+        :return: seconds to sleep before the next tick
+        """
+        lease_seconds = settings.SCHEDULER_LEASE_SECONDS
+        if not acquire_lease(LEASE_NAME, self.holder, lease_seconds):
+            return lease_seconds / 2.0
+        now = timezone.now()
+        for fire_time, country, local_date in self.due(now):
+            fire_reminder(country, local_date)
+        next_fire_time = self.next_fire_time(now)
+        # Wake up before the lease expires to renew it
+        sleep = lease_seconds / 3.0
+        if next_fire_time is not None:
+            sleep = min(sleep, max((next_fire_time - timezone.now()).total_seconds(), 0.1))
+        return sleep
+
+    def run_forever(self):
+        try:
+            while True:
+                # a database error in a tick is retried at the next one instead of stopping the scheduler
+                try:
+                    sleep = self.tick()
+                except Exception as e:
+                    logger.exception("Error in the reminder scheduler %s" % e)
+                    sleep = settings.SCHEDULER_LEASE_SECONDS / 3.0
+                time.sleep(sleep)
+        finally:
+            release_lease(LEASE_NAME, self.holder)
@@ -0,0 +1,80 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.db.models import F
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .auth import invalidate_users
+from .menus import invalidate_meal_choices, invalidate_menu_pages, invalidate_today_menu
+from .models import Employee, Meal, PlannedMenu, Profile, Responsible
+from .slack_ordering import invalidate_menu_blocks
+
+
+def invalidate_menus(menus):
+    """
+    bump the version of menus and drop everything cached about them
+    :param menus: list of (id, uuid) of the menus
+    """
+    if menus:
+        PlannedMenu.objects.filter(pk__in=[pk for pk, uuid_menu in menus]).update(revision=F('revision') + 1,
+                                                                                 updated_at=timezone.now())
+    invalidate_menu_blocks([pk for pk, uuid_menu in menus])
+    invalidate_menu_pages([uuid_menu for pk, uuid_menu in menus])
+    invalidate_today_menu()
+
+
+def menus_of_meal(meal):
+    return list(meal.plannedmenu_set.values_list('pk', 'uuid_menu'))
+
+
+@receiver(m2m_changed, sender=PlannedMenu.meals.through)
+def menu_meals_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    meals added to or removed from a menu
+    """
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        invalidate_menus([(instance.pk, instance.uuid_menu)])
+    elif action == 'pre_clear':
+        invalidate_menus(menus_of_meal(instance))
+    else:
+        invalidate_menus(list(PlannedMenu.objects.filter(pk__in=pk_set).values_list('pk', 'uuid_menu')))
+
+
+@receiver(post_save, sender=Meal)
+def meal_saved(sender, instance, created, **kwargs):
+    invalidate_meal_choices()
+    if not created:
+        invalidate_menus(menus_of_meal(instance))
+
+
+@receiver(pre_delete, sender=Meal)
+def meal_deleted(sender, instance, **kwargs):
+    invalidate_meal_choices()
+    invalidate_menus(menus_of_meal(instance))
+
+
+@receiver(post_save, sender=PlannedMenu)
+def menu_saved(sender, instance, created, **kwargs):
+    if created:
+        invalidate_today_menu()
+    else:
+        invalidate_menus([(instance.pk, instance.uuid_menu)])
+
+
+@receiver(post_delete, sender=PlannedMenu)
+def menu_deleted(sender, instance, **kwargs):
+    invalidate_menu_blocks([instance.pk])
+    invalidate_menu_pages([instance.uuid_menu])
+    invalidate_today_menu()
+
+
+@receiver([post_save, post_delete], sender=Profile)
+def profile_changed(sender, instance, **kwargs):
+    invalidate_users([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Responsible)
+@receiver([post_save, post_delete], sender=Employee)
+def role_changed(sender, instance, **kwargs):
+    invalidate_users([instance.user_id])
@@ -0,0 +1,109 @@
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from slack import WebClient
+from slack.web.async_client import AsyncWebClient
+from urllib.parse import urlencode
+
+import aiohttp
+import json
+import os
+import requests
+import threading
+
+_lock = threading.Lock()
+_client = None
+_client_pid = None
+
+
+class PooledWebClient(WebClient):
+    """
+    Slack WebClient sending its requests through a requests session, so the TLS connections
+    to slack are kept alive and reused between calls instead of being opened for every call
+    """
+
+    def __init__(self, token=None, connect_timeout=None, read_timeout=None, pool_size=None, **kwargs):
+        super(PooledWebClient, self).__init__(token, **kwargs)
+        self.connect_timeout = connect_timeout or settings.SLACK_CONNECT_TIMEOUT
+        self.read_timeout = read_timeout or settings.SLACK_READ_TIMEOUT
+        pool_size = pool_size or settings.SLACK_POOL_SIZE
+        self.http_session = requests.Session()
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.http_session.mount('https://', self.adapter)
+        self.http_session.mount('http://', self.adapter)
+
+    def _perform_urllib_http_request(self, *, url, args):
+        """
+        :param url: a complete URL (e.g., https://www.slack.com/api/chat.postMessage)
+        :param args: dict with the "headers", "data", "params" and "json" of the request
+        :return: dict {status: int, headers: dict, body: str} like the urllib implementation
+        """
+        if args['data']:
+            # Multipart uploads (files) aren't used by the app, keep the urllib implementation for them
+            return super(PooledWebClient, self)._perform_urllib_http_request(url=url, args=args)
+        headers = args['headers']
+        if args['json']:
+            body = json.dumps(args['json'])
+            headers['Content-Type'] = 'application/json;charset=utf-8'
+        elif args['params']:
+            body = urlencode(args['params'])
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        else:
+            body = None
+        response = self.http_session.post(url, data=body.encode('utf-8') if body else None, headers=headers,
+                                          timeout=(self.connect_timeout, self.read_timeout))
+        return {'status': response.status_code, 'headers': response.headers, 'body': response.text}
+
+    def connection_stats(self):
+        """
+        :return: dict with the number of http requests sent, connections opened and reused
+        """
+        requests_sent = connections = 0
+        pools = self.adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools[key]
+            requests_sent += pool.num_requests
+            connections += pool.num_connections
+        return {'requests': requests_sent, 'connections': connections, 'reused': requests_sent - connections}
+
+    def close(self):
+        self.http_session.close()
+
+
+def get_slack_client():
+    """
+    :return: the slack client of the process, a new one is built after a fork so the
+    connections of the parent process are never shared with the child
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _lock:
+            if _client is None or _client_pid != pid:
+                _client = PooledWebClient(settings.SLACK_BOT_TOKEN, base_url=settings.SLACK_API_URL)
+                _client_pid = pid
+    return _client
+
+
+def reset_slack_client():
+    """
+    drop the slack client of the process (it's rebuilt on the next call)
+    """
+    global _client, _client_pid
+    with _lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = _client_pid = None
+
+
+def open_async_slack_client(concurrency):
+    """
+    build an asyncio slack client with its own aiohttp session (to call from a running event loop),
+    the session keeps at most `concurrency` connections and must be closed with `await client.session.close()`
+    :param concurrency: max number of connections to slack
+    :return: AsyncWebClient
+    """
+    session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency),
+                                    timeout=aiohttp.ClientTimeout(sock_connect=settings.SLACK_CONNECT_TIMEOUT,
+                                                                  sock_read=settings.SLACK_READ_TIMEOUT))
+    return AsyncWebClient(settings.SLACK_BOT_TOKEN, base_url=settings.SLACK_API_URL,
+                          timeout=settings.SLACK_READ_TIMEOUT, session=session)
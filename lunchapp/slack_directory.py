@@ -0,0 +1,115 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .slack_dispatcher import slack_call
+
+import time
+
+TEAM_CACHE_KEY = 'slack:team_id'
+CHANNELS_CACHE_KEY = 'slack:channels'
+USERS_CACHE_KEY = 'slack:users'
+
+
+def get_team_id(max_wait=None):
+    """
+    :param max_wait: max seconds waiting for the rate limit of slack (see SlackDispatcher.call)
+    :return: the id of the slack workspace, cached for SLACK_DIRECTORY_TTL seconds
+    """
+    team_id = cache.get(TEAM_CACHE_KEY)
+    if team_id is None:
+        info = slack_call('team.info', max_wait=max_wait)
+        team_id = info.data.get('team', {}).get('id')
+        cache.set(TEAM_CACHE_KEY, team_id, settings.SLACK_DIRECTORY_TTL)
+    return team_id
+
+
+def fetch_channels(max_wait=None):
+    """
+    walk all the pages of conversations.list once
+    :param max_wait: max seconds waiting for the rate limit of slack by page
+    :return: dict channel name -> channel id
+    """
+    channels = {}
+    cursor = None
+    while True:
+        response = slack_call('conversations.list', types='public_channel,private_channel',
+                              exclude_archived=True, limit=1000, cursor=cursor, max_wait=max_wait)
+        for channel in response.data.get('channels', []):
+            channels[channel.get('name')] = channel.get('id')
+        cursor = response.data.get('response_metadata', {}).get('next_cursor')
+        if not cursor:
+            return channels
+
+
+def get_channel_id(channel, max_wait=None):
+    """
+    resolve a channel name ('#lunch' or 'lunch') into its id, the listing of the channels is cached and
+    refreshed when the channel is missing from it (at most once every SLACK_DIRECTORY_MISS_REFRESH seconds)
+    :param channel: the channel name, or directly its id
+    :param max_wait: max seconds waiting for the rate limit of slack by call
+    :return: the channel id or None if the channel doesn't exist or isn't configured (empty CHANNEL_ID)
+    """
+    if not channel:
+        return None
+    name = channel.lstrip('#')
+    listing = cache.get(CHANNELS_CACHE_KEY)
+    if listing is None or (name not in listing['channels'] and name not in listing['channels'].values()
+                           and time.time() - listing['fetched_at'] > settings.SLACK_DIRECTORY_MISS_REFRESH):
+        listing = {'fetched_at': time.time(), 'channels': fetch_channels(max_wait)}
+        cache.set(CHANNELS_CACHE_KEY, listing, settings.SLACK_DIRECTORY_TTL)
+    if name in listing['channels'].values():
+        return name
+    return listing['channels'].get(name)
+
+
+def fetch_users():
+    """
+    walk all the pages of users.list once
+    :return: dict email -> slack user id
+    """
+    users = {}
+    cursor = None
+    while True:
+        response = slack_call('users.list', limit=1000, cursor=cursor)
+        for member in response.data.get('members', []):
+            email = member.get('profile', {}).get('email')
+            if email and not member.get('deleted'):
+                users[email.lower()] = member.get('id')
+        cursor = response.data.get('response_metadata', {}).get('next_cursor')
+        if not cursor:
+            return users
+
+
+def get_users(is_missing):
+    """
+    :param is_missing: function telling if a lookup is missing from the listing of the users
+    :return: dict email -> slack user id, the listing is cached and refreshed when a lookup is missing
+    from it (at most once every SLACK_DIRECTORY_MISS_REFRESH seconds)
+    """
+    listing = cache.get(USERS_CACHE_KEY)
+    if listing is None or (is_missing(listing['users'])
+                           and time.time() - listing['fetched_at'] > settings.SLACK_DIRECTORY_MISS_REFRESH):
+        listing = {'fetched_at': time.time(), 'users': fetch_users()}
+        cache.set(USERS_CACHE_KEY, listing, settings.SLACK_DIRECTORY_TTL)
+    return listing['users']
+
+
+def get_user_ids(emails):
+    """
+    resolve the emails of the employees into slack user ids
+    :param emails: list of emails
+    :return: dict email -> slack user id (the emails without slack account are missing)
+    """
+    users = get_users(lambda users: any(email.lower() not in users for email in emails))
+    return dict((email, users[email.lower()]) for email in emails if email.lower() in users)
+
+
+def get_emails(user_ids):
+    """
+    resolve slack user ids into the emails of their accounts
+    :param user_ids: list of slack user ids
+    :return: dict slack user id -> lower case email (the unknown users are missing)
+    """
+    user_ids = set(user_ids)
+    users = get_users(lambda users: not user_ids <= set(users.values()))
+    return dict((user_id, email) for email, user_id in users.items() if user_id in user_ids)
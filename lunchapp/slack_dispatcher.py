@@ -0,0 +1,250 @@
+from django.conf import settings
+from django.core.cache import caches
+from requests.exceptions import ConnectionError, Timeout
+from slack.errors import SlackApiError
+
+from .metrics import slack_call_duration
+from .slack_client import get_slack_client
+
+import aiohttp
+import asyncio
+import logging
+import random
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Requests per minute allowed by the slack tiers (https://api.slack.com/docs/rate-limits)
+SLACK_TIERS = {
+    1: 1,
+    2: 20,
+    3: 50,
+    4: 100,
+}
+
+METHOD_TIERS = {
+    'admin.users.invite': 2,
+    'conversations.list': 2,
+    'users.list': 2,
+    'team.info': 3,
+    'chat.postEphemeral': 4,
+    'conversations.open': 3,
+    'users.info': 4,
+    'users.lookupByEmail': 4,
+}
+
+NETWORK_ERRORS = (ConnectionError, Timeout, aiohttp.ClientError, asyncio.TimeoutError)
+
+# chat.postMessage has its own limit: about one message per second and per channel, the direct messages
+# (channel is a user or im id) share one bucket below the limit of the workspace (several hundreds per minute)
+POST_MESSAGE_PER_MINUTE = 60
+DIRECT_MESSAGES_PER_MINUTE = 300
+DIRECT_MESSAGE_PREFIXES = ('U', 'W', 'D')
+# Seconds the lock of a bucket is kept at most (a worker dying with it doesn't block the bucket longer)
+LOCK_SECONDS = 5
+
+
+class SlackBusy(Exception):
+    """
+    the call can't be sent within its max wait (the rate limit or the lock of its bucket), nothing was reserved
+    """
+
+
+def get_status(response):
+    """
+    :param response: the SlackResponse of an error (or the raw response dict when the body isn't json)
+    :return: tuple (http status, headers with lower case names)
+    """
+    if isinstance(response, dict):
+        status, headers = response.get('status'), response.get('headers') or {}
+    else:
+        status, headers = response.status_code, response.headers or {}
+    return status, dict((name.lower(), value) for name, value in dict(headers).items())
+
+
+def call_outcome(error):
+    """
+    :param error: the exception of a slack call, None when it succeeded
+    :return: the outcome label of the call in the metrics
+    """
+    if error is None:
+        return 'ok'
+    if isinstance(error, NETWORK_ERRORS):
+        return 'network_error'
+    if isinstance(error, SlackApiError):
+        status, headers = get_status(error.response)
+        if status == 429:
+            return 'rate_limited'
+        if status and status >= 500:
+            return 'server_error'
+    return 'error'
+
+
+def remaining(deadline):
+    """
+    :param deadline: time.monotonic() deadline or None
+    :return: seconds left before the deadline (None without deadline)
+    """
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+
+class SlackDispatcher(object):
+    """
+    Every slack call goes through the dispatcher: the calls of each method are spaced following its
+    tier limit (token bucket shared by all the workers through the 'slack' cache), the Retry-After
+    of a 429 blocks the method for every worker and the call is retried with jitter instead of being lost
+    """
+
+    def __init__(self, cache_alias='slack'):
+        self.cache_alias = cache_alias
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def get_bucket(self, method, kwargs):
+        """
+        :return: tuple (bucket name, requests per minute) of a call
+        """
+        if method == 'chat.postMessage':
+            channel = kwargs.get('channel') or ''
+            if channel.startswith(DIRECT_MESSAGE_PREFIXES):
+                return 'chat.postMessage:dm', \
+                    settings.SLACK_RATE_LIMITS.get('chat.postMessage:dm', DIRECT_MESSAGES_PER_MINUTE)
+            return 'chat.postMessage:%s' % channel, settings.SLACK_RATE_LIMITS.get(method, POST_MESSAGE_PER_MINUTE)
+        per_minute = settings.SLACK_RATE_LIMITS.get(method) or SLACK_TIERS[METHOD_TIERS.get(method, 3)]
+        return method, per_minute
+
+    def reserve(self, bucket, per_minute, max_wait=None):
+        """
+        reserve the next slot of the bucket (generic cell rate algorithm, a token bucket storing only the
+        theoretical arrival time of the next call)
+        :param max_wait: max seconds to wait, SlackBusy is raised without reserving when the slot is later
+        :return: seconds to wait before sending the call
+        """
+        interval = 60.0 / per_minute
+        burst = interval * (settings.SLACK_RATE_BURST - 1)
+        key = 'slack:rate:%s' % bucket
+        lock_key = '%s:lock' % key
+        # the bucket is never updated without its lock, concurrent updates would lose the reservations
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + (LOCK_SECONDS if max_wait is None else min(max_wait, LOCK_SECONDS))
+        while not self.cache.add(lock_key, token, LOCK_SECONDS):
+            if time.monotonic() >= deadline:
+                raise SlackBusy("Rate limiter of %s locked" % bucket)
+            time.sleep(0.01)
+        try:
+            now = time.time()
+            arrival = max(self.cache.get(key) or now, now)
+            wait = max(0.0, arrival - now - burst)
+            if max_wait is not None and wait > max_wait:
+                raise SlackBusy("Slack %s busy for %.1f seconds" % (bucket, wait))
+            self.cache.set(key, arrival + interval, int(arrival + interval - now) + 60)
+        finally:
+            if self.cache.get(lock_key) == token:
+                self.cache.delete(lock_key)
+        return wait
+
+    def block(self, method, seconds):
+        """
+        stop every worker calling the method for `seconds` (Retry-After of a 429)
+        """
+        self.cache.set('slack:blocked:%s' % method, time.time() + seconds, int(seconds) + 1)
+
+    def wait_time(self, method, kwargs, max_wait=None):
+        """
+        :param max_wait: max seconds to wait, SlackBusy is raised when the call would wait longer
+        :return: seconds to wait before the call is allowed
+        """
+        blocked_until = self.cache.get('slack:blocked:%s' % method)
+        blocked = max(0.0, blocked_until - time.time()) if blocked_until else 0.0
+        if max_wait is not None and blocked > max_wait:
+            raise SlackBusy("Slack %s blocked for %.1f seconds" % (method, blocked))
+        return max(blocked, self.reserve(*self.get_bucket(method, kwargs), max_wait=max_wait))
+
+    def retry_delay(self, method, error, attempt):
+        """
+        :return: seconds to wait before retrying the call or None if the error can't be retried
+        """
+        if isinstance(error, NETWORK_ERRORS):
+            return random.uniform(0, settings.SLACK_RETRY_BACKOFF * 2 ** attempt)
+        if isinstance(error, SlackApiError):
+            status, headers = get_status(error.response)
+            if status == 429:
+                retry_after = float(headers.get('retry-after') or 1)
+                self.block(method, retry_after)
+                return retry_after + random.uniform(0, settings.SLACK_RETRY_BACKOFF)
+            if status and status >= 500:
+                return random.uniform(0, settings.SLACK_RETRY_BACKOFF * 2 ** attempt)
+        return None
+
+    def call(self, method, max_wait=None, **kwargs):
+        """
+        :param method: the slack api method (e.g. 'chat.postMessage')
+        :param max_wait: max seconds spent waiting for the rate limit and the retries (e.g. in a web request),
+        SlackBusy (or the error of the last attempt) is raised instead of waiting longer
+        :param kwargs: the arguments of the method
+        :return: the slack response, the errors that can't be retried (or after SLACK_MAX_RETRIES) are raised
+        """
+        client_method = getattr(get_slack_client(), method.replace('.', '_'))
+        deadline = None if max_wait is None else time.monotonic() + max_wait
+        attempt = 0
+        while True:
+            time.sleep(self.wait_time(method, kwargs, max_wait=remaining(deadline)))
+            started = time.monotonic()
+            try:
+                response = client_method(**kwargs)
+                slack_call_duration.observe(time.monotonic() - started, method=method, outcome='ok')
+                return response
+            except Exception as e:
+                slack_call_duration.observe(time.monotonic() - started, method=method, outcome=call_outcome(e))
+                if not isinstance(e, (SlackApiError,) + NETWORK_ERRORS):
+                    raise
+                delay = self.retry_delay(method, e, attempt)
+                if delay is None or attempt >= settings.SLACK_MAX_RETRIES \
+                        or deadline is not None and delay > remaining(deadline):
+                    raise
+                attempt += 1
+                logger.info("Slack %s retried in %.1f seconds (attempt %s)" % (method, delay, attempt))
+                time.sleep(delay)
+
+    async def acall(self, client, method, **kwargs):
+        """
+        same as `call` from an event loop, the rate limiter (queries of the 'slack' cache and spin lock) runs in
+        the default executor of the loop so it never blocks the other calls
+        :param client: the AsyncWebClient
+        :param method: the slack api method (e.g. 'chat.postMessage')
+        :param kwargs: the arguments of the method
+        :return: the slack response
+        """
+        loop = asyncio.get_event_loop()
+        client_method = getattr(client, method.replace('.', '_'))
+        attempt = 0
+        while True:
+            await asyncio.sleep(await loop.run_in_executor(None, self.wait_time, method, kwargs))
+            started = time.monotonic()
+            try:
+                response = await client_method(**kwargs)
+                slack_call_duration.observe(time.monotonic() - started, method=method, outcome='ok')
+                return response
+            except Exception as e:
+                slack_call_duration.observe(time.monotonic() - started, method=method, outcome=call_outcome(e))
+                if not isinstance(e, (SlackApiError,) + NETWORK_ERRORS):
+                    raise
+                delay = await loop.run_in_executor(None, self.retry_delay, method, e, attempt)
+                if delay is None or attempt >= settings.SLACK_MAX_RETRIES:
+                    raise
+                attempt += 1
+                logger.info("Slack %s retried in %.1f seconds (attempt %s)" % (method, delay, attempt))
+                await asyncio.sleep(delay)
+
+
+dispatcher = SlackDispatcher()
+
+
+def slack_call(method, **kwargs):
+    """
+    send a slack call through the dispatcher of the process, max_wait bounds its wait (see SlackDispatcher.call)
+    """
+    return dispatcher.call(method, **kwargs)
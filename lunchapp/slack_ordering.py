@@ -0,0 +1,203 @@
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Lower
+from django.utils import translation
+from django.utils.translation import ugettext as _
+
+from .constants import LANG_TYPE
+from .caching import shared_cache
+from .metrics import cache_lookup
+from .models import Employee, PlannedMenu, SlackMealChoice
+from .ordering import local_date, ordering_closed, window_times
+from .orders import place_order
+from .slack_directory import get_emails
+from .slack_dispatcher import slack_call
+from .utils import logger
+
+import hashlib
+import hmac
+import time
+
+ACTION_PREFIX = 'order_meal_'
+# Slack accepts 50 blocks by message, one is kept for the text of the reminder
+MAX_MEAL_BLOCKS = 49
+
+
+def escape_text(text):
+    """
+    escape the control characters of the slack text formatting (https://api.slack.com/reference/surfaces/formatting)
+    :param text: text typed by a user, e.g. the name of a meal
+    :return: the text shown as is by slack
+    """
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def verify_signature(body, timestamp, signature):
+    """
+    check the signature of a request sent by slack (https://api.slack.com/authentication/verifying-requests-from-slack)
+    :param body: the raw body of the request
+    :param timestamp: the X-Slack-Request-Timestamp header
+    :param signature: the X-Slack-Signature header
+    :return: True if the request comes from slack and isn't replayed
+    """
+    if not settings.SLACK_SIGNING_SECRET or not timestamp or not signature:
+        return False
+    try:
+        if abs(time.time() - int(timestamp)) > settings.SLACK_SIGNATURE_MAX_AGE:
+            return False
+    except ValueError:
+        return False
+    base = b'v0:' + timestamp.encode('utf-8') + b':' + body
+    expected = 'v0=' + hmac.new(settings.SLACK_SIGNING_SECRET.encode('utf-8'), base, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def menu_blocks_key(planned_menu_id, language):
+    return 'slack:menu_blocks:%s:%s' % (planned_menu_id, language)
+
+
+def invalidate_menu_blocks(planned_menu_ids):
+    """
+    drop the cached block kit layout of menus (their meals changed)
+    :param planned_menu_ids: ids of the menus
+    """
+    shared_cache().delete_many([menu_blocks_key(planned_menu_id, language)
+                                for planned_menu_id in planned_menu_ids for language, name in LANG_TYPE])
+
+
+def menu_blocks(planned_menu, language='en'):
+    """
+    render the meals of a menu as block kit sections, each one with the button to choose it, the layout is
+    cached per menu and language until the meals of the menu change (see lunchapp/signals.py)
+    :param planned_menu: the menu
+    :param language: the language of the buttons
+    :return: list of blocks
+    """
+    key = menu_blocks_key(planned_menu.pk, language)
+    blocks = cache_lookup('menu_blocks', shared_cache().get(key))
+    if blocks is None:
+        with translation.override(language):
+            blocks = [{
+                'type': 'section',
+                'block_id': 'meal_%s' % meal.pk,
+                'text': {'type': 'mrkdwn', 'text': '*%s*\n%s, %s' % (
+                    escape_text(meal.principal_meal), escape_text(meal.salad), escape_text(meal.dessert))},
+                'accessory': {
+                    'type': 'button',
+                    'action_id': '%s%s' % (ACTION_PREFIX, meal.pk),
+                    'text': {'type': 'plain_text', 'text': _("Choose")},
+                    'value': '%s:%s' % (planned_menu.pk, meal.pk),
+                },
+            } for meal in planned_menu.meals.order_by('pk')[:MAX_MEAL_BLOCKS]]
+        shared_cache().set(key, blocks, settings.MENU_BLOCKS_TTL)
+    return blocks
+
+
+def reminder_blocks(text, planned_menu, language='en'):
+    """
+    :param text: the text of the reminder, it keeps the link to the menu page as fallback
+    :param planned_menu: the menu of the reminder
+    :param language: the language of the reminder
+    :return: the block kit layout of the reminder, its text followed by the meals of the menu
+    """
+    return [{'type': 'section', 'text': {'type': 'mrkdwn', 'text': text}}] + menu_blocks(planned_menu, language)
+
+
+def record_meal_choices(payload):
+    """
+    store the meals chosen in a 'block_actions' payload of slack, they are applied later by the worker
+    :param payload: the decoded interaction payload
+    :return: list of created choices
+    """
+    if payload.get('type') != 'block_actions':
+        return []
+    user_id = (payload.get('user') or {}).get('id')
+    channel_id = (payload.get('channel') or {}).get('id') or ''
+    choices = []
+    for action in payload.get('actions') or []:
+        if not user_id or not (action.get('action_id') or '').startswith(ACTION_PREFIX):
+            continue
+        try:
+            planned_menu_id, meal_id = [int(value) for value in action.get('value', '').split(':')]
+        except ValueError:
+            continue
+        choices.append(SlackMealChoice(slack_user_id=user_id, channel_id=channel_id,
+                                       planned_menu_id=planned_menu_id, meal_id=meal_id))
+    if not choices:
+        return []
+    try:
+        with transaction.atomic():
+            return SlackMealChoice.objects.bulk_create(choices)
+    except IntegrityError as e:
+        logger.error("Meal choice of %s for a deleted menu %s" % (user_id, e))
+        return []
+
+
+def apply_choice(choice, employee, menu_meals, menu_dates):
+    """
+    apply one choice with the rules of the employee dashboard
+    :return: the message answered to the employee
+    """
+    if employee is None:
+        choice.status = 'rejected'
+        choice.error = _("No employee has the email of your slack account")
+    elif ordering_closed(employee.user.country, choice.chosen_at):
+        choice.status = 'rejected'
+        choice.error = _("Sorry but you can't choose your preferred meal after %(time)s") % {
+            'time': window_times(employee.user.country)[1]}
+    elif (choice.planned_menu_id, choice.meal_id) not in menu_meals \
+            or menu_dates.get(choice.planned_menu_id) != local_date(employee.user.country, choice.chosen_at):
+        choice.status = 'rejected'
+        choice.error = _("This meal isn't in today's menu")
+    else:
+        choice.employee = employee
+        try:
+            place_order(employee, choice.meal_id, menu_dates[choice.planned_menu_id])
+            choice.status = 'applied'
+            return _("Your meal of today is %(meal)s") % {'meal': escape_text(choice.meal.principal_meal)}
+        except IntegrityError as e:
+            logger.error("Error in applying meal choice %s %s" % (choice.pk, e))
+            choice.status = 'failed'
+            choice.error = _("Sorry, your choice couldn't be saved, please choose it on the website")
+    return choice.error
+
+
+def apply_meal_choices(batch_size=None):
+    """
+    apply the pending meal choices of the slack buttons to the employees and answer them on slack
+    :param batch_size: max number of choices applied
+    :return: number of choices processed
+    """
+    pending = dict(SlackMealChoice.objects.filter(status='pending').order_by('chosen_at', 'pk')
+                   .values_list('pk', 'slack_user_id')[:batch_size or settings.REMINDER_BATCH_SIZE])
+    if not pending:
+        return 0
+    # get_emails can call slack: it runs before the transaction so the rows aren't locked during the call
+    emails = get_emails(pending.values())
+    with transaction.atomic():
+        choices = list(SlackMealChoice.objects.select_for_update(skip_locked=True)
+                       .select_related('meal')
+                       .filter(pk__in=pending.keys(), status='pending')
+                       .order_by('chosen_at', 'pk'))
+        if not choices:
+            return 0
+        employees = dict((employee.email, employee) for employee in Employee.objects.select_related('user')
+                         .annotate(email=Lower('user__email')).filter(email__in=emails.values()))
+        menu_ids = set(choice.planned_menu_id for choice in choices)
+        menu_meals = set(PlannedMenu.meals.through.objects.filter(plannedmenu_id__in=menu_ids)
+                         .values_list('plannedmenu_id', 'meal_id'))
+        menu_dates = dict(PlannedMenu.objects.filter(pk__in=menu_ids).values_list('pk', 'planned_date'))
+        answers = []
+        for choice in choices:
+            employee = employees.get(emails.get(choice.slack_user_id))
+            with translation.override(employee.user.language if employee else 'en'):
+                answers.append((choice, apply_choice(choice, employee, menu_meals, menu_dates)))
+        SlackMealChoice.objects.bulk_update(choices, ['status', 'employee', 'error'])
+    for choice, text in answers:
+        if not choice.channel_id:
+            continue
+        try:
+            slack_call('chat.postEphemeral', channel=choice.channel_id, user=choice.slack_user_id, text=text)
+        except Exception as e:
+            logger.error("Error in answering meal choice %s %s" % (choice.pk, e))
+    return len(choices)
@@ -0,0 +1,135 @@
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs
+
+import json
+import random
+import threading
+import time
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class SlackStandInHandler(BaseHTTPRequestHandler):
+    """
+    Answer the slack web api methods used by the app like slack does
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        standin = self.server.standin
+        method = self.path.split('?')[0].rstrip('/').split('/')[-1]
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0)).decode('utf-8')
+        if 'json' in (self.headers.get('Content-Type') or ''):
+            params = json.loads(body or '{}')
+        else:
+            params = dict((key, values[0]) for key, values in parse_qs(body).items())
+        status, headers, data = standin.answer(method, params)
+        content = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_GET = do_POST
+
+    def log_message(self, *args):
+        pass
+
+
+class SlackStandIn(object):
+    """
+    Local HTTP stand-in of the slack web api (chat.postMessage, chat.postEphemeral, conversations.list,
+    team.info, admin.users.invite and users.list) with configurable latency, errors and rate limits, to load test
+    the notification paths without calling slack
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, error_rate=0.0, rate_limit_rate=0.0,
+                 retry_after=1, channels=None, users=None, page_size=100):
+        """
+        :param latency: seconds added to every answer
+        :param jitter: random seconds (0 to jitter) added to the latency
+        :param error_rate: part of the calls answered with a http 500
+        :param rate_limit_rate: part of the calls answered with a 429 and a Retry-After
+        :param retry_after: Retry-After of the 429 in seconds
+        :param channels: dict channel name -> id (default {'lunch': 'C0LUNCH'})
+        :param users: dict email -> user id
+        :param page_size: number of channels/users by page of conversations.list/users.list
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.channels = channels or {'lunch': 'C0LUNCH'}
+        self.users = users or {}
+        self.page_size = page_size
+        self.calls = {}
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), SlackStandInHandler)
+        self.server.standin = self
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return 'http://%s:%s/api/' % (host, port)
+
+    def start(self):
+        """
+        serve in a background thread
+        """
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def paginate(self, items, params):
+        start = int(params.get('cursor') or 0)
+        end = start + self.page_size
+        return items[start:end], {'next_cursor': str(end) if end < len(items) else ''}
+
+    def answer(self, method, params):
+        """
+        :return: tuple (http status, headers, json body) of a call
+        """
+        with self.lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+        time.sleep(self.latency + random.uniform(0, self.jitter))
+        draw = random.random()
+        if draw < self.rate_limit_rate:
+            return 429, {'Retry-After': str(self.retry_after)}, {'ok': False, 'error': 'ratelimited'}
+        if draw < self.rate_limit_rate + self.error_rate:
+            return 500, {}, {'ok': False, 'error': 'internal_error'}
+
+        if method == 'chat.postMessage':
+            return 200, {}, {'ok': True, 'channel': params.get('channel'), 'ts': '%.6f' % time.time(),
+                             'message': {'text': params.get('text')}}
+        if method == 'chat.postEphemeral':
+            return 200, {}, {'ok': True, 'message_ts': '%.6f' % time.time()}
+        if method == 'team.info':
+            return 200, {}, {'ok': True, 'team': {'id': 'T0STANDIN', 'name': 'stand-in'}}
+        if method == 'conversations.list':
+            channels, metadata = self.paginate(sorted(self.channels.items()), params)
+            return 200, {}, {'ok': True, 'channels': [{'name': name, 'id': channel_id}
+                                                      for name, channel_id in channels],
+                             'response_metadata': metadata}
+        if method == 'users.list':
+            users, metadata = self.paginate(sorted(self.users.items()), params)
+            return 200, {}, {'ok': True, 'members': [{'id': user_id, 'profile': {'email': email}}
+                                                     for email, user_id in users],
+                             'response_metadata': metadata}
+        if method == 'admin.users.invite':
+            return 200, {}, {'ok': True}
+        return 200, {}, {'ok': False, 'error': 'unknown_method'}
@@ -1,7 +1,51 @@
-from django.test import TestCase, Client
-from .models import Employee, PlannedMenu, Profile, Meal, Responsible
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.template.loader import render_to_string
+from django.db import connection, DatabaseError
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import trans_real
+from .models import Employee, MealOrder, PlannedMenu, Profile, Meal, ReminderCampaign, ReminderDelivery, Responsible, \
+    ScheduledReminder, SchedulerLease, SlackInvitation, SlackMealChoice
+from .constants import COUNTRY
+from .forms import AddMenu, CustomizationEmployee
+from .menus import meal_choices, plan_menus, planning_dates, seconds_until_midnight, today_menu, today_menu_entry
+from .metrics import registry
+from .onboarding import import_profiles, validate_rows
+from .ordering import compute_window, local_date, ordering_closed, ordering_window
+from .orders import create_order_partitions, place_order
+from .reminders import claim_deliveries, deliver_direct_messages, direct_message_chunk_size, enqueue_reminder, \
+    release_stale_deliveries
+from .scheduler import acquire_lease, fire_reminder, local_fire_time, ReminderScheduler
+from .slack_client import get_slack_client, PooledWebClient, reset_slack_client
+from .slack_directory import CHANNELS_CACHE_KEY, get_channel_id, TEAM_CACHE_KEY
+from .slack_dispatcher import slack_call, SlackBusy, SlackDispatcher
+from .slack_ordering import apply_meal_choices, reminder_blocks
+from .slack_standin import SlackStandIn
+from slack.errors import SlackApiError
+from .utils import invite_to_channel, percentile
+from .views import AddingMenuView, DashboardAdminView, DashboardEmployeeView, DashboardResponsibleView
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from io import StringIO
+from unittest import mock
+from urllib.parse import urlencode
+
+import ast
+import gettext
+import hashlib
+import hmac
+import json
+import os
+import tempfile
+import threading
+import time
 
 import datetime
+import pytz
 import uuid
 
 
@@ -170,6 +214,55 @@ class TestDashboardAdmin(TestCase):
         response = client.get('/dashboard/admin/%s/' % user_responsible.pk)
         self.assertEqual(response.status_code, 302)
 
+    @override_settings(ADMIN_PAGE_SIZE=10)
+    def test_directory(self):
+        Profile.objects.bulk_create([Profile(email='user%02d@gmail.com' % i, first_name='Anna' if i % 2 else 'Bob',
+                                             last_name='Smith%02d' % i, country='Peru' if i % 5 else 'Chile',
+                                             is_employee=True, phone='01%02d' % i) for i in range(22)])
+        client = Client(HTTP_USER_AGENT='Mozilla/5.0')
+        user = Profile.objects.get(email='test_admin@gmail.com')
+        client.login(username=user.email, password='it is secret!')
+        url = '/dashboard/admin/%s/' % user.pk
+
+        # walk the 25 profiles page by page on the primary key
+        seen = []
+        response = client.get(url)
+        self.assertIsNone(response.context['previous_pk'])
+        while True:
+            seen += [profile['pk'] for profile in response.context['profiles']]
+            if response.context['next_pk'] is None:
+                break
+            response = client.get(url, {'after': response.context['next_pk']})
+        self.assertEqual(seen, list(Profile.objects.order_by('pk').values_list('pk', flat=True)))
+        self.assertEqual(len(response.context['profiles']), 5)
+        response = client.get(url, {'before': response.context['previous_pk']})
+        self.assertEqual([profile['pk'] for profile in response.context['profiles']], seen[10:20])
+        self.assertIsNotNone(response.context['previous_pk'])
+        self.assertIsNotNone(response.context['next_pk'])
+
+        # the password hashes are never read
+        with CaptureQueriesContext(connection) as queries:
+            client.get(url)
+        page_queries = [query['sql'] for query in queries if 'FROM "lunchapp_profile"' in query['sql']
+                        and 'LIMIT 11' in query['sql']]
+        self.assertTrue(page_queries)
+        for sql in page_queries:
+            self.assertNotIn('password', sql)
+
+        # search and filters
+        response = client.get(url, {'q': 'ann'})
+        self.assertEqual(len(response.context['profiles']), 10)
+        self.assertEqual(set(profile['first_name'] for profile in response.context['profiles']), {'Anna'})
+        self.assertContains(response, '?q=ann&amp;after=')
+        response = client.get(url, {'q': 'USER0'})
+        self.assertEqual(len(response.context['profiles']), 10)
+        response = client.get(url, {'q': 'smith1', 'country': 'Chile'})
+        self.assertEqual([profile['last_name'] for profile in response.context['profiles']], ['Smith10', 'Smith15'])
+        response = client.get(url, {'role': 'responsible'})
+        self.assertEqual([profile['email'] for profile in response.context['profiles']],
+                         ['test_responsible@gmail.com'])
+        self.assertIsNone(response.context['next_pk'])
+
 
 class TestAddUserAdmin(TestCase):
 
@@ -200,15 +293,21 @@ class TestAddUserAdmin(TestCase):
         client.login(username=user_admin.email, password='it is secret!')
         response = client.get('/add_user/%s/' % user_admin.pk)
         self.assertEqual(response.status_code, 200)
-        response_post = client.post('/add_user/%s/' % user_admin.pk, {'email': 'test@gmail.com',
-                                                                      'first_name': 'user_name',
-                                                                      'last_name': 'last_name_user',
-                                                                      'phone': '00948485894',
-                                                                      'country': 'Chile',
-                                                                      'is_active': True,
-                                                                      'is_responsible': False,
-                                                                      'is_employee': True})
-        self.assertEqual(response_post.status_code, 200)
+        # Slack is busy: the invitation is queued for the reminder worker
+        with mock.patch('lunchapp.views.invite_to_channel', return_value=False) as invite:
+            response_post = client.post('/add_user/%s/' % user_admin.pk, {'email': 'test@gmail.com',
+                                                                          'first_name': 'user_name',
+                                                                          'last_name': 'last_name_user',
+                                                                          'phone': '00948485894',
+                                                                          'country': 'Chile',
+                                                                          'is_active': True,
+                                                                          'is_responsible': False,
+                                                                          'is_employee': True})
+        self.assertEqual(invite.call_args[1], {'max_wait': settings.SLACK_REQUEST_MAX_WAIT})
+        self.assertEqual(list(SlackInvitation.objects.values_list('email', flat=True)), ['test@gmail.com'])
+        self.assertEqual(response_post.status_code, 302)
+        self.assertEqual(response_post.url, '/add_user/%s/' % user_admin.pk)
+        self.assertEqual(Employee.objects.filter(user__email='test@gmail.com').count(), 1)
 
         # Responsible profile
         user_responsible = Profile.objects.get(email='test_responsible@gmail.com')
@@ -323,6 +422,61 @@ class TestDashboardResponsible(TestCase):
         response = client.get('/dashboard/responsible/%s/' % user_responsible.pk)
         self.assertEqual(response.status_code, 302)
 
+    def add_employees(self, count, start=0):
+        for i in range(start, start + count):
+            profile = Profile.objects.create(email='employee%s@gmail.com' % i, first_name='first%s' % i,
+                                             last_name='last%s' % i, phone='00%s' % i,
+                                             country='Chile' if i % 2 else 'Peru', is_active=True, is_admin=False,
+                                             is_responsible=False, is_employee=True)
+            meal = Meal.objects.create(principal_meal='Meal %s' % i, salad='Salad', dessert='Cake')
+            employee = Employee.objects.create(user=profile, preferred_meal=meal)
+            # one of three employees hasn't ordered today, his last choice is from yesterday
+            day = local_date(profile.country)
+            MealOrder.objects.create(employee=employee, meal=meal,
+                                     date=day if i % 3 else day - datetime.timedelta(days=1))
+
+    @override_settings(DASHBOARD_PAGE_SIZE=10)
+    def test_employees_page(self):
+        client = Client(HTTP_USER_AGENT='Mozilla/5.0')
+        user_responsible = Profile.objects.get(email='test_responsible@gmail.com')
+        client.login(username=user_responsible.email, password='it is responsible!')
+        url = '/dashboard/responsible/%s/' % user_responsible.pk
+
+        # the cost of a page doesn't depend on the number of employees
+        self.add_employees(3)
+        client.get(url)
+        with CaptureQueriesContext(connection) as few:
+            response = client.get(url)
+        self.assertEqual(len(response.context['employees']), 3)
+        self.add_employees(30, start=3)
+        with CaptureQueriesContext(connection) as many:
+            response = client.get(url)
+        self.assertEqual(len(many), len(few))
+        self.assertEqual(len(response.context['employees']), 10)
+        self.assertEqual(response.context['page'].paginator.count, 33)
+
+        response = client.get(url, {'page': 4})
+        self.assertEqual(len(response.context['employees']), 3)
+        response = client.get(url, {'page': 'x'})
+        self.assertEqual(response.context['page'].number, 1)
+
+        # filters
+        response = client.get(url, {'country': 'Peru', 'meal': 'chosen'})
+        employees = list(response.context['page'].paginator.object_list)
+        self.assertEqual(len(employees), 11)
+        for employee in employees:
+            self.assertEqual(employee.user.country, 'Peru')
+            self.assertTrue(employee.has_order)
+        response = client.get(url, {'meal': 'none', 'page': 2})
+        self.assertEqual(response.context['page'].paginator.count, 11)
+        self.assertContains(response, '?meal=none&amp;page=1')
+        self.assertContains(response, 'No meal chosen today')
+        # the meal of today is shown, not the last choice
+        response = client.get(url, {'meal': 'chosen'})
+        for employee in response.context['employees']:
+            self.assertEqual(employee.today_order.date, local_date(employee.user.country))
+            self.assertContains(response, '(%s, Salad, Cake)' % employee.today_order.meal.principal_meal)
+
 
 class TestAddMenuResponsible(TestCase):
 
@@ -595,7 +749,30 @@ class TestDashboardEmployee(TestCase):
                                      'preferred_meal': menu.meals.all()[0]})
         self.assertEqual(response_post.status_code, 302)
 
+    def test_no_menu_today(self):
+        menu = PlannedMenu.objects.get()
+        menu.planned_date = local_date('Chile') - datetime.timedelta(days=1)
+        menu.save()
+        meal = menu.meals.first()
+        # The meals of yesterday's menu can't be ordered for today
+        user_employee = Profile.objects.get(email='test_employee@gmail.com')
+        client = Client(HTTP_USER_AGENT='Mozilla/5.0')
+        client.login(username=user_employee.email, password='it is employee!')
+        response = client.get('/dashboard/employee/%s/' % user_employee.pk)
+        self.assertContains(response, "There's no menu today")
+        self.assertEqual(response.context['form'].fields['preferred_meal'].choices, [(None, 'No meal preferred')])
+        with mock.patch('lunchapp.views.ordering_closed', return_value=False):
+            client.post('/dashboard/employee/%s/' % user_employee.pk, {'preferred_meal': meal.pk})
+        self.assertEqual(MealOrder.objects.count(), 0)
+        # and no reminder is sent for it
+        user_responsible = Profile.objects.get(email='test_responsible@gmail.com')
+        client = Client(HTTP_USER_AGENT='Mozilla/5.0')
+        client.login(username=user_responsible.email, password='it is responsible!')
+        client.post('/send_reminder/%s/' % user_responsible.pk)
+        self.assertEqual(ReminderCampaign.objects.count(), 0)
+
 
+@override_settings(CACHE_SHARED=True)
 class TestTodayMenu(TestCase):
     def setUp(self):
         user = Profile.objects.create(email='test_admin@gmail.com', first_name='test',
@@ -657,3 +834,1416 @@ class TestTodayMenu(TestCase):
         client = Client(HTTP_USER_AGENT='Mozilla/5.0')
         response = client.get('/menu/%s/' % str(uuid.uuid4))
         self.assertEqual(response.status_code, 404)
+
+    def test_page_cache(self):
+        cache.clear()
+        menu = PlannedMenu.objects.get(planned_date=datetime.date.today())
+        client = Client(HTTP_USER_AGENT='Mozilla/5.0')
+        self.assertContains(client.get('/menu/%s/' % menu.uuid_menu), 'Corn pie')
+        # The anonymous users get the cached page without any query
+        with self.assertNumQueries(0):
+            self.assertContains(client.get('/menu/%s/' % menu.uuid_menu), 'Corn pie')
+        # The page follows the changes of the meals and of the menu
+        meal = Meal.objects.get(principal_meal='Corn pie')
+        meal.principal_meal = 'Pastel de choclo'
+        meal.save()
+        self.assertContains(client.get('/menu/%s/' % menu.uuid_menu), 'Pastel de choclo')
+        menu.meals.remove(meal)
+        self.assertNotContains(client.get('/menu/%s/' % menu.uuid_menu), 'Pastel de choclo')
+        menu.meals.add(Meal.objects.create(principal_meal='Empanadas', salad='Green salad', dessert='Flan'))
+        self.assertContains(client.get('/menu/%s/' % menu.uuid_menu), 'Empanadas')
+        # The logged in users don't share the cached page
+        user = Profile.objects.get(email='test_admin@gmail.com')
+        client.login(username=user.email, password='it is secret!')
+        self.assertContains(client.get('/menu/%s/' % menu.uuid_menu), 'Empanadas')
+        menu.delete()
+        self.assertEqual(Client().get('/menu/%s/' % menu.uuid_menu).status_code, 404)
+
+    def test_conditional_get(self):
+        cache.clear()
+        menu = PlannedMenu.objects.get(planned_date=datetime.date.today())
+        client = Client(HTTP_USER_AGENT='Mozilla/5.0')
+        response = client.get('/menu/%s/' % menu.uuid_menu)
+        self.assertIn('public', response['Cache-Control'])
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        with self.assertNumQueries(0):
+            response = client.get('/menu/%s/' % menu.uuid_menu, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(client.get('/menu/%s/' % menu.uuid_menu, HTTP_IF_MODIFIED_SINCE=last_modified).status_code,
+                         304)
+        # A new version of a meal bumps the revision of its menus and changes their ETag
+        meal = Meal.objects.get(principal_meal='Corn pie')
+        meal.dessert = 'Ice cream'
+        meal.save()
+        self.assertEqual(PlannedMenu.objects.get(pk=menu.pk).revision, menu.revision + 1)
+        response = client.get('/menu/%s/' % menu.uuid_menu, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, 'Ice cream')
+        # The pages of the logged in users aren't shared
+        user = Profile.objects.get(email='test_admin@gmail.com')
+        client.login(username=user.email, password='it is secret!')
+        response = client.get('/menu/%s/' % menu.uuid_menu, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+
+
+@override_settings(CACHE_SHARED=True)
+class TestRoleAuthorization(TestCase):
+
+    def setUp(self):
+        self.users = {}
+        for role in ('admin', 'responsible', 'employee'):
+            user = Profile.objects.create(email='test_%s@gmail.com' % role, first_name='test', last_name='test',
+                                          phone='009%s' % role, country='Chile', is_active=True,
+                                          is_admin=role == 'admin', is_responsible=role == 'responsible',
+                                          is_employee=role == 'employee')
+            user.set_password('it is %s!' % role)
+            user.save()
+            self.users[role] = user
+        Responsible.objects.create(user=self.users['responsible'])
+        Employee.objects.create(user=self.users['employee'])
+        meal = Meal.objects.create(principal_meal='Chicken', salad='Green salad', dessert='Lemon pie')
+        PlannedMenu.objects.create(planned_date=datetime.date.today()).meals.add(meal)
+
+    def client_of(self, role):
+        client = Client(HTTP_USER_AGENT='Mozilla/5.0')
+        client.login(username=self.users[role].email, password='it is %s!' % role)
+        return client
+
+    def test_single_dispatch(self):
+        for role, url, view in (('admin', '/dashboard/admin/%s/', DashboardAdminView),
+                                ('responsible', '/dashboard/responsible/%s/', DashboardResponsibleView),
+                                ('responsible', '/add_menu/%s/', AddingMenuView),
+                                ('employee', '/dashboard/employee/%s/', DashboardEmployeeView)):
+            client = self.client_of(role)
+            with mock.patch.object(view, 'get', autospec=True, side_effect=view.get) as get:
+                response = client.get(url % self.users[role].pk)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(get.call_count, 1)
+
+        # A post runs once: one campaign for one click
+        client = self.client_of('responsible')
+        client.post('/send_reminder/%s/' % self.users['responsible'].pk)
+        self.assertEqual(ReminderCampaign.objects.count(), 1)
+
+    @override_settings(CHANNEL_ID='#lunch')
+    def test_query_counts(self):
+        # The first request loads the user and his role, the next ones only read the session and the order of
+        # the day (today's menu and the meals are cached too)
+        client = self.client_of('employee')
+        with CaptureQueriesContext(connection) as queries:
+            client.get('/dashboard/employee/%s/' % self.users['employee'].pk)
+        self.assertEqual(len([query for query in queries if 'FROM "lunchapp_profile"' in query['sql']]), 1)
+        self.assertEqual(len([query for query in queries if 'FROM "lunchapp_employee"' in query['sql']]), 1)
+        with self.assertNumQueries(2):
+            response = client.get('/dashboard/employee/%s/' % self.users['employee'].pk)
+        self.assertEqual(response.status_code, 200)
+        # session and the page of profiles: the profile of the url is the connected admin
+        client = self.client_of('admin')
+        client.get('/dashboard/admin/%s/' % self.users['admin'].pk)
+        with self.assertNumQueries(2):
+            client.get('/dashboard/admin/%s/' % self.users['admin'].pk)
+        # the responsible row is read once and shared with the handler
+        client = self.client_of('responsible')
+        with CaptureQueriesContext(connection) as queries:
+            client.post('/send_reminder/%s/' % self.users['responsible'].pk)
+        self.assertEqual(len([query for query in queries if 'FROM "lunchapp_responsible"' in query['sql']]), 1)
+        self.assertEqual(len([query for query in queries if 'INSERT INTO "lunchapp_remindercampaign"'
+                              in query['sql']]), 1)
+
+    def test_cache_invalidation(self):
+        client = self.client_of('employee')
+        url = '/dashboard/employee/%s/' % self.users['employee'].pk
+        self.assertEqual(client.get(url).status_code, 200)
+        # A change of the profile or of the role rows is seen by the next request
+        Employee.objects.all().delete()
+        self.assertEqual(client.get(url).status_code, 404)
+        Employee.objects.create(user=self.users['employee'])
+        self.assertEqual(client.get(url).status_code, 200)
+        self.users['employee'].is_employee = False
+        self.users['employee'].save()
+        self.assertEqual(client.get(url).status_code, 302)
+        self.users['employee'].is_employee = True
+        self.users['employee'].is_active = False
+        self.users['employee'].save()
+        self.assertEqual(client.get(url).status_code, 302)
+        # A new password closes the sessions
+        self.users['employee'].is_active = True
+        self.users['employee'].set_password('new password')
+        self.users['employee'].save()
+        response = client.get(url)
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.url.startswith('/login/'))
+
+    @override_settings(CACHE_SHARED=False)
+    def test_per_process_cache(self):
+        client = self.client_of('employee')
+        url = '/dashboard/employee/%s/' % self.users['employee'].pk
+        self.assertEqual(client.get(url).status_code, 200)
+        # Another process deactivates the user: without a shared cache the profile and the role are read from
+        # the database by every request
+        with self.settings(CACHE_SHARED=True):
+            client.get(url)
+        Profile.objects.filter(pk=self.users['employee'].pk).update(is_active=False)
+        self.assertEqual(client.get(url).status_code, 302)
+        Profile.objects.filter(pk=self.users['employee'].pk).update(is_active=True)
+        Employee.objects.filter(user=self.users['employee']).update(user=self.users['admin'])
+        self.assertEqual(client.get(url).status_code, 404)
+
+    def test_denied(self):
+        client = self.client_of('employee')
+        response = client.get('/dashboard/admin/%s/' % self.users['employee'].pk)
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.url.startswith('/login/'))
+        client = self.client_of('admin')
+        response = client.get('/dashboard/admin/%s/' % self.users['employee'].pk)
+        self.assertEqual(response.status_code, 403)
+        response = client.get('/dashboard/admin/0/')
+        self.assertEqual(response.status_code, 404)
+        Employee.objects.all().delete()
+        client = self.client_of('employee')
+        response = client.get('/dashboard/employee/%s/' % self.users['employee'].pk)
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(CHANNEL_ID='#lunch')
+class TestReminderCampaign(TestCase):
+
+    def setUp(self):
+        user_responsible = Profile.objects.create(email='test_responsible@gmail.com', first_name='test',
+                                                  last_name='test', phone='0094883933',
+                                                  country='Chile', is_active=True, is_admin=False,
+                                                  is_responsible=True, is_employee=False)
+        user_responsible.set_password('it is responsible!')
+        user_responsible.save()
+        Responsible.objects.create(user=user_responsible)
+        meal = Meal.objects.create(principal_meal='Chicken', salad='Green salad', dessert='Lemon pie')
+        today_menu = PlannedMenu.objects.create(planned_date=datetime.date.today())
+        today_menu.meals.add(meal)
+
+    def test_functions(self):
+        client = Client(HTTP_USER_AGENT='Mozilla/5.0')
+        user_responsible = Profile.objects.get(email='test_responsible@gmail.com')
+        client.login(username=user_responsible.email, password='it is responsible!')
+
+        # The view only queues the reminder
+        with mock.patch('lunchapp.reminders.post_message') as post_message:
+            response_post = client.post('/send_reminder/%s/' % user_responsible.pk)
+            self.assertEqual(post_message.call_count, 0)
+        self.assertEqual(response_post.status_code, 302)
+        campaign = ReminderCampaign.objects.get()
+        self.assertEqual(campaign.status, 'pending')
+        self.assertEqual(campaign.progress()['pending'], 1)
+
+        # The worker sends it and records the delivery
+        with mock.patch('lunchapp.reminders.post_message') as post_message:
+            call_command('reminder_worker', '--once')
+            self.assertEqual(post_message.call_count, ReminderDelivery.objects.count())
+        campaign.refresh_from_db()
+        delivery = campaign.deliveries.get()
+        self.assertEqual(campaign.status, 'done')
+        self.assertEqual(delivery.status, 'sent')
+        self.assertEqual(delivery.attempts, 1)
+        self.assertIsNotNone(delivery.latency_ms)
+
+        # The dashboard shows the progress without sending anything
+        with mock.patch('lunchapp.reminders.post_message') as post_message:
+            response = client.get('/dashboard/responsible/%s/' % user_responsible.pk)
+            self.assertEqual(post_message.call_count, 0)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(campaign, response.context['campaigns'])
+
+    def test_failure_and_crash_recovery(self):
+        responsible = Responsible.objects.get()
+        campaign = ReminderCampaign.objects.create(planned_menu=PlannedMenu.objects.get(), responsible=responsible,
+                                                   message='menu')
+        # A delivery left 'sending' by a crashed worker
+        ReminderDelivery.objects.create(campaign=campaign, target='#lunch', status='sending', attempts=1,
+                                        locked_at=timezone.now() - datetime.timedelta(hours=1))
+        with self.settings(REMINDER_MAX_ATTEMPTS=2, REMINDER_RETRY_DELAY=0), \
+                mock.patch('lunchapp.reminders.post_message', side_effect=Exception('channel_not_found')):
+            call_command('reminder_worker', '--once')
+        delivery = campaign.deliveries.get()
+        self.assertEqual(delivery.status, 'failed')
+        self.assertEqual(delivery.attempts, 2)
+        self.assertEqual(delivery.error, 'channel_not_found')
+        campaign.refresh_from_db()
+        self.assertEqual(campaign.status, 'done')
+
+
+class KeepAliveSlackHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        body = b'{"ok": true, "channel": "C1", "ts": "1.1"}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(SLACK_CONNECT_TIMEOUT=3, SLACK_READ_TIMEOUT=10)
+class TestSlackClient(TestCase):
+
+    def tearDown(self):
+        reset_slack_client()
+
+    def test_shared_client(self):
+        client = get_slack_client()
+        self.assertIs(get_slack_client(), client)
+        self.assertEqual((client.connect_timeout, client.read_timeout), (3, 10))
+        # A forked process builds its own client
+        with mock.patch('lunchapp.slack_client.os.getpid', return_value=-1):
+            self.assertIsNot(get_slack_client(), client)
+
+    def test_connection_reuse(self):
+        server = HTTPServer(('127.0.0.1', 0), KeepAliveSlackHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            client = PooledWebClient('xoxb-test', base_url='http://127.0.0.1:%s/api/' % server.server_port)
+            for _ in range(5):
+                self.assertEqual(client.chat_postMessage(channel='#lunch', text='menu')['ok'], True)
+            self.assertEqual(client.connection_stats(), {'requests': 5, 'connections': 1, 'reused': 4})
+            client.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+@override_settings(CHANNEL_ID='#lunch', SLACK_DIRECTORY_MISS_REFRESH=0,
+                   SLACK_RATE_LIMITS={'admin.users.invite': 6000000, 'conversations.list': 6000000})
+class TestSlackDirectory(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.slack_client = mock.Mock()
+        self.slack_client.team_info.return_value = mock.Mock(data={'team': {'id': 'T1'}})
+        self.slack_client.conversations_list.side_effect = [
+            mock.Mock(data={'channels': [{'name': 'general', 'id': 'C1'}],
+                            'response_metadata': {'next_cursor': 'page2'}}),
+            mock.Mock(data={'channels': [{'name': 'lunch', 'id': 'C2'}],
+                            'response_metadata': {'next_cursor': ''}}),
+        ]
+        patcher = mock.patch('lunchapp.slack_dispatcher.get_slack_client', return_value=self.slack_client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_functions(self):
+        for index in range(200):
+            self.assertEqual(invite_to_channel('employee%s@gmail.com' % index), True)
+        # The channel on the second page is found, and the listing is walked only once
+        self.assertEqual(self.slack_client.conversations_list.call_count, 2)
+        self.assertEqual(self.slack_client.conversations_list.call_args[1]['cursor'], 'page2')
+        self.assertEqual(self.slack_client.team_info.call_count, 1)
+        self.assertEqual(self.slack_client.admin_users_invite.call_count, 200)
+        self.assertEqual(self.slack_client.admin_users_invite.call_args[1]['channel_ids'], ['C2'])
+        self.assertEqual(self.slack_client.admin_users_invite.call_args[1]['team_id'], 'T1')
+
+    def test_refresh_on_miss(self):
+        self.assertEqual(get_channel_id('#lunch'), 'C2')
+        self.slack_client.conversations_list.side_effect = [
+            mock.Mock(data={'channels': [{'name': 'lunch', 'id': 'C2'}, {'name': 'new', 'id': 'C3'}]}),
+        ]
+        self.assertEqual(get_channel_id('new'), 'C3')
+        self.assertEqual(get_channel_id('C3'), 'C3')
+        self.assertEqual(self.slack_client.conversations_list.call_count, 3)
+
+    @override_settings(CHANNEL_ID=None)
+    def test_channel_not_configured(self):
+        self.assertIsNone(get_channel_id(None))
+        self.assertIsNone(get_channel_id(''))
+        self.assertEqual(invite_to_channel('employee@gmail.com'), False)
+        self.assertEqual(self.slack_client.conversations_list.call_count, 0)
+        self.assertEqual(self.slack_client.admin_users_invite.call_count, 0)
+
+
+IMPORT_CSV = """email,first_name,last_name,phone,country,is_active,is_responsible,is_employee
+employee_a@gmail.com,Ana,Perez,0011,Chile,true,false,true
+employee_b@gmail.com,Bruno,Silva,0012,Brazil,yes,no,yes
+responsible@gmail.com,Rosa,Diaz,0013,Chile,1,1,0
+"""
+
+
+class TestImportUsers(TestCase):
+
+    def setUp(self):
+        user_admin = Profile.objects.create(email='test_admin@gmail.com', first_name='test',
+                                            last_name='test', phone='0096883933', country='Chile', is_active=True,
+                                            is_admin=True, is_responsible=False, is_employee=False)
+        user_admin.set_password('it is secret!')
+        user_admin.save()
+
+    def test_functions(self):
+        client = Client(HTTP_USER_AGENT='Mozilla/5.0')
+        user_admin = Profile.objects.get(email='test_admin@gmail.com')
+        client.login(username=user_admin.email, password='it is secret!')
+        response = client.get('/import_users/%s/' % user_admin.pk)
+        self.assertEqual(response.status_code, 200)
+
+        # One invalid row, nothing is created
+        invalid_csv = IMPORT_CSV + 'test_admin@gmail.com,Dup,Email,0014,Chile,1,0,1\nbad,No,Country,0015,France,1,0,1\n'
+        csv_file = tempfile.NamedTemporaryFile(suffix='.csv')
+        csv_file.write(invalid_csv.encode('utf-8'))
+        csv_file.seek(0)
+        response_post = client.post('/import_users/%s/' % user_admin.pk, {'csv_file': csv_file})
+        self.assertEqual(response_post.status_code, 200)
+        self.assertEqual([line for line, message in response_post.context['import_errors']], [5, 6, 6])
+        self.assertEqual(Profile.objects.count(), 1)
+
+        # Valid file
+        csv_file = tempfile.NamedTemporaryFile(suffix='.csv')
+        csv_file.write(IMPORT_CSV.encode('utf-8'))
+        csv_file.seek(0)
+        response_post = client.post('/import_users/%s/' % user_admin.pk, {'csv_file': csv_file})
+        self.assertEqual(response_post.status_code, 302)
+        self.assertEqual(Profile.objects.count(), 4)
+        self.assertEqual(Employee.objects.filter(user__email__in=['employee_a@gmail.com',
+                                                                 'employee_b@gmail.com']).count(), 2)
+        self.assertEqual(Responsible.objects.get().user.email, 'responsible@gmail.com')
+        self.assertEqual(Profile.objects.get(email='employee_b@gmail.com').is_responsible, False)
+        # The invitations of the chilean users are queued for the reminder worker
+        self.assertEqual(sorted(SlackInvitation.objects.values_list('email', flat=True)),
+                         ['employee_a@gmail.com', 'responsible@gmail.com'])
+        send_invitation = mock.Mock(side_effect=[{'ok': True}, SlackApiError('already_in_team', {'status': 200})])
+        with mock.patch('lunchapp.invitations.send_invitation', send_invitation), \
+                mock.patch('lunchapp.management.commands.reminder_worker.drain', return_value=0):
+            call_command('reminder_worker', '--once')
+        response = client.get('/import_users/%s/' % user_admin.pk)
+        self.assertEqual(dict((status, response.context['invitations'][status]) for status in ['pending', 'sent']),
+                         {'pending': 1, 'sent': 1})
+        # the failed invitation is retried later
+        invitation = SlackInvitation.objects.get(status='pending')
+        self.assertTrue(invitation.error.startswith('already_in_team'))
+        self.assertTrue(invitation.available_at > timezone.now())
+
+        # Only admin can import
+        client = Client(HTTP_USER_AGENT='Mozilla/5.0')
+        response = client.get('/import_users/%s/' % user_admin.pk)
+        self.assertEqual(response.status_code, 302)
+
+    def test_command(self):
+        csv_path = os.path.join(tempfile.mkdtemp(), 'users.csv')
+        with open(csv_path, 'w') as csv_file:
+            csv_file.write(IMPORT_CSV)
+        call_command('import_users', csv_path, '--no-invite')
+        self.assertEqual(Profile.objects.count(), 4)
+        self.assertEqual(SlackInvitation.objects.count(), 0)
+
+    def test_concurrent_insert(self):
+        def validate(rows, result):
+            cleaned_rows = validate_rows(rows, result)
+            # The user form creates one of the users between the validation and the insert
+            if not Profile.objects.filter(phone='0012').exists():
+                Profile.objects.create(email='other@gmail.com', phone='0012', country='Chile')
+            return cleaned_rows
+
+        with mock.patch('lunchapp.onboarding.validate_rows', side_effect=validate):
+            result = import_profiles(StringIO(IMPORT_CSV))
+        self.assertEqual(result.errors, [(3, 'phone: User already exist with that phone')])
+        self.assertEqual((result.created, result.queued), (0, 0))
+        self.assertEqual(Profile.objects.count(), 2)
+        self.assertEqual(SlackInvitation.objects.count(), 0)
+
+
+@override_settings(SLACK_RATE_LIMITS={}, SLACK_RATE_BURST=1, SLACK_MAX_RETRIES=2, SLACK_RETRY_BACKOFF=0.5)
+class TestSlackDispatcher(TestCase):
+
+    def setUp(self):
+        caches['slack'].clear()
+
+    def test_token_bucket(self):
+        # Two workers share the bucket of admin.users.invite (tier 2: 20 per minute)
+        worker_a, worker_b = SlackDispatcher(), SlackDispatcher()
+        self.assertEqual(worker_a.reserve('admin.users.invite', 20), 0)
+        self.assertAlmostEqual(worker_b.reserve('admin.users.invite', 20), 3, places=1)
+        self.assertAlmostEqual(worker_a.reserve('admin.users.invite', 20), 6, places=1)
+        # chat.postMessage is limited by channel
+        self.assertEqual(worker_a.get_bucket('chat.postMessage', {'channel': 'C1'}), ('chat.postMessage:C1', 60))
+        # the direct messages share one bucket
+        self.assertEqual(worker_a.get_bucket('chat.postMessage', {'channel': 'U1'}), ('chat.postMessage:dm', 300))
+        self.assertEqual(worker_a.get_bucket('chat.postMessage', {'channel': 'D2'}), ('chat.postMessage:dm', 300))
+        self.assertEqual(worker_a.get_bucket('team.info', {}), ('team.info', 50))
+
+    def test_retry_after(self):
+        rate_limited = SlackApiError('ratelimited', {'status': 429, 'headers': {'Retry-After': '7'}})
+        slack_client = mock.Mock()
+        slack_client.chat_postMessage.side_effect = [rate_limited, {'ok': True}]
+        with mock.patch('lunchapp.slack_dispatcher.get_slack_client', return_value=slack_client), \
+                mock.patch('lunchapp.slack_dispatcher.time.sleep') as sleep:
+            self.assertEqual(SlackDispatcher().call('chat.postMessage', channel='C1', text='menu'), {'ok': True})
+        self.assertEqual(slack_client.chat_postMessage.call_count, 2)
+        retry_delay = sleep.call_args_list[1][0][0]
+        self.assertTrue(7 <= retry_delay <= 7.5)
+        # The other workers see the method blocked
+        self.assertTrue(SlackDispatcher().wait_time('chat.postMessage', {'channel': 'C2'}) > 5)
+
+    def test_max_wait(self):
+        dispatcher = SlackDispatcher()
+        dispatcher.reserve('admin.users.invite', 20)
+        bucket = caches['slack'].get('slack:rate:admin.users.invite')
+        # A web request doesn't wait for the slots reserved by an import, nothing is reserved
+        with self.assertRaises(SlackBusy):
+            dispatcher.reserve('admin.users.invite', 20, max_wait=1)
+        self.assertEqual(caches['slack'].get('slack:rate:admin.users.invite'), bucket)
+        self.assertAlmostEqual(dispatcher.reserve('admin.users.invite', 20, max_wait=5), 3, places=1)
+        # The bucket isn't updated without its lock
+        caches['slack'].add('slack:rate:team.info:lock', 'other', 60)
+        with self.assertRaises(SlackBusy):
+            dispatcher.reserve('team.info', 50, max_wait=0.1)
+        self.assertIsNone(caches['slack'].get('slack:rate:team.info'))
+        self.assertEqual(caches['slack'].get('slack:rate:team.info:lock'), 'other')
+        # Nor the call waits for a method blocked by a 429
+        dispatcher.block('chat.postMessage', 30)
+        slack_client = mock.Mock()
+        with mock.patch('lunchapp.slack_dispatcher.get_slack_client', return_value=slack_client):
+            with self.assertRaises(SlackBusy):
+                dispatcher.call('chat.postMessage', channel='C1', text='menu', max_wait=5)
+            cache.set(CHANNELS_CACHE_KEY, {'fetched_at': time.time(), 'channels': {'lunch': 'C1'}})
+            cache.set(TEAM_CACHE_KEY, 'T1')
+            with self.settings(CHANNEL_ID='#lunch'):
+                self.assertEqual(invite_to_channel('employee@gmail.com', max_wait=1), False)
+        self.assertEqual(slack_client.chat_postMessage.call_count, 0)
+        self.assertEqual(slack_client.admin_users_invite.call_count, 0)
+        self.assertEqual(slack_client.conversations_list.call_count, 0)
+
+    def test_errors_not_retried(self):
+        slack_client = mock.Mock()
+        slack_client.chat_postMessage.side_effect = SlackApiError('channel_not_found', {'status': 200, 'headers': {}})
+        with mock.patch('lunchapp.slack_dispatcher.get_slack_client', return_value=slack_client), \
+                mock.patch('lunchapp.slack_dispatcher.time.sleep'):
+            with self.assertRaises(SlackApiError):
+                SlackDispatcher().call('chat.postMessage', channel='C1', text='menu')
+        self.assertEqual(slack_client.chat_postMessage.call_count, 1)
+
+
+class PoTranslations(gettext.NullTranslations):
+    """
+    Catalog read from a .po file, the tests run without the .mo files built by compilemessages
+    """
+
+    def __init__(self, language):
+        super(PoTranslations, self).__init__()
+        self.language = language
+        self.messages = {}
+        msgid = None
+        with open(os.path.join(settings.BASE_DIR, 'locale', language, 'LC_MESSAGES', 'django.po')) as po_file:
+            for line in po_file:
+                if line.startswith('msgid "'):
+                    msgid = ast.literal_eval(line[6:])
+                elif line.startswith('msgstr "') and msgid:
+                    self.messages[msgid] = ast.literal_eval(line[7:])
+
+    def gettext(self, message):
+        return self.messages.get(message) or message
+
+    def to_language(self):
+        return self.language
+
+
+class FakeAsyncSlackClient(object):
+
+    def __init__(self):
+        self.messages = []
+        self.session = self
+
+    async def close(self):
+        pass
+
+    async def chat_postMessage(self, channel, text, blocks=None):
+        self.messages.append((channel, text))
+        return {'ok': True}
+
+
+# The rate limiter of the direct messages runs in a thread of its own, out of the transaction of the test
+@override_settings(REMINDER_MODE='dm', SLACK_DM_CONCURRENCY=2, CACHES=dict(settings.CACHES, slack={
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'slack'}))
+class TestReminderDirectMessages(TestCase):
+
+    def setUp(self):
+        caches['slack'].clear()
+        for index, language in enumerate(['fr', 'en', 'en', 'fr']):
+            profile = Profile.objects.create(email='employee%s@gmail.com' % index, phone='00%s' % index,
+                                             country='Chile', is_active=True, is_employee=True, language=language)
+            Employee.objects.create(user=profile)
+        meal = Meal.objects.create(principal_meal='Chicken', salad='Green salad', dessert='Lemon pie')
+        today_menu = PlannedMenu.objects.create(planned_date=datetime.date.today())
+        today_menu.meals.add(meal)
+
+    def test_functions(self):
+        campaign = enqueue_reminder(PlannedMenu.objects.get(), 'menu')
+        self.assertEqual(campaign.mode, 'dm')
+        self.assertEqual(campaign.deliveries.count(), 4)
+        slack_client = FakeAsyncSlackClient()
+        user_ids = {'employee0@gmail.com': 'U0', 'employee1@gmail.com': 'U1', 'employee2@gmail.com': 'U2'}
+        limiter_threads = []
+        with mock.patch.dict(trans_real._translations, {'fr': PoTranslations('fr')}), \
+                mock.patch('lunchapp.reminders.open_async_slack_client', return_value=slack_client), \
+                mock.patch('lunchapp.reminders.get_user_ids', return_value=user_ids), \
+                mock.patch('lunchapp.reminders.render_to_string', wraps=render_to_string) as render, \
+                mock.patch.object(SlackDispatcher, 'wait_time', autospec=True,
+                                  side_effect=lambda *args: limiter_threads.append(threading.current_thread()) or 0):
+            call_command('reminder_worker', '--once')
+        # The rate limiter doesn't block the event loop
+        self.assertEqual(len(limiter_threads), 3)
+        self.assertNotIn(threading.current_thread(), limiter_threads)
+        # The message is rendered once per language
+        self.assertEqual(render.call_count, 2)
+        self.assertEqual(sorted(channel for channel, text in slack_client.messages), ['U0', 'U1', 'U2'])
+        self.assertIn(PlannedMenu.objects.get().uuid_menu, slack_client.messages[0][1])
+        # in the language of each employee
+        texts = dict(slack_client.messages)
+        self.assertTrue(texts['U0'].startswith("Bonjour ! Je partage avec vous le menu du jour :)\n"
+                                               "Vous le trouverez en suivant ce lien http"), texts['U0'])
+        for channel in ('U1', 'U2'):
+            self.assertTrue(texts[channel].startswith("Hello! I share with you today's menu :)\n"
+                                                      "You can find it following this link http"), texts[channel])
+        progress = campaign.progress()
+        self.assertEqual((progress['sent'], progress['failed']), (3, 1))
+        self.assertEqual(campaign.deliveries.get(status='failed').target, 'employee3@gmail.com')
+
+    @override_settings(REMINDER_LEASE_SECONDS=120, SLACK_RATE_LIMITS={'chat.postMessage:dm': 1})
+    def test_lease(self):
+        # Half the lease only leaves the time of one message at 1 message per minute
+        self.assertEqual(direct_message_chunk_size(), 1)
+        enqueue_reminder(PlannedMenu.objects.get(), 'menu')
+        user_ids = dict(('employee%s@gmail.com' % index, 'U%s' % index) for index in range(4))
+        clock = [timezone.now()]
+        reclaimed = []
+
+        class SlowSlackClient(FakeAsyncSlackClient):
+            async def chat_postMessage(self, channel, text, blocks=None):
+                # While a message is sent the clock moves and another worker takes the stale deliveries
+                clock[0] += datetime.timedelta(seconds=step)
+                release_stale_deliveries()
+                reclaimed.extend(delivery.pk for delivery in claim_deliveries(10))
+                return await super(SlowSlackClient, self).chat_postMessage(channel, text, blocks)
+
+        for step in [80, 200]:
+            ReminderDelivery.objects.update(status='pending', locked_at=None, attempts=0)
+            slack_client = SlowSlackClient()
+            with mock.patch('lunchapp.reminders.timezone.now', side_effect=lambda: clock[0]), \
+                    mock.patch('lunchapp.reminders.open_async_slack_client', return_value=slack_client), \
+                    mock.patch('lunchapp.reminders.get_user_ids', return_value=user_ids), \
+                    mock.patch.object(SlackDispatcher, 'wait_time', return_value=0):
+                deliver_direct_messages(claim_deliveries(10))
+            sent = [channel for channel, text in slack_client.messages]
+            if step == 80:
+                # The batch lasts longer than the lease, renewed before each message nothing is sent twice
+                self.assertEqual(sorted(sent), ['U0', 'U1', 'U2', 'U3'])
+                self.assertEqual(reclaimed, [])
+                self.assertEqual(set(ReminderDelivery.objects.values_list('status', flat=True)), {'sent'})
+            else:
+                # A message longer than the lease: the deliveries are left to the other worker and the statuses
+                # it wrote aren't overwritten
+                self.assertEqual(sent, ['U0'])
+                self.assertEqual(sorted(reclaimed), sorted(ReminderDelivery.objects.values_list('pk', flat=True)))
+                self.assertEqual(set(ReminderDelivery.objects.values_list('status', 'locked_at')),
+                                 {('sending', clock[0])})
+
+    @override_settings(REMINDER_MAX_ATTEMPTS=2)
+    def test_batch_error(self):
+        campaign = enqueue_reminder(PlannedMenu.objects.get(), 'menu')
+        # users.list fails: the attempt of each delivery is recorded and the worker goes on
+        with mock.patch('lunchapp.reminders.get_user_ids', side_effect=SlackApiError('timeout', {'status': 500})), \
+                mock.patch('lunchapp.management.commands.reminder_worker.apply_meal_choices',
+                           side_effect=ValueError('cache down')) as apply_meal_choices:
+            call_command('reminder_worker', '--once')
+        self.assertEqual(apply_meal_choices.call_count, 1)
+        self.assertEqual(campaign.progress()['pending'], 4)
+        self.assertEqual(set(campaign.deliveries.values_list('attempts', flat=True)), {1})
+        self.assertTrue(campaign.deliveries.first().error.startswith('timeout'))
+        # the retries end as failed deliveries
+        ReminderDelivery.objects.update(available_at=timezone.now())
+        with mock.patch('lunchapp.reminders.get_user_ids', side_effect=SlackApiError('timeout', {'status': 500})):
+            call_command('reminder_worker', '--once')
+        self.assertEqual(campaign.progress()['failed'], 4)
+        campaign.refresh_from_db()
+        self.assertEqual(campaign.status, 'done')
+
+
+@override_settings(SLACK_RETRY_BACKOFF=0, SLACK_RATE_LIMITS={'chat.postMessage': 6000000})
+class TestSlackStandIn(TestCase):
+
+    def setUp(self):
+        caches['slack'].clear()
+        self.standin = SlackStandIn(rate_limit_rate=0.5, retry_after=0).start()
+        self.addCleanup(self.standin.stop)
+        self.addCleanup(reset_slack_client)
+
+    def test_functions(self):
+        with override_settings(SLACK_API_URL=self.standin.url, SLACK_MAX_RETRIES=20):
+            reset_slack_client()
+            # Half of the calls get a 429, the dispatcher retries them
+            for index in range(10):
+                self.assertEqual(Responsible().send_msg_with_the_menu('menu %s' % index), True)
+        self.assertTrue(self.standin.calls['chat.postMessage'] > 10)
+
+    def test_benchmark(self):
+        out = StringIO()
+        call_command('benchmark_slack', '--requests', '20', '--concurrency', '4', '--latency', '0', stdout=out)
+        self.assertIn('send_msg_with_the_menu: 20 calls', out.getvalue())
+        self.assertIn('invite_to_channel: 20 calls', out.getvalue())
+        self.assertIn('0 errors', out.getvalue())
+        self.assertEqual(percentile([4, 1, 3, 2], 50), 2)
+        self.assertEqual(percentile([4, 1, 3, 2], 99), 4)
+
+
+@override_settings(REMINDER_MODE='dm', REMINDER_LOCAL_TIME='09:30', REMINDER_MISSED_GRACE=3 * 3600)
+class TestReminderScheduler(TestCase):
+
+    def setUp(self):
+        for index, country in enumerate(['Chile', 'Chile', 'Peru']):
+            profile = Profile.objects.create(email='employee%s@gmail.com' % index, phone='00%s' % index,
+                                             country=country, is_active=True, is_employee=True)
+            Employee.objects.create(user=profile)
+        menu = PlannedMenu.objects.create(planned_date=datetime.date(2026, 7, 15))
+        menu.meals.add(Meal.objects.create(principal_meal='Chicken', salad='Green salad', dessert='Lemon pie'))
+
+    def tick(self, now):
+        with mock.patch('lunchapp.scheduler.timezone.now', return_value=now):
+            ReminderScheduler(holder='scheduler-1').tick()
+        return set(ScheduledReminder.objects.values_list('country', flat=True))
+
+    def test_functions(self):
+        # Only one replica holds the lease until it expires
+        self.assertEqual(acquire_lease('test', 'a', 60), True)
+        self.assertEqual(acquire_lease('test', 'b', 60), False)
+        self.assertEqual(acquire_lease('test', 'a', 60), True)
+        SchedulerLease.objects.filter(name='test').update(expires_at=timezone.now() - datetime.timedelta(seconds=1))
+        self.assertEqual(acquire_lease('test', 'b', 60), True)
+        # 09:30 in Santiago is 13:30 UTC in july
+        self.assertEqual(local_fire_time('Chile', datetime.date(2026, 7, 15)),
+                         datetime.datetime(2026, 7, 15, 13, 30, tzinfo=pytz.utc))
+        self.assertEqual(local_fire_time('Peru', datetime.date(2026, 7, 15)),
+                         datetime.datetime(2026, 7, 15, 14, 30, tzinfo=pytz.utc))
+        # A reminder is fired once per country and day
+        self.assertIsNotNone(fire_reminder('Chile', datetime.date(2026, 7, 15)))
+        self.assertIsNone(fire_reminder('Chile', datetime.date(2026, 7, 15)))
+        self.assertEqual(ReminderCampaign.objects.get().deliveries.count(), 2)
+
+    def test_missed_runs(self):
+        # Started late (before the grace delay): the missed run of Chile is caught up, not the one of Peru yet
+        self.assertNotIn('Chile', self.tick(datetime.datetime(2026, 7, 15, 13, 0, tzinfo=pytz.utc)))
+        fired = self.tick(datetime.datetime(2026, 7, 15, 14, 0, tzinfo=pytz.utc))
+        self.assertIn('Chile', fired)
+        self.assertNotIn('Peru', fired)
+        self.assertIn('Peru', self.tick(datetime.datetime(2026, 7, 15, 14, 31, tzinfo=pytz.utc)))
+        self.tick(datetime.datetime(2026, 7, 15, 15, 0, tzinfo=pytz.utc))
+        campaigns = ReminderCampaign.objects.filter(country__in=['Chile', 'Peru'])
+        self.assertEqual(sorted(campaign.deliveries.count() for campaign in campaigns), [1, 2])
+        # A run missed for longer than the grace delay is skipped
+        ScheduledReminder.objects.all().delete()
+        self.assertNotIn('Chile', self.tick(datetime.datetime(2026, 7, 15, 17, 0, tzinfo=pytz.utc)))
+
+    @mock.patch('lunchapp.scheduler.time.sleep', side_effect=[None, None, KeyboardInterrupt])
+    def test_run_forever(self, sleep):
+        # The tick failing on the database is logged and the loop goes on
+        scheduler = ReminderScheduler(holder='scheduler-1')
+        with mock.patch.object(scheduler, 'tick', side_effect=[DatabaseError('connection lost'), 5, 7]) as tick, \
+                mock.patch('lunchapp.scheduler.logger') as logger:
+            with self.assertRaises(KeyboardInterrupt):
+                scheduler.run_forever()
+        self.assertEqual(tick.call_count, 3)
+        self.assertEqual(logger.exception.call_count, 1)
+        self.assertEqual([call[0][0] for call in sleep.call_args_list],
+                         [settings.SCHEDULER_LEASE_SECONDS / 3.0, 5, 7])
+
+
+@override_settings(SLACK_SIGNING_SECRET='secret', CACHE_SHARED=True)
+class TestSlackOrdering(TestCase):
+
+    def setUp(self):
+        profile = Profile.objects.create(email='Employee@gmail.com', phone='001', country='Chile', is_active=True,
+                                         is_employee=True)
+        self.employee = Employee.objects.create(user=profile)
+        self.meals = [Meal.objects.create(principal_meal=meal, salad='Green salad', dessert='Lemon pie')
+                      for meal in ['Chicken', 'Fish']]
+        self.menu = PlannedMenu.objects.create(planned_date=datetime.datetime.now(pytz.timezone('Chile/Continental')))
+        self.menu.meals.add(*self.meals)
+
+    def post_interaction(self, payload, secret='secret'):
+        body = urlencode({'payload': json.dumps(payload)})
+        timestamp = str(int(time.time()))
+        signature = 'v0=' + hmac.new(secret.encode('utf-8'), ('v0:%s:%s' % (timestamp, body)).encode('utf-8'),
+                                     hashlib.sha256).hexdigest()
+        return Client().post('/slack/interactions/', data=body,
+                             content_type='application/x-www-form-urlencoded',
+                             HTTP_X_SLACK_REQUEST_TIMESTAMP=timestamp, HTTP_X_SLACK_SIGNATURE=signature)
+
+    def test_functions(self):
+        blocks = reminder_blocks('menu', self.menu)
+        self.assertEqual([block['accessory']['value'] for block in blocks[1:]],
+                         ['%s:%s' % (self.menu.pk, meal.pk) for meal in self.meals])
+        payload = {'type': 'block_actions', 'user': {'id': 'U1'}, 'channel': {'id': 'D1'},
+                   'actions': [blocks[2]['accessory']]}
+        self.assertEqual(self.post_interaction(payload, secret='wrong').status_code, 403)
+        self.assertEqual(SlackMealChoice.objects.count(), 0)
+        # The endpoint only stores the choice
+        self.assertEqual(self.post_interaction(payload).status_code, 200)
+        self.assertEqual(SlackMealChoice.objects.get().status, 'pending')
+        self.assertIsNone(Employee.objects.get().preferred_meal)
+
+        # The emails are resolved on slack outside the transaction locking the choices
+        savepoints = len(connection.savepoint_ids)
+
+        def get_emails(user_ids):
+            self.assertEqual(len(connection.savepoint_ids), savepoints)
+            return {'U1': 'employee@gmail.com'}
+        with mock.patch('lunchapp.slack_ordering.get_emails', side_effect=get_emails) as get_emails, \
+                mock.patch('lunchapp.slack_ordering.slack_call') as slack_call, \
+                mock.patch('lunchapp.slack_ordering.ordering_closed', return_value=False):
+            self.assertEqual(apply_meal_choices(), 1)
+        self.assertEqual(list(get_emails.call_args[0][0]), ['U1'])
+        self.assertEqual(Employee.objects.get().preferred_meal, self.meals[1])
+        self.assertEqual(MealOrder.objects.get().meal, self.meals[1])
+        self.assertEqual(SlackMealChoice.objects.get().status, 'applied')
+        self.assertEqual(slack_call.call_args[1]['text'], 'Your meal of today is Fish')
+
+    def test_menu_blocks(self):
+        cache.clear()
+        self.assertEqual(len(reminder_blocks('menu', self.menu, 'fr')), 3)
+        # The meals are rendered once per menu and language
+        with self.assertNumQueries(0):
+            blocks = reminder_blocks('other menu', self.menu, 'fr')
+        self.assertEqual(blocks[0]['text']['text'], 'other menu')
+        self.assertIn('Chicken', blocks[1]['text']['text'])
+        # The cached layout follows the changes of the meals
+        self.meals[0].principal_meal = 'Beef'
+        self.meals[0].save()
+        self.assertIn('Beef', reminder_blocks('menu', self.menu, 'fr')[1]['text']['text'])
+        self.menu.meals.remove(self.meals[1])
+        self.assertEqual(len(reminder_blocks('menu', self.menu, 'fr')), 2)
+        self.meals[1].plannedmenu_set.add(self.menu)
+        self.assertEqual(len(reminder_blocks('menu', self.menu, 'fr')), 3)
+        # The names of the meals are shown as typed, not as slack formatting
+        self.meals[0].principal_meal = 'Fish & chips <!channel>'
+        self.meals[0].save()
+        self.assertEqual(reminder_blocks('menu', self.menu, 'fr')[1]['text']['text'],
+                         '*Fish &amp; chips &lt;!channel&gt;*\nGreen salad, Lemon pie')
+
+    def test_cutoff(self):
+        payload = {'type': 'block_actions', 'user': {'id': 'U1'}, 'channel': {'id': 'D1'},
+                   'actions': [reminder_blocks('menu', self.menu)[1]['accessory']]}
+        self.assertEqual(self.post_interaction(payload).status_code, 200)
+        with mock.patch('lunchapp.slack_ordering.get_emails', return_value={'U1': 'employee@gmail.com'}), \
+                mock.patch('lunchapp.slack_ordering.slack_call'), \
+                mock.patch('lunchapp.slack_ordering.ordering_closed', return_value=True):
+            call_command('reminder_worker', '--once')
+        self.assertIsNone(Employee.objects.get().preferred_meal)
+        self.assertEqual(SlackMealChoice.objects.get().status, 'rejected')
+
+
+@override_settings(CACHE_SHARED=True)
+class TestMenuApi(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.today = datetime.date.today()
+        for days in range(5):
+            menu = PlannedMenu.objects.create(planned_date=self.today + datetime.timedelta(days=days),
+                                              uuid_menu=str(uuid.uuid4()))
+            menu.meals.add(*[Meal.objects.create(principal_meal='Meal %s.%s' % (days, index), salad='Green salad',
+                                                 dessert='Lemon pie') for index in range(3)])
+
+    def test_functions(self):
+        client = Client()
+        menu = PlannedMenu.objects.get(planned_date=self.today)
+        response = client.get('/api/v1/menus/today/')
+        self.assertEqual(response.json()['uuid'], menu.uuid_menu)
+        self.assertEqual([meal['principal_meal'] for meal in response.json()['meals']],
+                         ['Meal 0.0', 'Meal 0.1', 'Meal 0.2'])
+        self.assertEqual(client.get('/api/v1/menus/%s/' % menu.uuid_menu).json(), response.json())
+        self.assertEqual(client.get('/api/v1/menus/%s/' % uuid.uuid4()).status_code, 404)
+        # The meals are fetched in a constant number of queries
+        with self.assertNumQueries(3):
+            response = client.get('/api/v1/menus/', {'start': self.today.isoformat()})
+        self.assertEqual(len(response.json()['menus']), 5)
+        with self.assertNumQueries(3):
+            response = client.get('/api/v1/menus/', {'start': self.today.isoformat(),
+                                                     'end': (self.today + datetime.timedelta(days=1)).isoformat()})
+        self.assertEqual(len(response.json()['menus']), 2)
+        self.assertEqual(client.get('/api/v1/menus/', {'start': 'tomorrow'}).status_code, 400)
+        self.assertEqual(client.get('/api/v1/menus/', {'start': '2020-01-10', 'end': '2020-01-01'}).status_code,
+                         400)
+
+    def test_conditional_get(self):
+        client = Client()
+        response = client.get('/api/v1/menus/')
+        etag = response['ETag']
+        with self.assertNumQueries(1):
+            self.assertEqual(client.get('/api/v1/menus/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # The same version is served from the cache
+        with self.assertNumQueries(1):
+            self.assertEqual(client.get('/api/v1/menus/').content, response.content)
+        # Whatever the query string, the same parameters share the entry
+        with self.assertNumQueries(1):
+            self.assertEqual(client.get('/api/v1/menus/', {
+                'end': (self.today + datetime.timedelta(days=6)).isoformat(), 'start': self.today.isoformat(),
+                'junk': 'x' * 300}).content, response.content)
+        meal = Meal.objects.get(principal_meal='Meal 3.1')
+        meal.principal_meal = 'Fish'
+        meal.save()
+        response = client.get('/api/v1/menus/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Fish', response.content.decode('utf-8'))
+        menu = PlannedMenu.objects.get(planned_date=self.today)
+        etag = client.get('/api/v1/menus/today/')['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(client.get('/api/v1/menus/today/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        menu.meals.remove(menu.meals.first())
+        self.assertEqual(len(client.get('/api/v1/menus/today/', HTTP_IF_NONE_MATCH=etag).json()['meals']), 2)
+
+
+@override_settings(CACHE_SHARED=True)
+class TestTodayMenuResolver(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.today = datetime.date.today()
+
+    def test_functions(self):
+        self.assertEqual(today_menu(), (None, set()))
+        # Without menu today, the last menu planned before is used
+        for days in (3, 2):
+            PlannedMenu.objects.create(planned_date=self.today - datetime.timedelta(days=days),
+                                       uuid_menu=str(uuid.uuid4()))
+        upcoming = PlannedMenu.objects.create(planned_date=self.today + datetime.timedelta(days=1),
+                                              uuid_menu=str(uuid.uuid4()))
+        planned_menu, meal_ids = today_menu()
+        self.assertEqual(planned_menu.planned_date, self.today - datetime.timedelta(days=2))
+        with self.assertNumQueries(0):
+            self.assertEqual(today_menu()[0].pk, planned_menu.pk)
+            # The reminders and the orders only take today's menu
+            self.assertEqual(today_menu(exact=True), (None, set()))
+        # The cached menu follows the changes of the menus
+        upcoming.planned_date = self.today
+        upcoming.save()
+        planned_menu, meal_ids = today_menu()
+        self.assertEqual(planned_menu.pk, upcoming.pk)
+        self.assertEqual(today_menu(exact=True)[0].pk, upcoming.pk)
+        self.assertEqual(meal_ids, set())
+        meal = Meal.objects.create(principal_meal='Chicken', salad='Green salad', dessert='Lemon pie')
+        upcoming.meals.add(meal)
+        self.assertEqual(today_menu()[1], {meal.pk})
+        with self.assertNumQueries(0):
+            self.assertEqual(today_menu()[1], {meal.pk})
+
+    @override_settings(CACHE_SHARED=False)
+    def test_per_process_cache(self):
+        menu = PlannedMenu.objects.create(planned_date=self.today, uuid_menu=str(uuid.uuid4()))
+        with self.settings(CACHE_SHARED=True):
+            self.assertEqual(today_menu()[1], set())
+            self.assertEqual(meal_choices(), [])
+        # Another process adds a meal: without a shared cache its invalidation can't reach this process, the
+        # menu is read from the database
+        with mock.patch('lunchapp.signals.invalidate_meal_choices'):
+            meal = Meal.objects.create(principal_meal='Chicken', salad='Green salad', dessert='Lemon pie')
+        PlannedMenu.meals.through.objects.create(plannedmenu_id=menu.pk, meal_id=meal.pk)
+        self.assertEqual(today_menu()[1], {meal.pk})
+        self.assertEqual(meal_choices(), [(meal.pk, 'Chicken, Green salad, Lemon pie')])
+
+    def test_coalescing(self):
+        calls = []
+
+        def load(today):
+            calls.append(today)
+            time.sleep(0.1)
+            return {'pk': None}
+
+        with mock.patch('lunchapp.menus.load_today_menu', side_effect=load):
+            threads = [threading.Thread(target=today_menu_entry) for _ in range(10)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(calls), 1)
+
+        # Another process is loading the menu: wait for its result instead of querying the database
+        cache.clear()
+        key = 'menu_today:%s:0' % self.today.isoformat()
+        cache.add('%s:lock' % key, 1)
+        threading.Timer(0.1, lambda: cache.set(key, {'pk': None})).start()
+        with mock.patch('lunchapp.menus.load_today_menu') as load_today_menu:
+            self.assertEqual(today_menu_entry(), {'pk': None})
+        self.assertEqual(load_today_menu.call_count, 0)
+
+        # The wait is over: the menu is loaded without the lock, which stays to the other process
+        cache.clear()
+        cache.add('%s:lock' % key, 'other', 60)
+        with self.settings(TODAY_MENU_LOCK_SECONDS=0.1), \
+                mock.patch('lunchapp.menus.load_today_menu', return_value={'pk': None}) as load_today_menu:
+            self.assertEqual(today_menu_entry(), {'pk': None})
+        self.assertEqual(load_today_menu.call_count, 1)
+        self.assertEqual(cache.get('%s:lock' % key), 'other')
+
+    def test_country_day(self):
+        now = datetime.datetime.now(pytz.utc)
+        for country, label in COUNTRY:
+            # The entry of the day of a country expires at its midnight
+            seconds = seconds_until_midnight(country)
+            self.assertEqual(local_date(country, now + datetime.timedelta(seconds=seconds + 5)),
+                             local_date(country, now) + datetime.timedelta(days=1))
+            cache.clear()
+            with mock.patch('lunchapp.menus.load_today_menu', return_value={'pk': None}) as load_today_menu:
+                today_menu_entry(country)
+            load_today_menu.assert_called_once_with(local_date(country))
+
+
+@override_settings(CACHE_SHARED=True)
+class TestMealChoices(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.meals = [Meal.objects.create(principal_meal=meal, salad='Green salad', dessert='Lemon pie')
+                      for meal in ['Chicken', 'Fish', 'Pasta']]
+        menu = PlannedMenu.objects.create(planned_date=datetime.date.today())
+        menu.meals.add(*self.meals[:2])
+
+    def test_functions(self):
+        # The choices are loaded when the form is rendered, once per process
+        with self.assertNumQueries(0):
+            form = AddMenu()
+        self.assertEqual([label for pk, label in form.fields['meals'].choices],
+                         ['Chicken, Green salad, Lemon pie', 'Fish, Green salad, Lemon pie',
+                          'Pasta, Green salad, Lemon pie'])
+        with self.assertNumQueries(0):
+            self.assertEqual(len(list(AddMenu().fields['meals'].choices)), 3)
+        # A new meal is in the choices without restarting
+        meal = Meal.objects.create(principal_meal='Soup', salad='Green salad', dessert='Lemon pie')
+        self.assertIn(meal.pk, [pk for pk, label in AddMenu().fields['meals'].choices])
+        meal.delete()
+        self.assertNotIn(meal.pk, [pk for pk, label in AddMenu().fields['meals'].choices])
+        # The employees only choose between the meals of today's menu
+        planned_menu, meal_ids = today_menu()
+        form = CustomizationEmployee(initial={}, meal_ids=meal_ids)
+        self.assertEqual([pk for pk, label in form.fields['preferred_meal'].choices],
+                         [None, self.meals[0].pk, self.meals[1].pk])
+        self.assertEqual(len(list(CustomizationEmployee(initial={}).fields['preferred_meal'].choices)), 4)
+
+
+class TestPlanMenus(TestCase):
+
+    def setUp(self):
+        self.meals = [Meal.objects.create(principal_meal=meal, salad='Green salad', dessert='Lemon pie')
+                      for meal in ['Chicken', 'Fish', 'Pasta']]
+        user_responsible = Profile.objects.create(email='test_responsible@gmail.com', phone='0094883933',
+                                                  country='Chile', is_active=True, is_responsible=True)
+        user_responsible.set_password('it is responsible!')
+        user_responsible.save()
+        Responsible.objects.create(user=user_responsible)
+
+    def test_functions(self):
+        wednesday = datetime.date(2021, 1, 6)
+        self.assertEqual(planning_dates(wednesday), [wednesday])
+        self.assertEqual(planning_dates(wednesday, 'week'), [wednesday, datetime.date(2021, 1, 7),
+                                                             datetime.date(2021, 1, 8)])
+        month = planning_dates(wednesday, 'month')
+        self.assertEqual((month[0], month[-1], len(month)), (wednesday, datetime.date(2021, 1, 29), 18))
+        # A week started on the weekend is the next one
+        for weekend_day in (datetime.date(2021, 1, 9), datetime.date(2021, 1, 10)):
+            self.assertEqual(planning_dates(weekend_day, 'week'),
+                             [datetime.date(2021, 1, 11) + datetime.timedelta(days=days) for days in range(5)])
+        self.assertEqual(planning_dates(datetime.date(2021, 1, 30), 'month'), [])
+        # The number of queries doesn't depend on the number of days and meals
+        meal_ids = [str(meal.pk) for meal in self.meals]
+        with CaptureQueriesContext(connection) as one_day:
+            plan_menus({wednesday: meal_ids[:1]})
+        with CaptureQueriesContext(connection) as whole_month:
+            planned_menus = plan_menus(dict((day, meal_ids) for day in month))
+        self.assertEqual(len(one_day.captured_queries), len(whole_month.captured_queries))
+        self.assertEqual([planned_menu.planned_date for planned_menu in planned_menus], month)
+        self.assertEqual(len(set(planned_menu.uuid_menu for planned_menu in planned_menus)), 18)
+        self.assertEqual(list(planned_menus[-1].meals.order_by('pk')), self.meals)
+
+    def test_week_planning(self):
+        client = Client(HTTP_USER_AGENT='Mozilla/5.0')
+        user_responsible = Profile.objects.get(email='test_responsible@gmail.com')
+        client.login(username=user_responsible.email, password='it is responsible!')
+        monday = datetime.date(2021, 1, 4)
+        response = client.post('/add_menu/%s/' % user_responsible.pk, {
+            'planned_date': monday, 'meals': [meal.pk for meal in self.meals[:2]], 'planning': 'week'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(sorted(PlannedMenu.objects.values_list('planned_date', flat=True)),
+                         [monday + datetime.timedelta(days=days) for days in range(5)])
+        self.assertEqual(PlannedMenu.objects.get(planned_date=monday).meals.count(), 2)
+        # Nothing left to plan in the month: the error tells why
+        response = client.post('/add_menu/%s/' % user_responsible.pk, {
+            'planned_date': datetime.date(2021, 1, 30), 'meals': [self.meals[0].pk], 'planning': 'month'},
+            follow=True)
+        self.assertEqual([str(message) for message in response.context['messages']][-1],
+                         "There's no weekday left in this month")
+        self.assertEqual(PlannedMenu.objects.count(), 5)
+
+
+class TestMealOrders(TestCase):
+
+    def setUp(self):
+        self.meals = [Meal.objects.create(principal_meal=name, salad='Green salad', dessert='Cake')
+                      for name in ('Chicken', 'Fish')]
+        self.employees = []
+        for i in range(2):
+            profile = Profile.objects.create(email='employee%s@gmail.com' % i, phone='00%s' % i, is_active=True,
+                                             is_employee=True)
+            profile.set_password('it is employee!')
+            profile.save()
+            self.employees.append(Employee.objects.create(user=profile))
+        PlannedMenu.objects.create(planned_date=datetime.date.today()).meals.add(*self.meals)
+
+    def test_place_order(self):
+        today = datetime.date.today()
+        yesterday = today - datetime.timedelta(days=1)
+        # Two employees can order the same meal
+        place_order(self.employees[0], self.meals[0].pk, today)
+        place_order(self.employees[1], self.meals[0].pk, today, 'no salad')
+        self.assertEqual(MealOrder.objects.filter(date=today, meal=self.meals[0]).count(), 2)
+        # A new choice of the day replaces the order, the orders of the other days are kept
+        place_order(self.employees[0], self.meals[0].pk, yesterday)
+        order = place_order(self.employees[0], self.meals[1].pk, today)
+        self.assertEqual(MealOrder.objects.filter(employee=self.employees[0]).count(), 2)
+        self.assertEqual(MealOrder.objects.get(employee=self.employees[0], date=today), order)
+        self.assertEqual(order.meal, self.meals[1])
+        self.assertEqual(Employee.objects.get(pk=self.employees[0].pk).preferred_meal, self.meals[1])
+        place_order(self.employees[1], self.meals[1].pk, today)
+        self.assertEqual(MealOrder.objects.get(employee=self.employees[1], date=today).customizations, 'no salad')
+        # Not partitioned out of postgres
+        self.assertEqual(create_order_partitions(), [])
+
+    def test_employee_form(self):
+        client = Client(HTTP_USER_AGENT='Mozilla/5.0')
+        client.login(username='employee0@gmail.com', password='it is employee!')
+        url = '/dashboard/employee/%s/' % self.employees[0].user.pk
+        with mock.patch('lunchapp.views.ordering_closed', return_value=False):
+            for meal in self.meals:
+                response = client.post(url, {'customizations': 'no tomato', 'preferred_meal': meal.pk})
+                self.assertEqual(response.status_code, 302)
+        order = MealOrder.objects.get()
+        self.assertEqual((order.date, order.meal, order.customizations),
+                         (local_date('Chile'), self.meals[1], 'no tomato'))
+        self.assertEqual(client.get(url).context['form'].initial['preferred_meal'], self.meals[1].pk)
+        # The order of yesterday isn't the choice of today
+        order.date -= datetime.timedelta(days=1)
+        order.save()
+        self.assertEqual(client.get(url).context['form'].initial['preferred_meal'], '')
+
+
+class TestOrderingWindow(TestCase):
+
+    def test_windows(self):
+        # Each country closes at 11:00 in its own time zone
+        at = datetime.datetime(2026, 7, 15, 14, 30, tzinfo=pytz.utc)
+        self.assertEqual(ordering_closed('Chile', at), False)  # 10:30
+        self.assertEqual(ordering_closed('Brazil', at), True)  # 11:30
+        self.assertEqual(ordering_closed('Peru', at), False)  # 09:30
+        self.assertEqual(ordering_closed('US', at), False)  # 10:30
+        self.assertEqual(ordering_closed('Chile', datetime.datetime(2026, 7, 15, 15, 0, tzinfo=pytz.utc)), True)
+        # The day of the country, not the UTC one: 22:00 the 15th in Santiago
+        self.assertEqual(ordering_closed('Chile', datetime.datetime(2026, 7, 16, 2, 0, tzinfo=pytz.utc)), True)
+        with override_settings(ORDERING_WINDOWS={'Chile': ('20:00', '23:00')}):
+            self.assertEqual(ordering_closed('Chile', datetime.datetime(2026, 7, 16, 2, 0, tzinfo=pytz.utc)), False)
+        self.assertEqual(local_date('Chile', datetime.datetime(2026, 7, 16, 2, 0, tzinfo=pytz.utc)),
+                         datetime.date(2026, 7, 15))
+
+        # DST: New York moves to UTC-4 the 8th of march, Santiago skips midnight the 6th of september
+        self.assertEqual(ordering_window('US', datetime.date(2026, 3, 8)),
+                         (datetime.datetime(2026, 3, 8, 5, 0, tzinfo=pytz.utc),
+                          datetime.datetime(2026, 3, 8, 15, 0, tzinfo=pytz.utc)))
+        self.assertEqual(ordering_window('Chile', datetime.date(2026, 9, 6)),
+                         (datetime.datetime(2026, 9, 6, 4, 0, tzinfo=pytz.utc),
+                          datetime.datetime(2026, 9, 6, 14, 0, tzinfo=pytz.utc)))
+
+        # The windows are computed once
+        compute_window.cache_clear()
+        for minute in range(60):
+            ordering_closed('Mexico', datetime.datetime(2026, 7, 15, 15, minute, tzinfo=pytz.utc))
+        self.assertLessEqual(compute_window.cache_info().misses, 3)
+
+        with override_settings(ORDERING_WINDOWS={'Brazil': ('08:00', '12:00')}):
+            self.assertEqual(ordering_closed('Brazil', at), False)
+            self.assertEqual(ordering_closed('Brazil', datetime.datetime(2026, 7, 15, 10, 0, tzinfo=pytz.utc)), True)
+
+    def test_closed_views(self):
+        profile = Profile.objects.create(email='employee@gmail.com', phone='001', country='Brazil', is_active=True,
+                                         is_employee=True)
+        profile.set_password('it is employee!')
+        profile.save()
+        Employee.objects.create(user=profile)
+        meal = Meal.objects.create(principal_meal='Chicken', salad='Green salad', dessert='Cake')
+        PlannedMenu.objects.create(planned_date=local_date('Brazil')).meals.add(meal)
+        client = Client(HTTP_USER_AGENT='Mozilla/5.0')
+        client.login(username=profile.email, password='it is employee!')
+        with override_settings(ORDERING_WINDOWS={'Brazil': ('00:00', '00:00')}):
+            client.post('/dashboard/employee/%s/' % profile.pk, {'preferred_meal': meal.pk})
+        self.assertEqual(MealOrder.objects.count(), 0)
+        # Noon in Sao Paulo (the window of the setting is checked with the country of the employee)
+        noon = pytz.timezone('America/Sao_Paulo').localize(
+            datetime.datetime.combine(local_date('Brazil'), datetime.time(12, 0))).astimezone(pytz.utc)
+        at_noon = lambda country: ordering_closed(country, noon)
+        with override_settings(ORDERING_WINDOWS={'Brazil': ('08:00', '13:00')}), \
+                mock.patch('lunchapp.views.ordering_closed', side_effect=at_noon):
+            client.post('/dashboard/employee/%s/' % profile.pk, {'preferred_meal': meal.pk})
+        self.assertEqual(MealOrder.objects.get().meal, meal)
+
+    def test_late_reminder(self):
+        menu = PlannedMenu.objects.create(planned_date=datetime.date(2026, 7, 15))
+        menu.meals.add(Meal.objects.create(principal_meal='Chicken', salad='Green salad', dessert='Lemon pie'))
+        # 09:30 in Santiago is 13:30 UTC, a restart at 11:30 doesn't catch up the reminder anymore
+        with mock.patch('lunchapp.scheduler.timezone.now',
+                        return_value=datetime.datetime(2026, 7, 15, 15, 30, tzinfo=pytz.utc)):
+            ReminderScheduler(holder='scheduler-1').tick()
+        self.assertEqual(ScheduledReminder.objects.count(), 0)
+
+
+class TestSessionsAndLogin(TestCase):
+
+    def setUp(self):
+        self.profile = Profile.objects.create(email='employee@gmail.com', phone='001', is_active=True,
+                                              is_employee=True)
+        with override_settings(PASSWORD_HASH_ITERATIONS=1000):
+            self.profile.set_password('it is employee!')
+        self.profile.save()
+        Employee.objects.create(user=self.profile)
+
+    def test_hash_iterations(self):
+        self.assertEqual(self.profile.password.split('$')[:2], ['pbkdf2_sha256', '1000'])
+        # The password is hashed again with the new cost at the next login
+        with override_settings(PASSWORD_HASH_ITERATIONS=2000):
+            response = Client(HTTP_USER_AGENT='Mozilla/5.0').post('/login/', {
+                'username': self.profile.email, 'password': 'it is employee!'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Profile.objects.get().password.split('$')[:2], ['pbkdf2_sha256', '2000'])
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db', CACHE_SHARED=True)
+    def test_cached_sessions(self):
+        client = Client(HTTP_USER_AGENT='Mozilla/5.0')
+        client.login(username=self.profile.email, password='it is employee!')
+        url = '/dashboard/employee/%s/' % self.profile.pk
+        client.get(url)
+        # The session, the user and his role come from the cache, only the order of the day is read
+        with self.assertNumQueries(1):
+            self.assertEqual(client.get(url).status_code, 200)
+        # The database is the fallback of the cache
+        self.assertEqual(Session.objects.count(), 1)
+        cache.clear()
+        self.assertEqual(client.get(url).status_code, 200)
+
+    def test_session_cleanup(self):
+        now = timezone.now()
+        for index in range(5):
+            Session.objects.create(session_key='expired%s' % index, session_data='',
+                                   expire_date=now - datetime.timedelta(days=1))
+        Session.objects.create(session_key='alive', session_data='', expire_date=now + datetime.timedelta(days=1))
+        out = StringIO()
+        call_command('session_cleanup', '--batch-size', '2', stdout=out)
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['alive'])
+        self.assertIn('5 expired sessions deleted', out.getvalue())
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cache')
+    def test_benchmark_login(self):
+        out = StringIO()
+        call_command('benchmark_login', '--logins', '6', '--concurrency', '2', '--iterations', '1000',
+                     '--iterations', '2000', stdout=out)
+        self.assertIn('pbkdf2 1000 iterations: 6 logins', out.getvalue())
+        self.assertIn('pbkdf2 2000 iterations: 6 logins', out.getvalue())
+        self.assertIn('0 errors', out.getvalue())
+
+
+class QueryBudgetMixin(object):
+    """
+    Assertions on the query budgets of the views (setting QUERY_BUDGETS) with the counts of the middleware
+    """
+
+    def assertWithinBudget(self, url_name, response, label=''):
+        stats = response.wsgi_request.query_stats
+        self.assertEqual(stats.over_budget(settings.QUERY_BUDGETS[url_name]), [],
+                         'Query budget of %s exceeded %s' % (url_name, label))
+
+
+@override_settings(REMINDER_MODE='channel', CHANNEL_ID='#lunch', CACHE_SHARED=True)
+class TestQueryBudgets(QueryBudgetMixin, TestCase):
+
+    def setUp(self):
+        self.users = {}
+        for role in ('admin', 'responsible', 'employee'):
+            user = Profile.objects.create(email='test_%s@gmail.com' % role, first_name='test', last_name='test',
+                                          phone='009%s' % role, country='Chile', is_active=True,
+                                          is_admin=role == 'admin', is_responsible=role == 'responsible',
+                                          is_employee=role == 'employee')
+            user.set_password('it is %s!' % role)
+            user.save()
+            self.users[role] = user
+        Responsible.objects.create(user=self.users['responsible'])
+        Employee.objects.create(user=self.users['employee'])
+        self.meals = [Meal.objects.create(principal_meal='Meal %s' % index, salad='Salad', dessert='Cake')
+                      for index in range(3)]
+        self.menu = PlannedMenu.objects.create(planned_date=datetime.date.today())
+        self.menu.meals.add(*self.meals)
+        self.seeded = 0
+        # number of employees with an order today by country
+        self.ordered = dict((country, 0) for country, label in COUNTRY)
+
+    def seed(self, count):
+        """
+        add employees (with a meal ordered today for one of two) up to count
+        """
+        Profile.objects.bulk_create([Profile(email='seed%s@gmail.com' % index, first_name='first%s' % index,
+                                             last_name='last%s' % index, phone='01%s' % index, is_active=True,
+                                             is_employee=True, country=COUNTRY[index % len(COUNTRY)][0])
+                                     for index in range(self.seeded, count)])
+        profiles = Profile.objects.filter(email__startswith='seed', employee__isnull=True)
+        Employee.objects.bulk_create([Employee(user=profile,
+                                               preferred_meal=self.meals[index % 3] if index % 2 else None)
+                                      for index, profile in enumerate(profiles)])
+        employees = Employee.objects.select_related('user').filter(user__email__startswith='seed',
+                                                                   orders__isnull=True, preferred_meal__isnull=False)
+        MealOrder.objects.bulk_create([MealOrder(employee=employee, meal_id=employee.preferred_meal_id,
+                                                 date=local_date(employee.user.country)) for employee in employees])
+        for employee in employees:
+            self.ordered[employee.user.country] += 1
+        self.seeded = count
+
+    def dashboard_rows(self, data):
+        """
+        :return: number of rows of the page of the dashboard of the responsible asked with data
+        """
+        if not data:
+            return min(self.seeded + 1, settings.DASHBOARD_PAGE_SIZE)
+        rows = self.ordered[data['country']]
+        # a page after the last one shows the last one
+        return min(rows - settings.DASHBOARD_PAGE_SIZE, settings.DASHBOARD_PAGE_SIZE) \
+            if rows > settings.DASHBOARD_PAGE_SIZE else rows
+
+    def requests(self):
+        """
+        :return: list of (url name, method, path, data, role of the client)
+        """
+        users = self.users
+        return [
+            ('home', 'get', '/', None, None),
+            ('login', 'post', '/login/', {'username': users['employee'].email, 'password': 'it is employee!'}, None),
+            ('dashboard-admin', 'get', '/dashboard/admin/%s/' % users['admin'].pk, None, 'admin'),
+            ('dashboard-admin', 'get', '/dashboard/admin/%s/' % users['admin'].pk,
+             {'q': 'first1', 'role': 'employee'}, 'admin'),
+            ('add-user', 'get', '/add_user/%s/' % users['admin'].pk, None, 'admin'),
+            ('import-users', 'get', '/import_users/%s/' % users['admin'].pk, None, 'admin'),
+            ('dashboard-responsible', 'get', '/dashboard/responsible/%s/' % users['responsible'].pk, None,
+             'responsible'),
+            ('dashboard-responsible', 'get', '/dashboard/responsible/%s/' % users['responsible'].pk,
+             {'country': 'Peru', 'meal': 'chosen', 'page': 2}, 'responsible'),
+            ('add-menu', 'get', '/add_menu/%s/' % users['responsible'].pk, None, 'responsible'),
+            ('add-meal', 'post', '/add_meal/%s/' % users['responsible'].pk,
+             {'principal_meal': 'Soup', 'salad': 'Salad', 'dessert': 'Fruit'}, 'responsible'),
+            ('send_reminder', 'post', '/send_reminder/%s/' % users['responsible'].pk, {}, 'responsible'),
+            ('dashboard-employee', 'get', '/dashboard/employee/%s/' % users['employee'].pk, None, 'employee'),
+            ('menu_of_the_day', 'get', '/menu/%s/' % self.menu.uuid_menu, None, None),
+            ('api-menus', 'get', '/api/v1/menus/', None, None),
+            ('api-menu-today', 'get', '/api/v1/menus/today/', None, None),
+            ('api-menu', 'get', '/api/v1/menus/%s/' % self.menu.uuid_menu, None, None),
+            ('logout', 'get', '/logout/', None, None),
+        ]
+
+    def test_budgets(self):
+        clients = {None: Client(HTTP_USER_AGENT='Mozilla/5.0')}
+        for role in self.users:
+            clients[role] = Client(HTTP_USER_AGENT='Mozilla/5.0')
+            clients[role].login(username=self.users[role].email, password='it is %s!' % role)
+        for count in (10, 100, 1000):
+            self.seed(count)
+            for url_name, method, path, data, role in self.requests():
+                # the caches are cold, the worst case
+                cache.clear()
+                with mock.patch('lunchapp.reminders.post_message'):
+                    response = getattr(clients[role], method)(path, data or {})
+                self.assertIn(response.status_code, (200, 302), path)
+                self.assertWithinBudget(url_name, response, 'at %s employees' % count)
+                if url_name == 'dashboard-responsible':
+                    # the rows and their order of today are rendered, an empty page can't pass
+                    employees = response.context['employees'].object_list
+                    self.assertEqual(len(employees), self.dashboard_rows(data), 'at %s employees' % count)
+                    self.assertGreater(len(employees), 0)
+                    if data:
+                        self.assertContains(response, '(Meal ', count=len(employees))
+
+    def test_budget_log(self):
+        client = Client(HTTP_USER_AGENT='Mozilla/5.0')
+        with override_settings(QUERY_BUDGETS={'api-menu': (0, None)}), \
+                mock.patch('lunchapp.middleware.logger') as logger:
+            response = client.get('/api/v1/menus/%s/' % self.menu.uuid_menu)
+        self.assertGreater(response.wsgi_request.query_stats.queries, 0)
+        self.assertIn('Query budget of api-menu exceeded', logger.warning.call_args[0][0])
+        with mock.patch('lunchapp.middleware.logger') as logger:
+            client.get('/api/v1/menus/%s/' % self.menu.uuid_menu)
+        self.assertEqual(logger.warning.call_count, 0)
+
+
+class TestMetrics(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        self.menu = PlannedMenu.objects.create(planned_date=datetime.date.today())
+        self.menu.meals.add(Meal.objects.create(principal_meal='Fish', salad='Salad', dessert='Cake'))
+        self.addCleanup(registry.reset)
+
+    def test_metrics(self):
+        client = Client(HTTP_USER_AGENT='Mozilla/5.0')
+        for _ in range(2):
+            self.assertEqual(client.get('/api/v1/menus/%s/' % self.menu.uuid_menu).status_code, 200)
+        self.assertEqual(client.get('/unknown/').status_code, 404)
+        slack_client = mock.Mock()
+        slack_client.chat_postMessage.side_effect = [mock.Mock(), SlackApiError('invalid', {'status': 400})]
+        with mock.patch('lunchapp.slack_dispatcher.get_slack_client', return_value=slack_client):
+            slack_call('chat.postMessage', channel='#lunch', text='Hello')
+            with self.assertRaises(SlackApiError):
+                slack_call('chat.postMessage', channel='#lunch', text='Hello')
+
+        response = client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        lines = response.content.decode().splitlines()
+        self.assertIn('# TYPE lunch_request_duration_seconds histogram', lines)
+        self.assertIn('lunch_request_duration_seconds_count{view="api-menu",method="GET"} 2', lines)
+        self.assertIn('lunch_request_duration_seconds_bucket{view="api-menu",method="GET",le="+Inf"} 2', lines)
+        self.assertIn('lunch_responses_total{view="unmatched",status="404"} 1', lines)
+        self.assertIn('lunch_db_queries_count{view="api-menu"} 2', lines)
+        self.assertIn('lunch_slack_call_duration_seconds_count{method="chat.postMessage",outcome="ok"} 1', lines)
+        self.assertIn('lunch_slack_call_duration_seconds_count{method="chat.postMessage",outcome="error"} 1', lines)
+        # The second request of the menu is served by the cache
+        self.assertIn('lunch_cache_requests_total{cache="api_page",result="hit"} 1', lines)
+        self.assertIn('lunch_cache_hit_ratio{cache="api_page"} 0.5', lines)
+
+        with override_settings(METRICS_TOKEN='secret'):
+            self.assertEqual(client.get('/metrics').status_code, 403)
+            self.assertEqual(client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+        # Without a token only the allowed addresses are served, unless the metrics are public
+        self.assertEqual(client.get('/metrics', REMOTE_ADDR='10.0.0.8').status_code, 403)
+        with override_settings(METRICS_ALLOWED_IPS=['10.0.0.8']):
+            self.assertEqual(client.get('/metrics', REMOTE_ADDR='10.0.0.8').status_code, 200)
+        with override_settings(METRICS_PUBLIC=True):
+            self.assertEqual(client.get('/metrics', REMOTE_ADDR='10.0.0.8').status_code, 200)
+
+    def test_multiprocess(self):
+        client = Client(HTTP_USER_AGENT='Mozilla/5.0')
+        with tempfile.TemporaryDirectory() as metrics_dir, override_settings(METRICS_DIR=metrics_dir):
+            client.get('/api/v1/menus/%s/' % self.menu.uuid_menu)
+            registry.flush()
+            # The file of another worker
+            os.rename(os.path.join(metrics_dir, 'metrics-%s.json' % os.getpid()),
+                      os.path.join(metrics_dir, 'metrics-1.json'))
+            lines = client.get('/metrics').content.decode().splitlines()
+            self.assertIn('lunch_request_duration_seconds_count{view="api-menu",method="GET"} 2', lines)
+            self.assertEqual(sorted(os.listdir(metrics_dir)),
+                             sorted(['metrics-%s.json' % os.getpid(), 'metrics-1.json']))
+
+            # A forked worker starts from zero, the values of the master stay in the file of the master
+            with mock.patch('lunchapp.metrics.os.getpid', return_value=2):
+                client.get('/api/v1/menus/%s/' % self.menu.uuid_menu)
+                self.assertEqual(registry.pid, 2)
+                lines = registry.render().splitlines()
+            self.assertIn('lunch_request_duration_seconds_count{view="api-menu",method="GET"} 3', lines)
@@ -1,27 +1,61 @@
 from django.conf import settings
-from slack import WebClient
+
+from .slack_directory import get_channel_id, get_team_id
+from .slack_dispatcher import slack_call
 
 import logging
-logger = logging.Logger(__name__)
+import math
+logger = logging.getLogger(__name__)
 
 
-def invite_to_channel(email):
+def post_message(channel, text, blocks=None):
+    """
+    post a message into a slack channel (or a direct message when channel is a user id)
+    :param channel: the channel name or id
+    :param text: the message to send
+    :param blocks: the block kit layout of the message (the text is then the notification fallback)
+    :return: the slack response, errors are raised to the caller
+    """
+    if blocks:
+        return slack_call('chat.postMessage', channel=channel, text=text, blocks=blocks)
+    return slack_call('chat.postMessage', channel=channel, text=text)
+
+
+def send_invitation(email, max_wait=None):
     """
     send invite to the workspace
     :param email: the email of chilean employee to send invite
+    :param max_wait: max seconds waiting for the rate limit of slack by call (e.g. SLACK_REQUEST_MAX_WAIT in a
+    web request), the invitation isn't sent when it would wait longer
+    :return: the slack response, errors are raised to the caller
+    """
+    channel_id = get_channel_id(settings.CHANNEL_ID, max_wait=max_wait)
+    if channel_id is None:
+        raise ValueError("Slack channel %s not found" % settings.CHANNEL_ID)
+    return slack_call('admin.users.invite', team_id=get_team_id(max_wait), email=email, channel_ids=[channel_id, ],
+                      max_wait=max_wait)
+
+
+def invite_to_channel(email, max_wait=None):
+    """
+    send invite to the workspace (see send_invitation)
     :return: True if invitation sent else False
     """
     try:
-        slack_client = WebClient(settings.SLACK_BOT_TOKEN)
-        info = slack_client.team_info()
-        channels_list = slack_client.conversations_list()
-        for channel in channels_list.data.get('channels', {}):
-            if channel.get('name') == settings.CHANNEL_ID:
-                channel_id = channel.get('id')
-        # TODO verify the function
-        slack_client.admin_users_invite(team_id=info.data.get('team', {}).get('id'),
-                                        email=email,
-                                        channel_ids=[channel_id, ])
+        send_invitation(email, max_wait=max_wait)
         return True
-    except:
-        return False
\ No newline at end of file
+    except Exception as e:
+        logger.error("Error in sending slack invitation to %s %s" % (email, e))
+        return False
+
+
+def percentile(values, rank):
+    """
+    :param values: list of numbers
+    :param rank: the percentile (e.g. 95)
+    :return: the nearest-rank percentile of the values (None if there's no value)
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(0, int(math.ceil(rank / 100.0 * len(values))) - 1)]
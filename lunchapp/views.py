@@ -1,25 +1,42 @@
 from __future__ import absolute_import, unicode_literals
 
+from django.conf import settings
 from django.contrib.auth import login as auth_login, logout as auth_logout
 from django.contrib.messages import error, info
-from django.http import HttpResponseForbidden, HttpResponseRedirect
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, HttpResponseRedirect
 from django.shortcuts import get_object_or_404, reverse, redirect
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
 from django.utils.decorators import method_decorator
-from django.utils.translation import ugettext_lazy as _
+from django.utils.http import http_date
+from django.utils.translation import get_language, ugettext_lazy as _
 from django.views.decorators.cache import never_cache
+from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import RedirectView, TemplateView
 from django.views.generic.edit import FormView, View
 
-from .decorators import admin_user_required, employee_user_required, responsible_user_required
-from .forms import AddMenu, AddNewMeal, AddUser, CustomizationEmployee, LoginClientForm
-from .models import Employee, Responsible, Meal, PlannedMenu, Profile
+from .auth import remember_user
+from .caching import shared_cache
+from .constants import COUNTRY, ROLE
+from .forms import AddMenu, AddNewMeal, AddUser, CustomizationEmployee, ImportUsers, LoginClientForm
+from .invitations import count_invitations, queue_invitations
+from .menus import menu_page_key, menu_version, plan_menus, planning_dates, today_menu
+from .metrics import cache_lookup, registry
+from .mixins import RoleRequiredMixin, get_role
+from .models import Employee, Responsible, Meal, PlannedMenu, Profile, ReminderCampaign
+from .onboarding import import_profiles
+from .ordering import local_date, ordering_closed, window_times
+from .orders import attach_today_orders, place_order, today_order, with_today_order
+from .reminders import enqueue_reminder, reminder_message
+from .slack_ordering import record_meal_choices, verify_signature
 from .utils import invite_to_channel
 
-import datetime
+import calendar
+import json
 import logging
-import pytz
 
-logger = logging.Logger(__name__)
+logger = logging.getLogger(__name__)
 
 
 class HomeView(TemplateView):
@@ -44,6 +61,7 @@ class LoginView(FormView):
         """
         user = form.get_user()
         auth_login(self.request, user)
+        remember_user(user)
         info(self.request, _("Welcome to your Cornershop account"))
         if user.is_admin:
             index_path = reverse('dashboard-admin', kwargs={
@@ -82,35 +100,68 @@ class LogoutView(RedirectView):
         return super(LogoutView, self).dispatch(request, *args, **kwargs)
 
 
-class DashboardAdminView(TemplateView):
+class DashboardAdminView(RoleRequiredMixin, TemplateView):
+    role = 'admin'
     template_name = "./dashboard-admin.html"
 
+    def get_profiles(self):
+        """
+        :return: the displayed columns of the profiles filtered by the 'q' (prefix of the email, the first name
+        or the last name), 'role' and 'country' parameters
+        """
+        profiles = Profile.objects.values('pk', 'first_name', 'last_name', 'country', 'email', 'is_employee',
+                                          'is_responsible')
+        query = self.request.GET.get('q', '').strip()
+        if query:
+            profiles = profiles.filter(Q(email__istartswith=query) | Q(first_name__istartswith=query) |
+                                       Q(last_name__istartswith=query))
+        role = self.request.GET.get('role')
+        if role in dict(ROLE):
+            profiles = profiles.filter(**{'is_%s' % role: True})
+        country = self.request.GET.get('country')
+        if country in dict(COUNTRY):
+            profiles = profiles.filter(country=country)
+        return profiles
+
     def get_context_data(self, **kwargs):
         """
-        prepare context for the dashboard admin (all users)
+        prepare context for the dashboard admin, one page of the profiles seeking on the primary key: 'after'
+        gives the next page, 'before' the previous one, so a page costs the same at any depth
         :param kwargs:
-        :return: dict with all profiles
+        :return: dict with the page of profiles and the filters
         """
         context = super(DashboardAdminView, self).get_context_data(**kwargs)
-        profiles = Profile.objects.all()
-        context['profiles'] = profiles
+        size = settings.ADMIN_PAGE_SIZE
+        profiles = self.get_profiles()
+        after = self.request.GET.get('after', '')
+        before = self.request.GET.get('before', '')
+        if before.isdigit():
+            page = list(profiles.filter(pk__lt=before).order_by('-pk')[:size + 1])
+            has_previous, has_next = len(page) > size, True
+            page = page[:size][::-1]
+        else:
+            if after.isdigit():
+                profiles = profiles.filter(pk__gt=after)
+            page = list(profiles.order_by('pk')[:size + 1])
+            has_previous, has_next = after.isdigit(), len(page) > size
+            page = page[:size]
+        filters = self.request.GET.copy()
+        for key in ('after', 'before'):
+            filters.pop(key, None)
+        context['profiles'] = page
+        context['previous_pk'] = page[0]['pk'] if page and has_previous else None
+        context['next_pk'] = page[-1]['pk'] if page and has_next else None
+        context['filters'] = filters.urlencode()
+        context['q'] = self.request.GET.get('q', '')
+        context['roles'] = ROLE
+        context['role'] = self.request.GET.get('role', '')
+        context['countries'] = COUNTRY
+        context['country'] = self.request.GET.get('country', '')
         return context
 
-    @method_decorator(admin_user_required)
-    def dispatch(self, request, *args, **kwargs):
-        """
-        Function that will be executed  before the View login in this view it will check if
-        the user is authenticated and responsible
-        """
-        super(DashboardAdminView, self).dispatch(request, *args, **kwargs)
-        connected_profile = get_object_or_404(Profile, pk=self.kwargs.get('user_id'))
-        if not connected_profile.is_admin:
-            logger.error('User not allowed user.email %s' % request.user.email)
-            return HttpResponseForbidden('<h1>Forbidden</h1>')
-        return super(DashboardAdminView, self).dispatch(request, *args, **kwargs)
-
 
-class AddingUserView(FormView):
+class AddingUserView(RoleRequiredMixin, FormView):
+    role = 'admin'
     template_name = "./add_new_user.html"
     form_class = AddUser
 
@@ -147,8 +198,11 @@ class AddingUserView(FormView):
                 Employee.objects.create(user=profile)
             info(self.request, 'User successfully created')
             # Only employee from Chile are invited to slack channel of the menu notifier
-            if profile.country == 'Chile':
-                invite_to_channel(profile.email)
+            if profile.country == 'Chile' and not invite_to_channel(profile.email,
+                                                                    max_wait=settings.SLACK_REQUEST_MAX_WAIT):
+                # slack is busy (e.g. with the invitations of an import): the worker sends it later
+                queue_invitations([profile.email])
+                info(self.request, _("The slack invitation is queued, it will be sent in a few minutes"))
 
         except Exception as e:
             error(self.request, 'Error creating new user the error is %s' % e)
@@ -156,50 +210,89 @@ class AddingUserView(FormView):
             'user_id': self.request.user.pk
         }))
 
-    @method_decorator(admin_user_required)
-    def dispatch(self, request, *args, **kwargs):
-        """
-        Function that will be executed  before the View login in this view it will check if
-        the user is authenticated and responsible
-        """
-        super(AddingUserView, self).dispatch(request, *args, **kwargs)
-        connected_profile = get_object_or_404(Profile, pk=kwargs.get('user_id'))
-        if not connected_profile.is_admin:
-            logger.error('User not allowed user.email %s' % request.user.email)
-            return HttpResponseForbidden('<h1>Forbidden</h1>')
-        return super(AddingUserView, self).dispatch(request, *args, **kwargs)
 
+class ImportUsersView(RoleRequiredMixin, FormView):
+    role = 'admin'
+    template_name = "./import_users.html"
+    form_class = ImportUsers
 
-class LoginRequiredResponsible(View):
+    def get_context_data(self, **kwargs):
+        """
+        :return: the context of the form with the progress of the slack invitations sent by the reminder worker
+        """
+        context = super(ImportUsersView, self).get_context_data(**kwargs)
+        context['invitations'] = count_invitations()
+        return context
 
-    @method_decorator(responsible_user_required)
-    def dispatch(self, request, *args, **kwargs):
+    def form_valid(self, form):
         """
-        Function that will be executed  before the View login in this view it will check if
-        the user is authenticated and responsible
+        :param form: the form with the CSV file of the users
+        :return: create all the users of the file or none of them and show the errors of every row
         """
-        super(LoginRequiredResponsible, self).dispatch(request, *args, **kwargs)
-        connected_profile = get_object_or_404(Responsible, user=request.user)
-        if not connected_profile.user.is_responsible:
-            logger.error('User not allowed user.email %s' % request.user.email)
-            return HttpResponseForbidden('<h1>Forbidden</h1>')
-        return super(LoginRequiredResponsible, self).dispatch(request, *args, **kwargs)
+        result = import_profiles(form.cleaned_data.get('csv_file'))
+        if not result.is_valid:
+            error(self.request, 'No user created, please fix the errors of the file')
+            return self.render_to_response(self.get_context_data(form=form, import_errors=result.errors))
+        info(self.request, '%s users successfully created, %s slack invitations queued' % (result.created,
+                                                                                          result.queued))
+        return HttpResponseRedirect(reverse('import-users', kwargs={
+            'user_id': self.request.user.pk
+        }))
+
+
+class LoginRequiredResponsible(RoleRequiredMixin, View):
+    role = 'responsible'
 
 
 class DashboardResponsibleView(LoginRequiredResponsible, TemplateView):
     template_name = "./dashboard-responsible.html"
 
+    def get_employees(self):
+        """
+        :return: the employees filtered by the 'country' and 'meal' ('chosen' or 'none' today) parameters, with
+        their user fetched in the same query and only the displayed columns
+        """
+        employees = with_today_order(Employee.objects.select_related('user').only(
+            'customizations', 'user', 'user__first_name', 'user__last_name', 'user__country',
+        )).order_by('user__last_name', 'user__first_name', 'pk')
+        country = self.request.GET.get('country')
+        if country in dict(COUNTRY):
+            employees = employees.filter(user__country=country)
+        meal = self.request.GET.get('meal')
+        if meal == 'chosen':
+            employees = employees.filter(has_order=True)
+        elif meal == 'none':
+            employees = employees.filter(has_order=False)
+        return employees
+
     def get_context_data(self, **kwargs):
         """
-        prepare context for the dashboard responsible (all employees with their preferred meal and customizations)
+        prepare context for the dashboard responsible (one page of the employees with the meal they ordered
+        today and its customizations)
         :param kwargs:
-        :return: dict of all users
+        :return: dict with the page of employees and the filters
         """
         context = super(DashboardResponsibleView, self).get_context_data(**kwargs)
-        responsible = get_object_or_404(Responsible, user__pk=kwargs.get('user_id'))
-        employees = Employee.objects.all()
+        if str(self.request.user.pk) == kwargs.get('user_id'):
+            responsible = get_role(self.request, 'responsible')
+        else:
+            responsible = get_object_or_404(Responsible, user__pk=kwargs.get('user_id'))
+        page = Paginator(self.get_employees(), settings.DASHBOARD_PAGE_SIZE).get_page(self.request.GET.get('page'))
+        filters = self.request.GET.copy()
+        filters.pop('page', None)
         context['responsible'] = responsible
-        context['employees'] = employees
+        page.object_list = attach_today_orders(list(page.object_list))
+        context['employees'] = page
+        context['page'] = page
+        context['countries'] = COUNTRY
+        context['country'] = self.request.GET.get('country', '')
+        context['meal'] = self.request.GET.get('meal', '')
+        context['filters'] = filters.urlencode()
+        campaigns = list(ReminderCampaign.objects.all()[:5])
+        counts = ReminderCampaign.count_deliveries(campaigns)
+        for campaign in campaigns:
+            campaign.counts = counts[campaign.pk]
+        context['campaigns'] = campaigns
         return context
 
 
@@ -208,21 +301,19 @@ class SubmitReminder(LoginRequiredResponsible):
     def post(self, request, *args, **kwargs):
         """
         :param request: the request
-        :return: msg with the status of the reminder
-        """
-        responsible = get_object_or_404(Responsible, user=request.user)
-        try:
-            planned_menu = PlannedMenu.objects.get(planned_date=datetime.date.today())
-        except PlannedMenu.DoesNotExist:
-            logger.error("Object doesn't exist, getting default menu")
-            planned_menu = PlannedMenu.objects.all().first()
-
-        message = 'You found Today menu flowing this link \n http://nora.cornershop.com/menu/%s' \
-                  % planned_menu.uuid_menu
-        response = responsible.send_msg_with_the_menu(message)
-        msg = "Successfully sent it to Chilean employees in the slack channel" if response \
-            else "Error sending reminder please try again or the admin will react"
-        info(self.request, _(msg))
+        :return: msg telling the reminder is queued
+        """
+        responsible = get_role(request, 'responsible')
+        planned_menu, meal_ids = today_menu(exact=True)
+        if planned_menu is None:
+            error(self.request, _("There's no menu today"))
+            return HttpResponseRedirect(reverse('dashboard-responsible', kwargs={
+                'user_id': request.user.pk
+            }))
+
+        # The reminder is only queued, the command 'reminder_worker' sends it to slack
+        enqueue_reminder(planned_menu, reminder_message(planned_menu), responsible=responsible)
+        info(self.request, _("Reminder queued, it will be sent to the employees on slack in a few seconds"))
         return HttpResponseRedirect(reverse('dashboard-responsible', kwargs={
             'user_id': request.user.pk
         }))
@@ -244,17 +335,25 @@ class AddingMenuView(LoginRequiredResponsible, FormView):
     def form_valid(self, form):
         """
         :param form:
-        :return: create the menu of the day
-        """
-        planned_menu = PlannedMenu.objects.create(planned_date=form.cleaned_data.get('planned_date'))
-        for meal_id in form.cleaned_data.get('meals'):
-            meal = Meal.objects.get(pk=meal_id)
-            if meal:
-                planned_menu.meals.add(meal)
-            else:
-                continue
-        planned_menu.save()
-        return HttpResponseRedirect(reverse('menu_of_the_day', kwargs={'uuid_menu': planned_menu.uuid_menu}))
+        :return: create the menu of the day, or of every weekday of the week or of the month
+        """
+        planning = form.cleaned_data.get('planning') or 'day'
+        dates = planning_dates(form.cleaned_data.get('planned_date'), planning)
+        if not dates:
+            # a month planned from its last weekend
+            error(self.request, _("There's no weekday left in this month"))
+            return HttpResponseRedirect(reverse('add-menu', kwargs={'user_id': self.request.user.pk}))
+        if planning != 'day':
+            # The days already planned are kept
+            planned = set(PlannedMenu.objects.filter(planned_date__in=dates).values_list('planned_date', flat=True))
+            dates = [planned_date for planned_date in dates if planned_date not in planned]
+        if not dates:
+            error(self.request, _("All these days already have a menu"))
+            return HttpResponseRedirect(reverse('add-menu', kwargs={'user_id': self.request.user.pk}))
+        planned_menus = plan_menus(dict((planned_date, form.cleaned_data.get('meals')) for planned_date in dates))
+        if len(planned_menus) > 1:
+            info(self.request, _("%(count)s menus planned") % {'count': len(planned_menus)})
+        return HttpResponseRedirect(reverse('menu_of_the_day', kwargs={'uuid_menu': planned_menus[0].uuid_menu}))
 
 
 class AddMeal(LoginRequiredResponsible, FormView):
@@ -271,13 +370,14 @@ class AddMeal(LoginRequiredResponsible, FormView):
             Meal.objects.create(principal_meal=form.cleaned_data.get('principal_meal'),
                                 salad=form.cleaned_data.get('salad'),
                                 dessert=form.cleaned_data.get('dessert'))
-            info(self.request, 'New meal created, please refresh to get it in menu')
+            info(self.request, 'New meal created')
         except Exception as e:
             error(self.request, 'Error in creating meal %s' % e)
         return redirect(reverse('add-menu', kwargs={'user_id': self.request.user.pk}))
 
 
-class DashboardEmployeeView(FormView):
+class DashboardEmployeeView(RoleRequiredMixin, FormView):
+    role = 'employee'
     template_name = "./dashboard-employee.html"
     form_class = CustomizationEmployee
 
@@ -285,30 +385,43 @@ class DashboardEmployeeView(FormView):
         """
         :return: the connected employee object
         """
-        employee = get_object_or_404(Employee, user=self.request.user)
-        return employee
+        return get_role(self.request, 'employee')
+
+    def get_today_menu(self):
+        """
+        :return: tuple (today's menu in the country of the employee or None, set of the ids of its meals)
+        """
+        if not hasattr(self, 'today_menu'):
+            self.today_menu = today_menu(self.request.user.country, exact=True)
+        return self.today_menu
+
+    def get_form_kwargs(self):
+        """
+        :return: the arguments of the form, only the meals of today's menu can be chosen (none without menu today)
+        """
+        kwargs = super(DashboardEmployeeView, self).get_form_kwargs()
+        kwargs['meal_ids'] = self.get_today_menu()[1]
+        return kwargs
+
+    def get_context_data(self, **kwargs):
+        context = super(DashboardEmployeeView, self).get_context_data(**kwargs)
+        context['planned_menu'] = self.get_today_menu()[0]
+        return context
 
     def get_initial(self):
         """
         :return: the detail of the connected employee into form to edit
         """
         employee = self.get_object()
-        try:
-            planned_menu = PlannedMenu.objects.get(planned_date=datetime.date.today())
-            preferred_meal = employee.preferred_meal.pk if (employee.preferred_meal.pk
-                                                            and employee.preferred_meal
-                                                            in planned_menu.meals.all()) else ''
-            customizations = employee.customizations
-        except PlannedMenu.DoesNotExist:
-            logger.error("Object doesn't exist, getting default menu")
-            planned_menu = PlannedMenu.objects.all().first()
-            preferred_meal = employee.preferred_meal.pk if (employee.preferred_meal.pk
-                                                            and employee.preferred_meal
-                                                            in planned_menu.meals.all()) else ''
-            customizations = employee.customizations
-
-        except:
+        planned_menu, meal_ids = self.get_today_menu()
+        order = today_order(employee, self.request.user.country) if planned_menu is not None else None
+        if planned_menu is None:
             preferred_meal = customizations = ''
+        elif order is None:
+            preferred_meal, customizations = '', employee.customizations
+        else:
+            preferred_meal = order.meal_id if order.meal_id in meal_ids else ''
+            customizations = order.customizations or employee.customizations
 
         return {'preferred_meal': preferred_meal,
                 'customizations': customizations
@@ -317,43 +430,64 @@ class DashboardEmployeeView(FormView):
     def form_valid(self, form):
         """
         :param form: the form of choosing custom meal of to indicate some customizations
-        :return: the same view but with the new customizations indicated by the user if time didn't pass 11 AM CLT
-         else nothing will be saved and msg will be return
+        :return: the same view but with the new customizations indicated by the user if the orders of his country
+         are still open else nothing will be saved and msg will be return
         """
-        tz_clt = pytz.timezone('Chile/Continental')
-        date_time_chile = datetime.datetime.now(tz_clt).strftime('%H:%M')
-        if date_time_chile > '11:00':
-            info(self.request, "Sorry but you can't choose your preferred meal after 11 AM (CLT)")
+        country = self.request.user.country
+        if ordering_closed(country):
+            info(self.request, _("Sorry but you can't choose your preferred meal after %(time)s") % {
+                'time': window_times(country)[1]})
             return HttpResponseRedirect(reverse('dashboard-employee', kwargs={
                 'user_id': self.request.user.pk
             }))
         employee = self.get_object()
-        if 'preferred_meal' in form.cleaned_data.keys() and form.cleaned_data.get('preferred_meal'):
-            employee.preferred_meal = Meal.objects.get(pk=form.cleaned_data.get('preferred_meal'))
         if 'customizations' in form.cleaned_data.keys() and form.cleaned_data.get('customizations'):
             employee.customizations = form.cleaned_data.get('customizations')
-        employee.save()
+            employee.save(update_fields=['customizations'])
+        if 'preferred_meal' in form.cleaned_data.keys() and form.cleaned_data.get('preferred_meal'):
+            place_order(employee, int(form.cleaned_data.get('preferred_meal')), local_date(country),
+                        employee.customizations or '')
         return HttpResponseRedirect(reverse('dashboard-employee', kwargs={
             'user_id': self.request.user.pk
         }))
 
-    @method_decorator(employee_user_required)
-    def dispatch(self, request, *args, **kwargs):
-        """
-        Function that will be executed  before the View login in this view it will check if
-        the user is authenticated and employee
-        """
-        super(DashboardEmployeeView, self).dispatch(request, *args, **kwargs)
-        connected_profile = get_object_or_404(Employee, user=request.user)
-        if not connected_profile.user.is_employee:
-            logger.error('User not allowed user.email %s' % request.user.email)
-            return HttpResponseForbidden('<h1>Forbidden</h1>')
-        return super(DashboardEmployeeView, self).dispatch(request, *args, **kwargs)
-
 
 class MenuDayView(TemplateView):
     template_name = "./menu_of_the_day.html"
 
+    def get(self, request, *args, **kwargs):
+        """
+        the page is the same for all the anonymous users: it's cached per menu and language until the menu
+        or its meals change (see lunchapp/signals.py) and answered with a 304 when the browser (or a proxy)
+        already has this version of the menu
+        """
+        if request.user.is_authenticated or request.COOKIES.get('messages'):
+            response = super(MenuDayView, self).get(request, *args, **kwargs)
+            patch_cache_control(response, private=True)
+            return response
+        version = menu_version(kwargs.get('uuid_menu'))
+        if version is None:
+            raise Http404
+        revision, updated_at = version
+        language = get_language()
+        etag = '"%s-%s-%s"' % (revision, int(updated_at.timestamp() * 1000000), language)
+        last_modified = calendar.timegm(updated_at.utctimetuple())
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            key = menu_page_key(kwargs.get('uuid_menu'), language)
+            content = cache_lookup('menu_page', shared_cache().get(key))
+            if content is not None:
+                response = HttpResponse(content)
+            else:
+                response = super(MenuDayView, self).get(request, *args, **kwargs)
+                response.add_post_render_callback(lambda rendered: shared_cache().set(key, rendered.content,
+                                                                                      settings.MENU_PAGE_TTL))
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, public=True, max_age=settings.MENU_PAGE_MAX_AGE)
+        patch_vary_headers(response, ('Cookie',))
+        return response
+
     def get_context_data(self, **kwargs):
         """
         :param kwargs: contains uuid of the menu
@@ -363,3 +497,44 @@ class MenuDayView(TemplateView):
         planned_menu = get_object_or_404(PlannedMenu, uuid_menu=kwargs.get('uuid_menu'))
         context['menu_of_day'] = planned_menu
         return context
+
+
+class SlackInteractionsView(View):
+    """
+    Interactivity endpoint of the slack app (the meal buttons of the reminder), slack waits at most
+    3 seconds for the answer so the choice is only stored here and applied by the reminder worker
+    """
+
+    @method_decorator(csrf_exempt)
+    def dispatch(self, request, *args, **kwargs):
+        return super(SlackInteractionsView, self).dispatch(request, *args, **kwargs)
+
+    def post(self, request, *args, **kwargs):
+        if not verify_signature(request.body, request.META.get('HTTP_X_SLACK_REQUEST_TIMESTAMP'),
+                                request.META.get('HTTP_X_SLACK_SIGNATURE')):
+            logger.error('Slack request with an invalid signature')
+            return HttpResponseForbidden()
+        try:
+            payload = json.loads(request.POST.get('payload') or '{}')
+        except ValueError:
+            return HttpResponseBadRequest()
+        record_meal_choices(payload)
+        return HttpResponse()
+
+
+class MetricsView(View):
+    """
+    Metrics of every worker in the Prometheus text format (see lunchapp/metrics.py), when METRICS_TOKEN is set
+    the scraper sends it in the header Authorization: Bearer <token>, otherwise only the addresses of
+    METRICS_ALLOWED_IPS are served unless METRICS_PUBLIC is set
+    """
+
+    def allowed(self, request):
+        if settings.METRICS_TOKEN:
+            return request.META.get('HTTP_AUTHORIZATION') == 'Bearer %s' % settings.METRICS_TOKEN
+        return settings.METRICS_PUBLIC or request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+
+    def get(self, request, *args, **kwargs):
+        if not self.allowed(request):
+            return HttpResponseForbidden()
+        return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')